@@ -0,0 +1,174 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+OK = "OK"
+DEGRADED = "DEGRADED"
+FAILING = "FAILING"
+RECOVERED = "RECOVERED"
+
+# What a single probe looked like
+OBSERVED_OK = "ok"
+OBSERVED_SLOW = "slow"
+OBSERVED_ERROR = "error"
+
+DEFAULT_TRIGGER_SAMPLES = 2
+DEFAULT_CLEAR_SAMPLES = 2
+DEFAULT_ALERT_STATE_PATH = os.path.join('data', 'alert_state.json')
+
+# State a run of identical observations moves a view towards
+_TARGET_STATE = {
+    OBSERVED_SLOW: DEGRADED,
+    OBSERVED_ERROR: FAILING,
+    OBSERVED_OK: RECOVERED,
+}
+
+
+class AlertEvent:
+    """A state change (or reminder) worth notifying about"""
+
+    __slots__ = ('view_id', 'view_name', 'previous', 'state', 'since', 'reminder', 'detail')
+
+    def __init__(self, view_id, view_name, previous, state, since, reminder, detail):
+        self.view_id = view_id
+        self.view_name = view_name
+        self.previous = previous
+        self.state = state
+        self.since = since
+        self.reminder = reminder
+        self.detail = detail
+
+    def headline(self):
+        """One line describing the change, or the state a reminder is about"""
+        if self.reminder:
+            since = datetime.fromtimestamp(self.since, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+            return f"Dashboard '{self.view_name}' is still {self.state} (since {since} UTC)"
+        return f"Dashboard '{self.view_name}' changed from {self.previous} to {self.state}"
+
+    def to_dict(self):
+        return {
+            "view_id": self.view_id,
+            "view_name": self.view_name,
+            "previous": self.previous,
+            "state": self.state,
+            "since": self.since,
+            "reminder": self.reminder,
+            "detail": self.detail
+        }
+
+
+class _ViewAlert:
+    __slots__ = ('state', 'since', 'observed', 'streak', 'notified_at')
+
+    def __init__(self, state=OK, since=None, observed=OBSERVED_OK, streak=0, notified_at=None):
+        self.state = state
+        self.since = since
+        self.observed = observed
+        self.streak = streak
+        self.notified_at = notified_at
+
+
+class AlertTracker:
+    """Per-view alert state with consecutive-sample hysteresis.
+
+    A view only moves to DEGRADED or FAILING after `trigger_samples` slow
+    or failed probes in a row, and only moves to RECOVERED after
+    `clear_samples` good probes in a row; the next good probe after that
+    returns it to OK silently. Only transitions produce events, plus an
+    optional reminder every `reminder_interval` seconds while a view stays
+    DEGRADED or FAILING.
+    """
+
+    def __init__(self, trigger_samples=None, clear_samples=None, reminder_interval=None, state_path=None):
+        self.trigger_samples = trigger_samples or int(os.getenv('ALERT_TRIGGER_SAMPLES', DEFAULT_TRIGGER_SAMPLES))
+        self.clear_samples = clear_samples or int(os.getenv('ALERT_CLEAR_SAMPLES', DEFAULT_CLEAR_SAMPLES))
+        if reminder_interval is None:
+            reminder_interval = float(os.getenv('ALERT_REMINDER_INTERVAL', 0))
+        self.reminder_interval = reminder_interval
+        self.state_path = state_path
+        self._views = {}
+        self._lock = threading.Lock()
+        if state_path:
+            self.load()
+
+    def state(self, view_id):
+        with self._lock:
+            alert = self._views.get(view_id)
+            return alert.state if alert else OK
+
+    def observe(self, view_id, view_name, observed, detail=None, now=None, trigger_samples=None):
+        """Fold one probe observation into the view's state.
+
+        Returns an AlertEvent when the state changes or a reminder is due,
+        otherwise None. `trigger_samples` overrides the tracker's for
+        observations that are already debounced, such as an open circuit.
+        """
+        now = now or time.time()
+        with self._lock:
+            alert = self._views.setdefault(view_id, _ViewAlert(since=now))
+
+            if observed == alert.observed:
+                alert.streak += 1
+            else:
+                alert.observed = observed
+                alert.streak = 1
+
+            target = _TARGET_STATE[observed]
+            if alert.state == RECOVERED and observed == OBSERVED_OK:
+                alert.state = OK
+                alert.since = now
+                return None
+            if alert.state == OK and observed == OBSERVED_OK:
+                return None
+
+            needed = self.clear_samples if observed == OBSERVED_OK else (trigger_samples or self.trigger_samples)
+            if target != alert.state and alert.streak >= needed:
+                previous = alert.state
+                alert.state = target
+                alert.since = now
+                alert.notified_at = now
+                return AlertEvent(view_id, view_name, previous, target, now, False, detail)
+
+            if (
+                alert.state in (DEGRADED, FAILING)
+                and self.reminder_interval > 0
+                and now - (alert.notified_at or alert.since) >= self.reminder_interval
+            ):
+                alert.notified_at = now
+                return AlertEvent(view_id, view_name, alert.state, alert.state, alert.since, True, detail)
+
+            return None
+
+    def forget(self, keep_view_ids):
+        """Drop state for views that no longer exist"""
+        keep = set(keep_view_ids)
+        with self._lock:
+            for view_id in list(self._views):
+                if view_id not in keep:
+                    del self._views[view_id]
+
+    def load(self):
+        try:
+            with open(self.state_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        with self._lock:
+            self._views = {view_id: _ViewAlert(*values) for view_id, values in data.items()}
+
+    def save(self):
+        if not self.state_path:
+            return
+        with self._lock:
+            data = {
+                view_id: [a.state, a.since, a.observed, a.streak, a.notified_at]
+                for view_id, a in self._views.items()
+            }
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(f"{self.state_path}.tmp", 'w') as f:
+            json.dump(data, f)
+        os.replace(f"{self.state_path}.tmp", self.state_path)
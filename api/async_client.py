@@ -0,0 +1,314 @@
+import asyncio
+import atexit
+import concurrent.futures
+import contextvars
+import importlib.util
+import logging
+import os
+import threading
+import time
+from xml.etree.ElementTree import fromstring
+
+from api.lazy import lazy_import
+from api.metrics import ERRORS, RETRIES, SIGN_IN_SECONDS
+from api.probes import CHUNK_SIZE, StageTiming
+from api.sessions import API_VERSION, DEFAULT_SESSION_MAX_AGE, _is_unauthorized, format_filter_time
+from api.throttle import server_guards
+from api.tracing import tracer
+
+TSC = lazy_import('tableauserverclient')
+request_factory = lazy_import('tableauserverclient.server.request_factory')
+
+# Optional dependencies, looked up without importing them
+httpx = lazy_import('httpx') if importlib.util.find_spec('httpx') else None
+HTTP2_AVAILABLE = importlib.util.find_spec('h2') is not None
+
+logger = logging.getLogger('TableauAsyncClient')
+
+PROBE_CLIENTS = ('threads', 'async')
+DEFAULT_ASYNC_CONCURRENCY = 256
+DEFAULT_REQUEST_TIMEOUT = 120
+PAGE_SIZE = 1000
+NAMESPACE = {'t': 'http://tableau.com/api'}
+
+
+def get_probe_client(default='threads'):
+    """Read PROBE_CLIENT ('threads' or 'async') from the environment"""
+    client = os.getenv('PROBE_CLIENT', default).strip().lower()
+    if client not in PROBE_CLIENTS:
+        raise ValueError(f"Unknown PROBE_CLIENT '{client}', expected one of: {', '.join(PROBE_CLIENTS)}")
+    if client == 'async' and httpx is None:
+        raise RuntimeError("PROBE_CLIENT=async needs httpx (pip install httpx, plus h2 for HTTP/2)")
+    return client
+
+
+def get_async_concurrency():
+    """Maximum number of probes in flight at once on the event loop"""
+    return max(1, int(os.getenv('ASYNC_PROBE_CONCURRENCY', DEFAULT_ASYNC_CONCURRENCY)))
+
+
+class EventLoopThread:
+    """An asyncio event loop running on a daemon thread, started on first use.
+
+    Synchronous code hands it coroutines with run(). Keeping one loop for
+    the life of the process lets HTTP connections stay open between checks.
+    """
+
+    def __init__(self, name='tableau-async'):
+        self.name = name
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name=self.name, daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    def run(self, coroutine):
+        """Run a coroutine on the loop and wait for its result.
+
+        The coroutine runs in a copy of the caller's context, so context
+        variables such as the trace of the caller's tick carry over.
+        """
+        loop = self._ensure_loop()
+        done = concurrent.futures.Future()
+
+        def start():
+            task = loop.create_task(coroutine)
+            task.add_done_callback(lambda task: _copy_outcome(task, done))
+
+        loop.call_soon_threadsafe(start, context=contextvars.copy_context())
+        return done.result()
+
+
+def _copy_outcome(task, future):
+    if task.cancelled():
+        future.cancel()
+    elif task.exception() is not None:
+        future.set_exception(task.exception())
+    else:
+        future.set_result(task.result())
+
+
+def _check_response(response, url, summary):
+    if response.status_code == 401:
+        raise TSC.ServerResponseError('401000', 'Unauthorized', response.text, url)
+    if response.status_code >= 400:
+        raise TSC.ServerResponseError(str(response.status_code), summary, response.text[:500], url)
+
+
+class AsyncTableauClient:
+    """Tableau REST client for the hot path on asyncio and httpx.
+
+    Covers what the monitor needs from tableauserverclient on every check:
+    personal access token sign-in, paged view listing and preview, image and
+    PDF renders. One pooled httpx client keeps connections alive (and uses
+    HTTP/2 when h2 is installed), so thousands of renders can be in flight
+    from one thread. Views come back as TSC ViewItems parsed by TSC itself,
+    and errors as TSC.ServerResponseError, so the rest of the monitor does
+    not see a difference. Calls go through the server's guard like
+    TableauSession calls do.
+    """
+
+    def __init__(self, server_url, site_name, token_name, token, max_connections=None, max_age=None):
+        self.server_url = server_url
+        self.site_name = site_name
+        self.token_name = token_name
+        self.token = token
+        self.max_connections = max_connections or get_async_concurrency()
+        self.max_age = max_age or DEFAULT_SESSION_MAX_AGE
+        self.baseurl = f"{server_url.rstrip('/')}/api/{API_VERSION}"
+        self.site_id = None
+        self.auth_token = None
+        self.signed_in_at = None
+        self.generation = 0
+        self.guard = server_guards.get(server_url, self.max_connections)
+        # Created on the event loop thread on first use
+        self._client = None
+        self._lock = None
+
+    @property
+    def siteurl(self):
+        return f"{self.baseurl}/sites/{self.site_id}"
+
+    def _http(self):
+        if self._client is None:
+            limits = httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections
+            )
+            self._client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                limits=limits,
+                timeout=httpx.Timeout(float(os.getenv('ASYNC_REQUEST_TIMEOUT', DEFAULT_REQUEST_TIMEOUT)))
+            )
+        return self._client
+
+    async def _request(self, method, url, **kwargs):
+        try:
+            return await self._http().request(method, url, **kwargs)
+        except httpx.TransportError as e:
+            # Counted as a network failure by the guard, like requests errors
+            raise ConnectionError(f"{type(e).__name__}: {str(e)}") from e
+
+    async def _sign_in(self):
+        auth = TSC.PersonalAccessTokenAuth(
+            token_name=self.token_name,
+            personal_access_token=self.token,
+            site_id=self.site_name
+        )
+        body = request_factory.RequestFactory.Auth.signin_req(auth)
+        url = f"{self.baseurl}/auth/signin"
+
+        start_time = time.perf_counter()
+        try:
+            with tracer.span('sign_in', site=self.site_name):
+                response = await self._request('POST', url, content=body)
+                if response.status_code == 301:
+                    # Re-post to the pod Tableau Cloud redirects to, as TSC does
+                    response = await self._request('POST', response.headers['Location'], content=body)
+                _check_response(response, url, 'Sign-in failed')
+        except Exception:
+            ERRORS.labels('sign_in').inc()
+            raise
+        SIGN_IN_SECONDS.observe(time.perf_counter() - start_time)
+
+        parsed = fromstring(response.content)
+        self.auth_token = parsed.find('t:credentials', NAMESPACE).get('token')
+        self.site_id = parsed.find('.//t:site', NAMESPACE).get('id')
+        self.signed_in_at = time.monotonic()
+        self.generation += 1
+        logger.info(f"Signed in to {self.server_url} (site: {self.site_name}) for async probing")
+
+    def _expired(self):
+        return self.signed_in_at is None or time.monotonic() - self.signed_in_at >= self.max_age
+
+    async def ensure_signed_in(self, stale_generation=None):
+        """Sign in if there is no token, it is old, or it was rejected (see TableauSession)"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            rejected = stale_generation is not None and stale_generation == self.generation
+            if rejected or self._expired():
+                await self.guard.call_async(self._sign_in)
+
+    async def call(self, func, kind='rest'):
+        """Await func() through the server's guard, re-authenticating once on 401"""
+        await self.ensure_signed_in()
+        generation = self.generation
+        try:
+            return await self.guard.call_async(func, kind)
+        except TSC.ServerResponseError as e:
+            if not _is_unauthorized(e):
+                raise
+            logger.info(f"Session for {self.site_name} was rejected, signing in again")
+            RETRIES.labels('reauth').inc()
+            await self.ensure_signed_in(stale_generation=generation)
+            return await self.guard.call_async(func, kind)
+
+    async def _views_page(self, page_number, updated_since):
+        params = {'pageSize': PAGE_SIZE, 'pageNumber': page_number}
+        if updated_since is not None:
+            params['filter'] = f"updatedAt:gte:{format_filter_time(updated_since)}"
+        async def fetch():
+            # Built here, after call() has signed in and knows the site id
+            url = f"{self.siteurl}/views"
+            with tracer.span('list_views_page', site=self.site_name, page=page_number):
+                response = await self._request('GET', url, params=params, headers={'x-tableau-auth': self.auth_token})
+                _check_response(response, url, 'Listing views failed')
+            return response.content
+
+        content = await self.call(fetch)
+        return TSC.ViewItem.from_response(content, NAMESPACE), TSC.PaginationItem.from_response(content, NAMESPACE)
+
+    async def list_views_async(self, updated_since=None):
+        """All views of the site, or those updated at or after a datetime; pages after the first are fetched together"""
+        views, pagination = await self._views_page(1, updated_since)
+        page_count = -(-pagination.total_available // PAGE_SIZE)
+        pages = await asyncio.gather(*(
+            self._views_page(page_number, updated_since) for page_number in range(2, page_count + 1)
+        ))
+        for page_views, _ in pages:
+            views.extend(page_views)
+        return views
+
+    def list_views(self, updated_since=None):
+        """Blocking list_views_async(), for the view inventory"""
+        return event_loop.run(self.list_views_async(updated_since))
+
+    def stage_url(self, view, stage):
+        if stage == 'preview':
+            return f"{self.siteurl}/workbooks/{view.workbook_id}/views/{view.id}/previewImage"
+        return f"{self.siteurl}/views/{view.id}/{stage}"
+
+    async def fetch_stage(self, view, stage):
+        """GET one rendered resource, discarding the body as it streams in, and time it"""
+        async def fetch():
+            url = self.stage_url(view, stage)
+            with tracer.span(stage, 'render') as span:
+                start_time = time.perf_counter()
+                try:
+                    async with self._http().stream('GET', url, headers={'x-tableau-auth': self.auth_token}) as response:
+                        ttfb = time.perf_counter() - start_time
+                        if response.status_code >= 400:
+                            await response.aread()
+                            _check_response(response, url, f"Fetching {stage} failed")
+                        size = 0
+                        async for chunk in response.aiter_raw(CHUNK_SIZE):
+                            size += len(chunk)
+                except httpx.TransportError as e:
+                    raise ConnectionError(f"{type(e).__name__}: {str(e)}") from e
+                span.set(ttfb=round(ttfb, 4), bytes=size)
+            return StageTiming(stage, ttfb, time.perf_counter() - start_time, size)
+
+        return await self.call(fetch, kind=stage)
+
+    async def aclose(self):
+        if self._client is None:
+            return
+        if self.auth_token is not None:
+            try:
+                await self._http().post(f"{self.baseurl}/auth/signout", headers={'x-tableau-auth': self.auth_token})
+            except Exception as e:
+                logger.warning(f"Sign-out failed for {self.site_name}: {str(e)}")
+        self.signed_in_at = None
+        await self._client.aclose()
+        self._client = None
+
+
+class AsyncClientPool:
+    """Keeps one signed-in AsyncTableauClient per server/site/token between checks"""
+
+    def __init__(self):
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def get(self, server_url, site_name, token_name, token):
+        key = (server_url, site_name, token_name, token)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._clients[key] = AsyncTableauClient(
+                    server_url, site_name, token_name, token,
+                    max_age=int(os.getenv('TABLEAU_SESSION_MAX_AGE', DEFAULT_SESSION_MAX_AGE))
+                )
+        event_loop.run(client.ensure_signed_in())
+        return client
+
+    def close_all(self):
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            try:
+                event_loop.run(client.aclose())
+            except Exception as e:
+                logger.warning(f"Closing async client for {client.site_name} failed: {str(e)}")
+
+
+event_loop = EventLoopThread()
+async_client_pool = AsyncClientPool()
+atexit.register(async_client_pool.close_all)
@@ -0,0 +1,126 @@
+import os
+import threading
+
+from api.lazy import lazy_import
+
+np = lazy_import('numpy')
+
+DEFAULT_WINDOW = 64
+DEFAULT_MIN_SAMPLES = 10
+DEFAULT_P95_FACTOR = 1.5
+DEFAULT_P50_FACTOR = 2.0
+DEFAULT_MIN_DELTA = 1.0
+
+
+def _env_float(name, default):
+    return float(os.getenv(name, default))
+
+
+class BaselineTracker:
+    """Rolling per-view load time baselines, evaluated for all views at once.
+
+    Each view owns one row of a (views x window) array used as a ring buffer
+    of its most recent load times. p50/p95 for every view come from one
+    row-wise sort of that array, and a probe is flagged as slow when
+    it exceeds both `p95_factor` x its view's p95 and `p50_factor` x its p50
+    by at least `min_delta` seconds. Views with fewer than `min_samples`
+    samples fall back to the fixed threshold.
+    """
+
+    def __init__(self, window=None, min_samples=None, p95_factor=None,
+                 p50_factor=None, min_delta=None, history=None):
+        self.window = window or int(os.getenv('BASELINE_WINDOW', DEFAULT_WINDOW))
+        self.min_samples = min_samples or int(os.getenv('BASELINE_MIN_SAMPLES', DEFAULT_MIN_SAMPLES))
+        self.p95_factor = p95_factor or _env_float('BASELINE_P95_FACTOR', DEFAULT_P95_FACTOR)
+        self.p50_factor = p50_factor or _env_float('BASELINE_P50_FACTOR', DEFAULT_P50_FACTOR)
+        self.min_delta = min_delta if min_delta is not None else _env_float('BASELINE_MIN_DELTA', DEFAULT_MIN_DELTA)
+        self.history = history
+        self._rows = {}
+        # Allocated on first use, so creating a tracker does not load numpy
+        self._samples = None
+        self._positions = None
+        self._lock = threading.Lock()
+
+    def _row_indexes(self, view_ids):
+        """Map view ids to rows, growing the arrays for unseen views"""
+        if self._samples is None:
+            self._samples = np.full((0, self.window), np.nan)
+            self._positions = np.zeros(0, dtype=np.int64)
+        new_ids = [view_id for view_id in dict.fromkeys(view_ids) if view_id not in self._rows]
+        if new_ids:
+            start = len(self._rows)
+            for offset, view_id in enumerate(new_ids):
+                self._rows[view_id] = start + offset
+            grown = np.full((len(new_ids), self.window), np.nan)
+            self._samples = np.vstack([self._samples, grown])
+            self._positions = np.concatenate([self._positions, np.zeros(len(new_ids), dtype=np.int64)])
+            if self.history is not None:
+                self._seed(new_ids)
+        return np.fromiter((self._rows[view_id] for view_id in view_ids), dtype=np.int64, count=len(view_ids))
+
+    def _seed(self, view_ids):
+        """Fill new rows from recorded history so baselines survive restarts"""
+        for view_id in view_ids:
+            times = [s.load_time for s in self.history.tail(view_id, self.window) if s.load_time is not None]
+            if times:
+                row = self._rows[view_id]
+                self._samples[row, :len(times)] = times
+                self._positions[row] = len(times)
+
+    def _append(self, rows, values):
+        columns = self._positions[rows] % self.window
+        self._samples[rows, columns] = values
+        self._positions[rows] += 1
+
+    def baselines(self, view_ids):
+        """Return (p50, p95, sample_count) arrays for the given views"""
+        with self._lock:
+            rows = self._row_indexes(list(view_ids))
+            return self._quantiles(rows)
+
+    def _quantiles(self, rows):
+        # Sorting pushes NaN (unused ring slots) to the end of each row, so
+        # the q-quantile of a row with n samples sits at index q * (n - 1).
+        # This is what nanpercentile computes, without its per-row loop.
+        ordered = np.sort(self._samples[rows], axis=1)
+        counts = np.count_nonzero(~np.isnan(ordered), axis=1)
+        last = np.maximum(counts - 1, 0)
+        index = np.arange(len(rows))
+
+        def quantile(q):
+            position = q * last
+            lower = np.floor(position).astype(np.int64)
+            upper = np.ceil(position).astype(np.int64)
+            low_values = ordered[index, lower]
+            high_values = ordered[index, upper]
+            return low_values + (high_values - low_values) * (position - lower)
+
+        return quantile(0.5), quantile(0.95), counts
+
+    def evaluate(self, view_ids, load_times, fallback_threshold):
+        """Flag slow probes against each view's baseline, then add them to it.
+
+        Returns (slow, p50, p95) arrays aligned with view_ids. p50/p95 are
+        NaN for views still using the fallback threshold.
+        """
+        view_ids = list(view_ids)
+        values = np.asarray(load_times, dtype=np.float64)
+        if not view_ids:
+            empty = np.zeros(0)
+            return empty.astype(bool), empty, empty
+
+        with self._lock:
+            rows = self._row_indexes(view_ids)
+            p50, p95, counts = self._quantiles(rows)
+
+            established = counts >= self.min_samples
+            limit = np.maximum(p95 * self.p95_factor, p50 * self.p50_factor)
+            with np.errstate(invalid='ignore'):
+                relative = (values > limit) & (values - p50 >= self.min_delta)
+            slow = np.where(established, relative, values > fallback_threshold)
+
+            self._append(rows, values)
+
+        p50[~established] = np.nan
+        p95[~established] = np.nan
+        return slow, p50, p95
@@ -0,0 +1,248 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger('MonitorScheduler')
+
+DEFAULT_JITTER = 10
+DEFAULT_SCHEDULER_STATE_PATH = os.path.join('data', 'scheduler_state.json')
+
+_FIELDS = (
+    ('minute', 0, 59),
+    ('hour', 0, 23),
+    ('day', 1, 31),
+    ('month', 1, 12),
+    ('weekday', 0, 6),
+)
+
+_NAMES = {
+    'month': {name: number for number, name in enumerate(
+        ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'], start=1)},
+    'weekday': {name: number for number, name in enumerate(
+        ['sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat'])},
+}
+
+# Searching further than this for a match means the expression never fires
+# (e.g. 30 February)
+_MAX_SEARCH = timedelta(days=366 * 5)
+
+
+def _parse_value(text, field, low, high):
+    value = _NAMES.get(field, {}).get(text.lower())
+    if value is None:
+        value = int(text)
+    if field == 'weekday' and value == 7:
+        value = 0
+    if not low <= value <= high:
+        raise ValueError(f"{field} value {value} out of range {low}-{high}")
+    return value
+
+
+def _parse_field(text, field, low, high):
+    values = set()
+    for part in text.split(','):
+        step = 1
+        if '/' in part:
+            part, step_text = part.split('/', 1)
+            step = int(step_text)
+            if step < 1:
+                raise ValueError(f"Invalid step in {field} field: {text}")
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start_text, end_text = part.split('-', 1)
+            start = _parse_value(start_text, field, low, high)
+            end = _parse_value(end_text, field, low, high)
+        else:
+            start = _parse_value(part, field, low, high)
+            end = high if step > 1 else start
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+class CronSchedule:
+    """A standard five-field cron expression (minute hour day month weekday).
+
+    Supports `*`, lists, ranges, steps and month/weekday names. As in cron,
+    when both day of month and weekday are restricted a time matches if
+    either does. Times are evaluated in UTC.
+    """
+
+    def __init__(self, expression):
+        self.expression = expression.strip()
+        parts = self.expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"Cron expression must have 5 fields, got '{expression}'")
+        parsed = {
+            field: _parse_field(part, field, low, high)
+            for part, (field, low, high) in zip(parts, _FIELDS)
+        }
+        self.minutes = parsed['minute']
+        self.hours = parsed['hour']
+        self.days = parsed['day']
+        self.months = parsed['month']
+        self.weekdays = parsed['weekday']
+        self._any_day = parts[2] == '*'
+        self._any_weekday = parts[4] == '*'
+
+    def _day_matches(self, moment):
+        day = moment.day in self.days
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, moment):
+        """First matching minute strictly after `moment` (an aware datetime)"""
+        moment = moment.astimezone(timezone.utc).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + _MAX_SEARCH
+        while moment < limit:
+            if moment.month not in self.months:
+                year, month = (moment.year + 1, 1) if moment.month == 12 else (moment.year, moment.month + 1)
+                moment = moment.replace(year=year, month=month, day=1, hour=0, minute=0)
+            elif not self._day_matches(moment):
+                moment = (moment + timedelta(days=1)).replace(hour=0, minute=0)
+            elif moment.hour not in self.hours:
+                moment = (moment + timedelta(hours=1)).replace(minute=0)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f"Cron expression '{self.expression}' never matches")
+
+    def upcoming(self, count, after=None):
+        """The next `count` run times after `after` (default: now)"""
+        moment = after or datetime.now(timezone.utc)
+        times = []
+        for _ in range(count):
+            moment = self.next_after(moment)
+            times.append(moment)
+        return times
+
+
+def _format(moment):
+    return moment.strftime('%Y-%m-%d %H:%M:%S') if moment else None
+
+
+class CronScheduler:
+    """Runs a job in a background thread on a cron schedule.
+
+    Each run starts at a random offset of up to `jitter` seconds after its
+    scheduled minute, so instances sharing a schedule do not hit Tableau in
+    the same second. Runs are never overlapped: if a run overruns one or more
+    slots, or the process was asleep through them, the missed slots are
+    collapsed into a single catch-up run as soon as possible. The last run
+    time is persisted so that catch-up also works across restarts.
+    """
+
+    def __init__(self, job, expression, jitter=None, state_path=None, name='monitor-scheduler'):
+        self.job = job
+        self.schedule = CronSchedule(expression)
+        self.jitter = jitter if jitter is not None else float(os.getenv('SCHEDULER_JITTER', DEFAULT_JITTER))
+        self.state_path = state_path
+        self.name = name
+        self.last_run = None
+        self.last_duration = None
+        self.last_error = None
+        self.next_run = None
+        self.missed_runs = 0
+        self.running = False
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._run_lock = threading.Lock()
+        self._stopped = threading.Event()
+        if state_path:
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.state_path) as f:
+                data = json.load(f)
+            self.last_run = datetime.fromtimestamp(data['last_run'], timezone.utc)
+        except (OSError, ValueError, KeyError, TypeError):
+            self.last_run = None
+
+    def save(self):
+        if not self.state_path or self.last_run is None:
+            return
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(f"{self.state_path}.tmp", 'w') as f:
+            json.dump({"last_run": self.last_run.timestamp()}, f)
+        os.replace(f"{self.state_path}.tmp", self.state_path)
+
+    def _plan(self, now):
+        """Pick the next run; returns (when, missed slot count)"""
+        if self.last_run is not None:
+            missed = 0
+            slot = self.schedule.next_after(self.last_run)
+            while slot <= now and missed < 1000:
+                missed += 1
+                slot = self.schedule.next_after(slot)
+            if missed:
+                return now, missed
+        scheduled = self.schedule.next_after(now)
+        return scheduled + timedelta(seconds=random.uniform(0, self.jitter)), 0
+
+    def _loop(self):
+        while not self._stopped.is_set():
+            when, missed = self._plan(datetime.now(timezone.utc))
+            if missed:
+                self.missed_runs += missed
+                logger.warning(f"Missed {missed} scheduled run(s), catching up now")
+            self.next_run = when
+
+            delay = (when - datetime.now(timezone.utc)).total_seconds()
+            if delay > 0 and self._stopped.wait(delay):
+                break
+            self.run_now()
+
+    def run_now(self):
+        """Run the job in the calling thread and record its outcome"""
+        with self._run_lock:
+            self.running = True
+            started = datetime.now(timezone.utc)
+            start_time = time.perf_counter()
+            try:
+                self.job()
+                self.last_error = None
+            except Exception as e:
+                logger.error(f"Scheduled run failed: {str(e)}")
+                self.last_error = str(e)
+            finally:
+                self.last_duration = time.perf_counter() - start_time
+                self.last_run = started
+                self.running = False
+                self.save()
+
+    def start(self):
+        """Start the scheduler thread (idempotent, cheap once running)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped.clear()
+                self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def status(self, upcoming=5):
+        return {
+            "schedule": self.schedule.expression,
+            "active": self._thread is not None and self._thread.is_alive(),
+            "running": self.running,
+            "next_run": _format(self.next_run),
+            "upcoming_runs": [_format(moment) for moment in self.schedule.upcoming(upcoming)],
+            "last_run": _format(self.last_run),
+            "last_duration": round(self.last_duration, 3) if self.last_duration is not None else None,
+            "last_error": self.last_error,
+            "missed_runs": self.missed_runs,
+            "jitter": self.jitter
+        }
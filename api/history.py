@@ -0,0 +1,573 @@
+import atexit
+import bisect
+import json
+import logging
+import math
+import os
+import queue
+import re
+import struct
+import threading
+import time
+from datetime import datetime, timezone
+
+logger = logging.getLogger('TableauHistory')
+
+DEFAULT_HISTORY_DIR = os.path.join('data', 'history')
+
+STAGES = ('preview', 'image', 'pdf')
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+# Raw sample: timestamp, load time, status, then total and ttfb per stage.
+# Missing values are stored as NaN.
+RAW_RECORD = struct.Struct('<dfB' + 'ff' * len(STAGES))
+
+# Load time histogram used by rollups: bin i covers [EDGES[i-1], EDGES[i]),
+# growing by 1.5x from 100ms, with an open-ended last bin (~29s and up).
+HISTOGRAM_EDGES = tuple(0.1 * 1.5 ** k for k in range(15))
+HISTOGRAM_BINS = len(HISTOGRAM_EDGES) + 1
+
+# Rollup bucket: start, count, errors, sum and max of load time, histogram
+ROLLUP_RECORD = struct.Struct('<qIIdf' + 'I' * HISTOGRAM_BINS)
+
+RESOLUTIONS = {
+    '1m': 60,
+    '1h': 3600,
+    '1d': 86400,
+}
+
+# Default retention in seconds for raw samples and each rollup level
+DEFAULT_RETENTION = {
+    'raw': 2 * 86400,
+    '1m': 7 * 86400,
+    '1h': 90 * 86400,
+    '1d': 730 * 86400,
+}
+
+COMPACTION_INTERVAL = 3600
+
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 7 * 86400}
+
+# Bucket sizes picked for a query that gives no resolution
+AUTO_RESOLUTIONS = (60, 300, 900, 3600, 6 * 3600, 86400, 7 * 86400)
+
+
+def _safe_name(view_id):
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', view_id)
+
+
+def _nan_if_none(value):
+    return float('nan') if value is None else value
+
+
+def _none_if_nan(value):
+    return None if math.isnan(value) else value
+
+
+def _rounded(value):
+    return None if value is None else round(value, 3)
+
+
+def histogram_bin(load_time):
+    return bisect.bisect_right(HISTOGRAM_EDGES, load_time)
+
+
+def parse_duration(text):
+    """Seconds in a duration such as '90s', '5m', '1h', '30d' or '2w'"""
+    match = re.fullmatch(r'\s*(\d+)\s*([smhdw])\s*', str(text))
+    if match is None or int(match.group(1)) == 0:
+        raise ValueError(f"Invalid duration '{text}', expected e.g. 5m, 1h or 30d")
+    return int(match.group(1)) * DURATION_UNITS[match.group(2)]
+
+
+def format_duration(seconds):
+    for unit, size in sorted(DURATION_UNITS.items(), key=lambda item: -item[1]):
+        if seconds % size == 0:
+            return f"{seconds // size}{unit}"
+
+
+def parse_timestamp(text):
+    """Unix time from epoch seconds or an ISO 8601 time (UTC unless it has an offset)"""
+    try:
+        seconds = float(text)
+    except ValueError:
+        pass
+    else:
+        # float() also takes 'nan' and 'inf'
+        if not math.isfinite(seconds):
+            raise ValueError(f"Invalid time '{text}', expected epoch seconds or ISO 8601")
+        return seconds
+    try:
+        moment = datetime.fromisoformat(text.strip().replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f"Invalid time '{text}', expected epoch seconds or ISO 8601") from None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def auto_resolution(span, points):
+    """Smallest AUTO_RESOLUTIONS bucket that covers span seconds in at most `points` buckets"""
+    for step in AUTO_RESOLUTIONS:
+        if span / step <= points:
+            return step
+    return AUTO_RESOLUTIONS[-1]
+
+
+def rollup_level(step):
+    """Coarsest rollup level whose buckets tile buckets of `step` seconds"""
+    levels = [level for level, seconds in RESOLUTIONS.items() if step % seconds == 0]
+    if not levels:
+        raise ValueError(f"Resolution must be a whole number of minutes, got {step}s")
+    return max(levels, key=RESOLUTIONS.get)
+
+
+def _timestamp_reader(f, record):
+    """Function reading the leading timestamp of the index-th record of an open file"""
+    first_field = struct.Struct(record.format[:2])
+
+    def timestamp_at(index):
+        f.seek(index * record.size)
+        return first_field.unpack(f.read(first_field.size))[0]
+
+    return timestamp_at
+
+
+def _search(timestamp_at, count, value, inclusive=False):
+    """Index of the first of `count` time-ordered records at or after value (after, if inclusive)"""
+    low, high = 0, count
+    while low < high:
+        middle = (low + high) // 2
+        timestamp = timestamp_at(middle)
+        if timestamp < value or (inclusive and timestamp == value):
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+class Rollup:
+    """Aggregate of the samples that fall into one time bucket"""
+
+    __slots__ = ('start', 'count', 'errors', 'total', 'max', 'histogram')
+
+    def __init__(self, start, count=0, errors=0, total=0.0, maximum=0.0, histogram=None):
+        self.start = start
+        self.count = count
+        self.errors = errors
+        self.total = total
+        self.max = maximum
+        self.histogram = list(histogram) if histogram else [0] * HISTOGRAM_BINS
+
+    def add(self, load_time, failed):
+        self.count += 1
+        if failed or load_time is None:
+            self.errors += 1
+            return
+        self.total += load_time
+        self.max = max(self.max, load_time)
+        self.histogram[histogram_bin(load_time)] += 1
+
+    def merge(self, other):
+        self.count += other.count
+        self.errors += other.errors
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        self.histogram = [a + b for a, b in zip(self.histogram, other.histogram)]
+
+    def quantile(self, q):
+        """Load time at quantile q of the successful samples, interpolated within its histogram bin"""
+        successes = sum(self.histogram)
+        if not successes:
+            return None
+        rank = q * successes
+        cumulative = 0
+        for index, count in enumerate(self.histogram):
+            if count and cumulative + count >= rank:
+                lower = HISTOGRAM_EDGES[index - 1] if index > 0 else 0.0
+                upper = HISTOGRAM_EDGES[index] if index < len(HISTOGRAM_EDGES) else self.max
+                return min(lower + (upper - lower) * (rank - cumulative) / count, self.max)
+            cumulative += count
+        return self.max
+
+    def to_dict(self):
+        successes = self.count - self.errors
+        return {
+            "start": self.start,
+            "count": self.count,
+            "errors": self.errors,
+            "error_rate": round(self.errors / self.count, 4) if self.count else None,
+            "p50": _rounded(self.quantile(0.50)),
+            "p95": _rounded(self.quantile(0.95)),
+            "max": _rounded(self.max) if successes else None,
+            "mean": _rounded(self.total / successes) if successes else None
+        }
+
+    def pack(self):
+        return ROLLUP_RECORD.pack(self.start, self.count, self.errors, self.total, self.max, *self.histogram)
+
+    @classmethod
+    def unpack(cls, data):
+        values = ROLLUP_RECORD.unpack(data)
+        return cls(values[0], values[1], values[2], values[3], values[4], values[5:])
+
+
+class Sample:
+    """One probe outcome as stored in the raw log"""
+
+    __slots__ = ('timestamp', 'load_time', 'status', 'stages')
+
+    def __init__(self, timestamp, load_time, status, stages):
+        self.timestamp = timestamp
+        self.load_time = load_time
+        self.status = status
+        self.stages = stages
+
+    @classmethod
+    def from_probe(cls, result, timestamp=None):
+        """Sample of a probe result, stamped with the time the probe started unless given a timestamp"""
+        stages = {stage.stage: (stage.total, stage.ttfb) for stage in result.stages}
+        return cls(
+            timestamp or result.started_at,
+            result.load_time,
+            STATUS_ERROR if result.failed else STATUS_OK,
+            stages
+        )
+
+    def pack(self):
+        values = [self.timestamp, _nan_if_none(self.load_time), self.status]
+        for stage in STAGES:
+            total, ttfb = self.stages.get(stage, (None, None))
+            values.extend([_nan_if_none(total), _nan_if_none(ttfb)])
+        return RAW_RECORD.pack(*values)
+
+    @classmethod
+    def unpack(cls, data):
+        values = RAW_RECORD.unpack(data)
+        stages = {}
+        for i, stage in enumerate(STAGES):
+            total, ttfb = values[3 + 2 * i], values[4 + 2 * i]
+            if not math.isnan(total):
+                stages[stage] = (total, _none_if_nan(ttfb))
+        return cls(values[0], _none_if_nan(values[1]), values[2], stages)
+
+    def to_dict(self):
+        return {
+            "timestamp": self.timestamp,
+            "load_time": self.load_time,
+            "status": "error" if self.status == STATUS_ERROR else "active",
+            "stages": {
+                stage: {"total": total, "ttfb": ttfb} for stage, (total, ttfb) in self.stages.items()
+            }
+        }
+
+
+class HistoryStore:
+    """Append-only, per-view history of probe results on local disk.
+
+    Layout under `root`:
+        raw/<view_id>.bin    fixed-size RAW_RECORD samples in time order
+        1m|1h|1d/<view_id>.bin
+                             fixed-size ROLLUP_RECORD buckets in time order
+        views.json           view id -> name/project/workbook metadata
+
+    Writes go through a queue drained by one background thread, so recording
+    a sample never blocks a monitoring tick on disk I/O. Rollup buckets are
+    kept open in memory and appended once a later sample closes them.
+    Retention is enforced by periodically rewriting each file from the first
+    record that is still inside its retention window.
+    """
+
+    def __init__(self, root=None, retention=None):
+        self.root = root or os.getenv('HISTORY_DIR', DEFAULT_HISTORY_DIR)
+        self.retention = dict(DEFAULT_RETENTION)
+        if retention:
+            self.retention.update(retention)
+        self._queue = queue.Queue()
+        self._open = {}
+        self._views = None
+        self._views_dirty = False
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self._thread = None
+        self._last_compaction = time.monotonic()
+
+    # Writing
+
+    def record(self, view, result, timestamp=None):
+        """Queue a probe result for a view; returns immediately.
+
+        The sample is stamped with the time the probe started, not the time
+        it is recorded, which can be much later for deferred or queued checks.
+        """
+        meta = {
+            "name": view.name,
+            "project_id": getattr(view, 'project_id', None),
+            "project_name": getattr(view, 'project_name', None),
+            "workbook_id": getattr(view, 'workbook_id', None),
+        }
+        self._queue.put((view.id, meta, Sample.from_probe(result, timestamp)))
+        self._ensure_writer()
+
+    def _ensure_writer(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._writer, name='history-writer', daemon=True)
+                self._thread.start()
+
+    def _writer(self):
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write_batch(batch)
+                if time.monotonic() - self._last_compaction >= COMPACTION_INTERVAL:
+                    self.compact()
+            except Exception as e:
+                logger.error(f"Failed to write history: {str(e)}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _path(self, level, view_id):
+        return os.path.join(self.root, level, f"{_safe_name(view_id)}.bin")
+
+    def _append(self, level, view_id, record, entries):
+        """Write (timestamp, packed record) entries, keeping the file in time order.
+
+        Entries no older than the file's last record are appended. A late
+        entry, such as a sample from a queued check, is merged into the tail
+        of the file instead, so readers can keep binary searching by time.
+        """
+        entries = sorted(entries, key=lambda entry: entry[0])
+        path = self._path(level, view_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a+b') as f:
+            count = os.fstat(f.fileno()).st_size // record.size
+            timestamp_at = _timestamp_reader(f, record)
+            if count == 0 or timestamp_at(count - 1) <= entries[0][0]:
+                f.write(b''.join(packed for _, packed in entries))
+                return
+
+            # Rewrite from the first record newer than the earliest entry;
+            # equal timestamps keep the record already on disk first
+            first = _search(timestamp_at, count, entries[0][0], inclusive=True)
+            f.seek(first * record.size)
+            tail = f.read((count - first) * record.size)
+            first_field = struct.Struct(record.format[:2])
+            merged = [(first_field.unpack_from(tail, i)[0], tail[i:i + record.size])
+                      for i in range(0, len(tail), record.size)]
+            merged = sorted(merged + entries, key=lambda entry: entry[0])
+            f.truncate(first * record.size)
+            f.write(b''.join(packed for _, packed in merged))
+
+    def _write_batch(self, batch):
+        raw = {}
+        closed = {}
+        views = self._load_views()
+
+        with self._file_lock:
+            # Samples carry their probe's start time, so concurrent probes can
+            # queue them slightly out of order
+            for view_id, meta, sample in sorted(batch, key=lambda item: item[2].timestamp):
+                raw.setdefault(view_id, []).append((sample.timestamp, sample.pack()))
+                if views.get(view_id) != meta:
+                    views[view_id] = meta
+                    self._views_dirty = True
+
+                for level, seconds in RESOLUTIONS.items():
+                    start = int(sample.timestamp // seconds * seconds)
+                    key = (level, view_id)
+                    bucket = self._open.get(key)
+                    if bucket is not None and start < bucket.start:
+                        # Late sample for an already closed bucket: rollups() merges
+                        # buckets with the same start on read
+                        late = Rollup(start)
+                        late.add(sample.load_time, sample.status == STATUS_ERROR)
+                        closed.setdefault(key, []).append((start, late.pack()))
+                        continue
+                    if bucket is not None and bucket.start != start:
+                        closed.setdefault(key, []).append((bucket.start, bucket.pack()))
+                        bucket = None
+                    if bucket is None:
+                        bucket = self._open[key] = Rollup(start)
+                    bucket.add(sample.load_time, sample.status == STATUS_ERROR)
+
+            for view_id, entries in raw.items():
+                self._append('raw', view_id, RAW_RECORD, entries)
+            for (level, view_id), entries in closed.items():
+                self._append(level, view_id, ROLLUP_RECORD, entries)
+
+            if self._views_dirty:
+                self._save_views(views)
+
+    def flush(self):
+        """Wait for queued samples and write out the open rollup buckets"""
+        if self._thread is not None:
+            self._queue.join()
+        with self._file_lock:
+            for (level, view_id), bucket in self._open.items():
+                self._append(level, view_id, ROLLUP_RECORD, [(bucket.start, bucket.pack())])
+            self._open.clear()
+
+    # Metadata
+
+    def _load_views(self):
+        if self._views is None:
+            try:
+                with open(os.path.join(self.root, 'views.json')) as f:
+                    self._views = json.load(f)
+            except (OSError, ValueError):
+                self._views = {}
+        return self._views
+
+    def _save_views(self, views):
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, 'views.json')
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(views, f)
+        os.replace(f"{path}.tmp", path)
+        self._views_dirty = False
+
+    def views(self):
+        """Return the view id -> metadata index"""
+        with self._file_lock:
+            return dict(self._load_views())
+
+    def find_views(self, view=None, project=None):
+        """(view_id, metadata) of recorded views matching a view and/or project id or name"""
+        matches = []
+        for view_id, meta in self.views().items():
+            if view is not None and view not in (view_id, meta.get("name")):
+                continue
+            if project is not None and project not in (meta.get("project_id"), meta.get("project_name")):
+                continue
+            matches.append((view_id, meta))
+        return matches
+
+    # Reading
+
+    def _read_range(self, level, view_id, record, start, end):
+        """Read records whose leading timestamp falls within [start, end)"""
+        try:
+            f = open(self._path(level, view_id), 'rb')
+        except FileNotFoundError:
+            return []
+
+        with f:
+            count = os.fstat(f.fileno()).st_size // record.size
+            timestamp_at = _timestamp_reader(f, record)
+
+            # _append() keeps records in time order, so binary search both ends
+            first = _search(timestamp_at, count, start)
+            last = _search(timestamp_at, count, end) if end != float('inf') else count
+            f.seek(first * record.size)
+            data = f.read((last - first) * record.size)
+
+        return [data[i:i + record.size] for i in range(0, len(data), record.size)]
+
+    def samples(self, view_id, start=0, end=float('inf')):
+        """Raw samples for a view within [start, end)"""
+        return [Sample.unpack(r) for r in self._read_range('raw', view_id, RAW_RECORD, start, end)]
+
+    def tail(self, view_id, count):
+        """The most recent `count` raw samples for a view, oldest first"""
+        try:
+            f = open(self._path('raw', view_id), 'rb')
+        except FileNotFoundError:
+            return []
+        with f:
+            available = os.fstat(f.fileno()).st_size // RAW_RECORD.size
+            first = max(0, available - count)
+            f.seek(first * RAW_RECORD.size)
+            data = f.read((available - first) * RAW_RECORD.size)
+        return [Sample.unpack(data[i:i + RAW_RECORD.size]) for i in range(0, len(data), RAW_RECORD.size)]
+
+    def rollups(self, view_id, level, start=0, end=float('inf')):
+        """Rollup buckets for a view within [start, end), including open ones"""
+        buckets = {}
+        for data in self._read_range(level, view_id, ROLLUP_RECORD, start, end):
+            bucket = Rollup.unpack(data)
+            if bucket.start in buckets:
+                buckets[bucket.start].merge(bucket)
+            else:
+                buckets[bucket.start] = bucket
+
+        with self._file_lock:
+            current = self._open.get((level, view_id))
+            if current is not None and start <= current.start < end:
+                pending = Rollup(current.start, current.count, current.errors,
+                                 current.total, current.max, current.histogram)
+                if pending.start in buckets:
+                    buckets[pending.start].merge(pending)
+                else:
+                    buckets[pending.start] = pending
+
+        return [buckets[key] for key in sorted(buckets)]
+
+    def series(self, view_id, start, end, step):
+        """Rollups of a view in buckets of `step` seconds over [start, end).
+
+        Built from the coarsest stored level that fits the step, so even a
+        long range reads a few hundred records at most and never raw
+        samples. Buckets without samples are left out.
+        """
+        level = rollup_level(step)
+        first = int(start // step * step)
+        buckets = {}
+        for rollup in self.rollups(view_id, level, first, end):
+            bucket_start = rollup.start // step * step
+            bucket = buckets.get(bucket_start)
+            if bucket is None:
+                buckets[bucket_start] = Rollup(bucket_start, rollup.count, rollup.errors,
+                                               rollup.total, rollup.max, rollup.histogram)
+            else:
+                bucket.merge(rollup)
+        return [buckets[key] for key in sorted(buckets)]
+
+    # Retention
+
+    def compact(self, now=None):
+        """Drop records older than each level's retention window"""
+        now = now or time.time()
+        self._last_compaction = time.monotonic()
+        levels = [('raw', RAW_RECORD)] + [(level, ROLLUP_RECORD) for level in RESOLUTIONS]
+
+        with self._file_lock:
+            for level, record in levels:
+                directory = os.path.join(self.root, level)
+                if not os.path.isdir(directory):
+                    continue
+                cutoff = now - self.retention[level]
+                for name in os.listdir(directory):
+                    if name.endswith('.bin'):
+                        self._compact_file(os.path.join(directory, name), record, cutoff)
+
+    def _compact_file(self, path, record, cutoff):
+        with open(path, 'rb') as f:
+            data = f.read()
+        first_field = struct.Struct(record.format[:2])
+        count = len(data) // record.size
+
+        keep_from = 0
+        while keep_from < count and first_field.unpack_from(data, keep_from * record.size)[0] < cutoff:
+            keep_from += 1
+
+        if keep_from == 0:
+            return
+        if keep_from == count:
+            os.remove(path)
+            return
+        with open(f"{path}.tmp", 'wb') as f:
+            f.write(data[keep_from * record.size:count * record.size])
+        os.replace(f"{path}.tmp", path)
+
+
+history_store = HistoryStore()
+atexit.register(history_store.flush)
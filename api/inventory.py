@@ -0,0 +1,109 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from api.metrics import LISTING_SECONDS
+
+logger = logging.getLogger('TableauInventory')
+
+DEFAULT_INVENTORY_TTL = 300
+DEFAULT_FULL_RESYNC_INTERVAL = 3600
+# updatedAt filters only have one-second resolution, so incremental listings
+# re-read this much before the newest update seen to catch same-second ones
+INCREMENTAL_OVERLAP = timedelta(seconds=5)
+
+
+class _SiteInventory:
+    def __init__(self):
+        self.views = OrderedDict()
+        self.high_water = None
+        self.refreshed_at = None
+        self.full_synced_at = None
+        self.lock = threading.Lock()
+
+
+class ViewInventory:
+    """Cached list of a site's views, refreshed incrementally.
+
+    Within `ttl` seconds the cached list is returned without touching the
+    REST API. After that only views updated since shortly before the newest
+    update already seen are fetched and merged by id, and every `full_resync_interval` seconds the
+    whole site is listed again so that deleted views drop out. Any session
+    with server_url, site_name and list_views(updated_since=None) works: a
+    TableauSession or an AsyncTableauClient.
+    """
+
+    def __init__(self, ttl=None, full_resync_interval=None):
+        if ttl is None:
+            ttl = int(os.getenv('VIEW_INVENTORY_TTL', DEFAULT_INVENTORY_TTL))
+        if full_resync_interval is None:
+            full_resync_interval = int(os.getenv('VIEW_INVENTORY_FULL_RESYNC', DEFAULT_FULL_RESYNC_INTERVAL))
+        self.ttl = ttl
+        self.full_resync_interval = full_resync_interval
+        self._sites = {}
+        self._lock = threading.Lock()
+
+    def _site(self, session):
+        key = (session.server_url, session.site_name)
+        with self._lock:
+            if key not in self._sites:
+                self._sites[key] = _SiteInventory()
+            return self._sites[key]
+
+    def _full_sync(self, session, site):
+        start_time = time.perf_counter()
+        views = session.list_views()
+        LISTING_SECONDS.labels('full').observe(time.perf_counter() - start_time)
+        site.views = OrderedDict((view.id, view) for view in views)
+        site.full_synced_at = time.monotonic()
+        site.high_water = max((v.updated_at for v in views if v.updated_at), default=None)
+        logger.info(f"Full view sync for {session.site_name}: {len(views)} views")
+
+    def _incremental_sync(self, session, site):
+        start_time = time.perf_counter()
+        changed = session.list_views(updated_since=site.high_water - INCREMENTAL_OVERLAP)
+        LISTING_SECONDS.labels('incremental').observe(time.perf_counter() - start_time)
+        # Views in the overlap come back unchanged; only count the ones that moved on
+        changed = [
+            view for view in changed
+            if view.id not in site.views or site.views[view.id].updated_at != view.updated_at
+        ]
+        for view in changed:
+            site.views[view.id] = view
+            if view.updated_at and view.updated_at > site.high_water:
+                site.high_water = view.updated_at
+        if changed:
+            logger.info(f"Incremental view sync for {session.site_name}: {len(changed)} changed")
+
+    def get_views(self, session):
+        """Return the site's views, listing from Tableau only when the cache is due"""
+        site = self._site(session)
+        with site.lock:
+            now = time.monotonic()
+            fresh = site.refreshed_at is not None and now - site.refreshed_at < self.ttl
+            if not fresh:
+                full_due = (
+                    site.full_synced_at is None
+                    or site.high_water is None
+                    or now - site.full_synced_at >= self.full_resync_interval
+                )
+                if full_due:
+                    self._full_sync(session, site)
+                else:
+                    self._incremental_sync(session, site)
+                site.refreshed_at = now
+            return list(site.views.values())
+
+    def invalidate(self, session=None):
+        """Force the next get_views() to do a full resync"""
+        with self._lock:
+            if session is None:
+                self._sites.clear()
+            else:
+                self._sites.pop((session.server_url, session.site_name), None)
+
+
+view_inventory = ViewInventory()
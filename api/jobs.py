@@ -0,0 +1,126 @@
+import os
+import queue
+import threading
+import traceback
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while `max_queued` jobs are waiting"""
+
+
+class JobQueue:
+    """In-process job queue drained by a small pool of daemon worker threads.
+
+    Workers are started lazily on the first submit so that forking servers
+    such as gunicorn never inherit running threads from the master process.
+    Only the most recent `max_jobs` jobs are kept for status lookups, and
+    at most `max_queued` jobs wait for a worker. A job submitted with the
+    `key` of a job still waiting is merged into it, so work that piles up
+    while the workers are busy runs once rather than back to back.
+    """
+
+    def __init__(self, workers=1, max_jobs=200, max_queued=None):
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self.max_queued = max_queued
+        self._queue = queue.Queue()
+        self._jobs = OrderedDict()
+        # key -> id of the job with that key waiting for a worker
+        self._waiting = {}
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _ensure_workers(self):
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(
+                    target=self._worker,
+                    name=f"job-worker-{len(self._threads)}",
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def _worker(self):
+        while True:
+            job_id, key, func, args, kwargs = self._queue.get()
+            with self._lock:
+                if key is not None and self._waiting.get(key) == job_id:
+                    del self._waiting[key]
+            self._update(job_id, status="running", started_at=_now())
+            try:
+                result = func(*args, **kwargs)
+                self._update(job_id, status="finished", finished_at=_now(), result=result)
+            except Exception as e:
+                traceback.print_exc()
+                self._update(job_id, status="failed", finished_at=_now(), error=str(e))
+            finally:
+                self._queue.task_done()
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+
+    def submit(self, func, *args, name=None, key=None, **kwargs):
+        """Queue func(*args, **kwargs) and return the new job's status record.
+
+        If a job with the same key is still waiting, its record is returned
+        instead and nothing new is queued. Raises QueueFull when max_queued
+        jobs are already waiting.
+        """
+        with self._lock:
+            waiting = self._jobs.get(self._waiting.get(key)) if key is not None else None
+            if waiting is not None:
+                return dict(waiting)
+            if self.max_queued is not None and self._queue.qsize() >= self.max_queued:
+                raise QueueFull(f"{self._queue.qsize()} jobs are already waiting")
+
+            job_id = uuid.uuid4().hex
+            job = {
+                "id": job_id,
+                "name": name or getattr(func, '__name__', 'job'),
+                "status": "queued",
+                "created_at": _now(),
+                "started_at": None,
+                "finished_at": None,
+                "result": None,
+                "error": None
+            }
+            self._jobs[job_id] = job
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+            if key is not None:
+                self._waiting[key] = job_id
+            self._queue.put((job_id, key, func, args, kwargs))
+            job = dict(job)
+
+        self._ensure_workers()
+        return job
+
+    def get(self, job_id):
+        """Return a copy of the job's status record, or None if unknown"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def depth(self):
+        """Number of jobs waiting to be picked up by a worker"""
+        return self._queue.qsize()
+
+
+DEFAULT_MAX_QUEUED_JOBS = 20
+
+job_queue = JobQueue(
+    workers=int(os.getenv('JOB_WORKERS', 1)),
+    max_queued=int(os.getenv('JOB_MAX_QUEUED', DEFAULT_MAX_QUEUED_JOBS))
+)
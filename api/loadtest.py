@@ -0,0 +1,349 @@
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from api.inventory import view_inventory
+from api.lazy import lazy_import
+from api.probes import _stage_url, _stream_stage
+
+requests = lazy_import('requests')
+
+logger = logging.getLogger('TableauLoadTest')
+
+STAGES = ('preview', 'image', 'pdf')
+
+# Caps on a single load test, configurable only downwards of the hard limits
+DEFAULT_MAX_CONCURRENCY = 50
+DEFAULT_MAX_REQUESTS = 1000
+DEFAULT_MAX_DURATION = 300
+HARD_MAX_CONCURRENCY = 200
+HARD_MAX_REQUESTS = 5000
+HARD_MAX_DURATION = 1800
+
+# Seconds a reservation holds the tester for a run that has not started yet
+RESERVATION_TIMEOUT = 60
+
+DEFAULT_STEPS = 6
+DEFAULT_REQUESTS_PER_CLIENT = 3
+
+# A level is past saturation when its p95 grows beyond this multiple of the
+# lowest level's p95, its error rate exceeds SATURATION_ERROR_RATE, or it
+# adds less than SATURATION_MIN_GAIN throughput over the previous level
+SATURATION_LATENCY_FACTOR = 2.0
+SATURATION_ERROR_RATE = 0.05
+SATURATION_MIN_GAIN = 0.10
+# The ramp stops early once a level fails this often
+ABORT_ERROR_RATE = 0.5
+
+ERROR_SAMPLES = 5
+
+
+class LoadTestBusy(Exception):
+    """Raised when a load test is started while another one is running"""
+
+
+def _capped(name, default, hard_limit, parse=int):
+    return max(1, min(parse(os.getenv(name, default)), hard_limit))
+
+
+def load_test_limits():
+    """(max_concurrency, max_requests, max_duration) from the environment, within the hard limits"""
+    return (
+        _capped('LOADTEST_MAX_CONCURRENCY', DEFAULT_MAX_CONCURRENCY, HARD_MAX_CONCURRENCY),
+        _capped('LOADTEST_MAX_REQUESTS', DEFAULT_MAX_REQUESTS, HARD_MAX_REQUESTS),
+        _capped('LOADTEST_MAX_DURATION', DEFAULT_MAX_DURATION, HARD_MAX_DURATION, float)
+    )
+
+
+def ramp_levels(max_concurrency, steps):
+    """Concurrency levels from 1 to max_concurrency, spaced geometrically"""
+    if steps <= 1 or max_concurrency == 1:
+        return [max_concurrency]
+    levels = {max(1, round(max_concurrency ** (i / (steps - 1)))) for i in range(steps)}
+    return sorted(levels)
+
+
+def percentile(values, q):
+    """Linear-interpolated percentile of a non-empty sorted list"""
+    position = (len(values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class LoadTestPlan:
+    """What to render and how hard, checked against the caps when created"""
+
+    __slots__ = ('view', 'stage', 'levels', 'requests_per_client')
+
+    def __init__(self, view, stage='image', max_concurrency=10, steps=DEFAULT_STEPS,
+                 requests_per_client=DEFAULT_REQUESTS_PER_CLIENT):
+        max_allowed, max_requests, _ = load_test_limits()
+        if not isinstance(view, str) or not view.strip() or view.strip() == '*':
+            raise ValueError("view must name exactly one view (id or name)")
+        if stage not in STAGES:
+            raise ValueError(f"stage must be one of: {', '.join(STAGES)}")
+        if not isinstance(max_concurrency, int) or not 1 <= max_concurrency <= max_allowed:
+            raise ValueError(f"max_concurrency must be between 1 and {max_allowed}")
+        if not isinstance(steps, int) or not 1 <= steps <= 20:
+            raise ValueError("steps must be between 1 and 20")
+        if not isinstance(requests_per_client, int) or not 1 <= requests_per_client <= 100:
+            raise ValueError("requests_per_client must be between 1 and 100")
+
+        self.view = view.strip()
+        self.stage = stage
+        self.levels = ramp_levels(max_concurrency, steps)
+        self.requests_per_client = requests_per_client
+        if self.total_requests > max_requests:
+            raise ValueError(
+                f"Plan needs {self.total_requests} renders, more than the limit of {max_requests}; "
+                "lower max_concurrency, steps or requests_per_client"
+            )
+
+    @property
+    def total_requests(self):
+        return sum(self.levels) * self.requests_per_client
+
+
+class LevelResult:
+    """Latencies and errors of every render made at one concurrency level"""
+
+    __slots__ = ('concurrency', 'latencies', 'errors', 'error_messages', 'elapsed', '_lock')
+
+    def __init__(self, concurrency):
+        self.concurrency = concurrency
+        self.latencies = []
+        self.errors = 0
+        self.error_messages = Counter()
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, latency, error=None):
+        with self._lock:
+            if error is None:
+                self.latencies.append(latency)
+            else:
+                self.errors += 1
+                self.error_messages[error[:200]] += 1
+
+    @property
+    def requests(self):
+        return len(self.latencies) + self.errors
+
+    @property
+    def error_rate(self):
+        return self.errors / self.requests if self.requests else 0.0
+
+    @property
+    def throughput(self):
+        """Successful renders per second"""
+        return len(self.latencies) / self.elapsed if self.elapsed else 0.0
+
+    def quantile(self, q):
+        return percentile(sorted(self.latencies), q) if self.latencies else None
+
+    def to_dict(self):
+        def rounded(value):
+            return round(value, 4) if value is not None else None
+
+        return {
+            "concurrency": self.concurrency,
+            "requests": self.requests,
+            "errors": self.errors,
+            "error_rate": round(self.error_rate, 4),
+            "p50": rounded(self.quantile(0.50)),
+            "p95": rounded(self.quantile(0.95)),
+            "p99": rounded(self.quantile(0.99)),
+            "throughput": round(self.throughput, 2),
+            "elapsed": round(self.elapsed, 3),
+            "error_samples": [message for message, _ in self.error_messages.most_common(ERROR_SAMPLES)]
+        }
+
+
+def find_saturation(levels):
+    """The highest level before latency, errors or throughput show the view saturating.
+
+    Returns (concurrency, reason); concurrency is None when even the lowest
+    level saturated, and reason is None when no level did.
+    """
+    baseline = next((level.quantile(0.95) for level in levels if level.latencies), None)
+    previous = None
+    for level in levels:
+        reason = None
+        p95 = level.quantile(0.95)
+        if level.error_rate > SATURATION_ERROR_RATE:
+            reason = f"error rate {level.error_rate:.0%} at {level.concurrency} clients"
+        elif baseline and p95 is not None and p95 > baseline * SATURATION_LATENCY_FACTOR:
+            reason = f"p95 {p95:.2f}s at {level.concurrency} clients, over {SATURATION_LATENCY_FACTOR:g}x the {baseline:.2f}s at the lowest level"
+        elif previous is not None and level.throughput < previous.throughput * (1 + SATURATION_MIN_GAIN):
+            reason = f"throughput flat at {level.throughput:.1f} renders/s from {previous.concurrency} to {level.concurrency} clients"
+        if reason is not None:
+            return (previous.concurrency if previous else None), reason
+        previous = level
+    return (previous.concurrency if previous else None), None
+
+
+def _run_level(server, url, stage, concurrency, requests_per_client, deadline):
+    """Render url with `concurrency` clients at once, each making requests_per_client renders"""
+    result = LevelResult(concurrency)
+    start_line = threading.Barrier(concurrency, timeout=60)
+
+    def client():
+        try:
+            # Every client has its own connection, like a separate user would
+            http = requests.Session()
+        except Exception as e:
+            start_line.abort()
+            result.record(0.0, f"Client could not start: {str(e) or type(e).__name__}")
+            return
+        try:
+            try:
+                start_line.wait()
+            except threading.BrokenBarrierError:
+                # Count a start that never came together against the level
+                # instead of aborting the whole test
+                result.record(0.0, "Client could not start: not every client reached the start line")
+                return
+            for _ in range(requests_per_client):
+                if time.monotonic() >= deadline:
+                    return
+                start_time = time.perf_counter()
+                try:
+                    timing = _stream_stage(server, url, stage, http=http)
+                except Exception as e:
+                    result.record(time.perf_counter() - start_time, str(e) or type(e).__name__)
+                else:
+                    result.record(timing.total)
+        finally:
+            http.close()
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='load-test') as executor:
+        for future in [executor.submit(client) for _ in range(concurrency)]:
+            future.result()
+    result.elapsed = time.perf_counter() - start_time
+    return result
+
+
+def resolve_view(views, wanted):
+    """The one view whose id or name is `wanted`"""
+    matches = [view for view in views if wanted in (view.id, view.name)]
+    if not matches:
+        raise ValueError(f"No view with id or name '{wanted}'")
+    if len(matches) > 1:
+        raise ValueError(f"{len(matches)} views are named '{wanted}', pass the view id instead")
+    return matches[0]
+
+
+class LoadTester:
+    """Runs one load test at a time against a single view.
+
+    Renders go straight to Tableau on their own connections rather than
+    through the server's guard, since the point is to exceed what the
+    monitor would send; the caps in LoadTestPlan and load_test_limits()
+    bound the damage instead.
+    """
+
+    def __init__(self, reservation_timeout=RESERVATION_TIMEOUT):
+        self.reservation_timeout = reservation_timeout
+        self._lock = threading.Lock()
+        self._running = False
+        self._reserved_at = None
+
+    def _reserved(self):
+        return self._reserved_at is not None and time.monotonic() - self._reserved_at < self.reservation_timeout
+
+    def reserve(self):
+        """Claim the load tester for a run about to be queued; False if it is busy.
+
+        The reservation lapses if no run() takes it up within
+        `reservation_timeout` seconds, so a queued run that never starts
+        cannot hold the tester forever.
+        """
+        with self._lock:
+            if self._running or self._reserved():
+                return False
+            self._reserved_at = time.monotonic()
+            return True
+
+    def release(self):
+        """Give up a reservation whose run will not be queued after all"""
+        with self._lock:
+            self._reserved_at = None
+
+    @property
+    def busy(self):
+        with self._lock:
+            return self._running or self._reserved()
+
+    def run(self, get_session, plan, reserved=False):
+        """Ramp through plan.levels against one view and return the report as a dict.
+
+        get_session() returns the signed-in TableauSession of the view's
+        site. `reserved` means the caller reserved the tester through
+        reserve() when it queued this run.
+        """
+        with self._lock:
+            if self._running or (not reserved and self._reserved()):
+                raise LoadTestBusy("Another load test is running")
+            self._running = True
+            self._reserved_at = None
+        try:
+            return self._run(get_session(), plan)
+        finally:
+            with self._lock:
+                self._running = False
+
+    def _run(self, session, plan):
+        view = resolve_view(view_inventory.get_views(session), plan.view)
+        _, _, max_duration = load_test_limits()
+        server = session.ensure_signed_in()
+        url = _stage_url(server, view, plan.stage)
+        logger.info(
+            f"Load test of '{view.name}' ({plan.stage}): levels {plan.levels}, "
+            f"{plan.requests_per_client} renders per client"
+        )
+
+        started = time.monotonic()
+        deadline = started + max_duration
+        levels = []
+        aborted = None
+        for concurrency in plan.levels:
+            if time.monotonic() >= deadline:
+                aborted = f"time limit of {max_duration:g}s reached"
+                break
+            # Sign in again between levels if the token is about to expire
+            server = session.ensure_signed_in()
+            level = _run_level(server, url, plan.stage, concurrency, plan.requests_per_client, deadline)
+            levels.append(level)
+            logger.info(
+                f"{concurrency} clients: p50 {level.quantile(0.5) or 0:.2f}s, p95 {level.quantile(0.95) or 0:.2f}s, "
+                f"errors {level.error_rate:.0%}, {level.throughput:.1f} renders/s"
+            )
+            if level.error_rate >= ABORT_ERROR_RATE:
+                aborted = f"error rate {level.error_rate:.0%} at {concurrency} clients"
+                break
+
+        saturation, reason = find_saturation(levels)
+        return {
+            "view_id": view.id,
+            "view_name": view.name,
+            "stage": plan.stage,
+            "requests_per_client": plan.requests_per_client,
+            "planned_levels": plan.levels,
+            "levels": [level.to_dict() for level in levels],
+            "saturation": {
+                "reached": reason is not None,
+                "concurrency": saturation,
+                "reason": reason
+            },
+            "total_requests": sum(level.requests for level in levels),
+            "elapsed": round(time.monotonic() - started, 3),
+            "aborted": aborted
+        }
+
+
+load_tester = LoadTester()
@@ -0,0 +1,335 @@
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger('TableauLogs')
+
+DEFAULT_LOG_GLOB = '**/*.log'
+DEFAULT_CURSOR_PATH = os.path.join('data', 'log_cursor.json')
+DEFAULT_AGGREGATE_PATH = os.path.join('data', 'log_aggregate.json')
+DEFAULT_MAX_SIGNATURES = 1000
+DEFAULT_RECENT_SAMPLES = 50
+DEFAULT_MAX_BYTES_PER_RUN = 64 * 1024 * 1024
+MAX_LINE_LENGTH = 4096
+READ_SIZE = 1024 * 1024
+MAX_PENDING = 16 * 1024 * 1024
+
+SEVERITIES = ["info", "warning", "error", "critical"]
+
+# (name, severity, pattern, keywords). Rules are tried in order and the
+# first whose pattern matches a line decides its severity. Keywords are
+# lowercase literals of which at least one must appear in any line the
+# pattern matches; they let the matcher find candidate lines with plain
+# substring searches instead of running every regex over every line. A rule
+# without keywords is still supported but makes each chunk go through its
+# regex in full.
+DEFAULT_RULES = [
+    ("json_fatal", "critical", r'"sev"\s*:\s*"fatal"', ['"fatal"']),
+    ("json_error", "error", r'"sev"\s*:\s*"error"', ['"error"']),
+    ("fatal", "critical", r'\b(?:fatal|panic|out of memory)\b', ['fatal', 'panic', 'out of memory']),
+    ("failed", "error", r'\bfail(?:ed|ure|s)?\b', ['fail']),
+    ("error", "error", r'\b(?:error|exception)\b', ['error', 'exception']),
+    ("timeout", "warning", r'\btim(?:ed|e)[ -]?out\b', ['timeout', 'timed out', 'time out', 'timed-out', 'time-out']),
+]
+
+# Variable parts of a log line that should not split one error into many
+# signatures: quoted values, ids, hex, numbers
+_SIGNATURE_PATTERNS = [
+    (re.compile(rb'"[^"]*"'), b'"*"'),
+    (re.compile(rb'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}'), b'<id>'),
+    (re.compile(rb'\b0x[0-9a-fA-F]+\b|\b[0-9a-fA-F]{16,}\b'), b'<hex>'),
+    (re.compile(rb'\d+'), b'#'),
+    (re.compile(rb'\s+'), b' '),
+]
+
+
+class LogMatcher:
+    """Severity rules compiled for scanning whole chunks of log data.
+
+    Each chunk is lowercased once and searched for the rules' keywords;
+    only lines containing one are run through the rule regexes. Lines that
+    match nothing are never split out, copied or decoded.
+    """
+
+    def __init__(self, rules=None):
+        self.rules = []
+        keywords = set()
+        unfiltered = []
+        for rule in rules or DEFAULT_RULES:
+            name, severity, pattern = rule[:3]
+            rule_keywords = [k.lower().encode('utf-8') for k in (rule[3] if len(rule) > 3 else None) or ()]
+            if severity not in SEVERITIES:
+                raise ValueError(f"Unknown severity '{severity}', expected one of: {', '.join(SEVERITIES)}")
+            self.rules.append((name, severity, re.compile(pattern.encode('utf-8'), re.IGNORECASE)))
+            if rule_keywords:
+                keywords.update(rule_keywords)
+            else:
+                unfiltered.append(pattern.encode('utf-8'))
+        self._keywords = sorted(keywords)
+        self._unfiltered = re.compile(b'|'.join(unfiltered), re.IGNORECASE) if unfiltered else None
+
+    def match(self, line):
+        """Return (rule name, severity) for a bytes line, or None"""
+        for name, severity, regex in self.rules:
+            if regex.search(line):
+                return name, severity
+        return None
+
+    def scan(self, chunk):
+        """Yield (line, rule name, severity) for matching lines of a chunk of whole lines"""
+        lowered = chunk.lower()
+        starts = set()
+        for keyword in self._keywords:
+            position = lowered.find(keyword)
+            while position != -1:
+                starts.add(lowered.rfind(b'\n', 0, position) + 1)
+                line_end = lowered.find(b'\n', position)
+                if line_end == -1:
+                    break
+                position = lowered.find(keyword, line_end)
+        if self._unfiltered is not None:
+            for found in self._unfiltered.finditer(chunk):
+                starts.add(chunk.rfind(b'\n', 0, found.start()) + 1)
+
+        for start in sorted(starts):
+            end = chunk.find(b'\n', start)
+            line = chunk[start:] if end == -1 else chunk[start:end + 1]
+            found = self.match(line)
+            if found is not None:
+                yield line, found[0], found[1]
+
+
+def load_rules(path):
+    """Read severity rules from a JSON list of {"name", "severity", "pattern", "keywords"}"""
+    with open(path) as f:
+        data = json.load(f)
+    return [
+        (rule['name'], rule.get('severity', 'error'), rule['pattern'], rule.get('keywords'))
+        for rule in data
+    ]
+
+
+def signature(line):
+    """Collapse the variable parts of a log line so repeats group together"""
+    text = line[:512]
+    for pattern, replacement in _SIGNATURE_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text.strip()[:200].decode('utf-8', 'replace')
+
+
+class LogAggregator:
+    """Bounded summary of matched log lines.
+
+    Counts per error signature are kept with the Space-Saving algorithm: at
+    most `max_signatures` entries exist, and a new signature replaces the
+    least frequent one, inheriting its count. Frequent signatures are
+    therefore always counted (counts may be overestimated by at most the
+    evicted count), while memory stays fixed however large the logs are.
+    The last `recent_samples` matching lines are kept verbatim. With a
+    `state_path` the summary is saved as JSON after each run, next to the
+    tailer's cursor, so counts keep adding up across runs.
+    """
+
+    def __init__(self, max_signatures=None, recent_samples=None, state_path=None):
+        self.max_signatures = max_signatures or int(os.getenv('LOG_MAX_SIGNATURES', DEFAULT_MAX_SIGNATURES))
+        recent_samples = recent_samples or int(os.getenv('LOG_RECENT_SAMPLES', DEFAULT_RECENT_SAMPLES))
+        self.recent = deque(maxlen=recent_samples)
+        self.signatures = {}
+        self.severity_counts = dict.fromkeys(SEVERITIES, 0)
+        self.lines_read = 0
+        self.state_path = state_path
+        self._lock = threading.Lock()
+        if state_path:
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.state_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        # Keep the most frequent signatures if LOG_MAX_SIGNATURES was lowered
+        entries = sorted(data.get("signatures", []), key=lambda e: e["count"], reverse=True)
+        with self._lock:
+            self.signatures = {entry["signature"]: entry for entry in entries[:self.max_signatures]}
+            for severity in SEVERITIES:
+                self.severity_counts[severity] = data.get("severity_counts", {}).get(severity, 0)
+            self.lines_read = data.get("lines_read", 0)
+            self.recent.clear()
+            self.recent.extend(data.get("recent", []))
+
+    def save(self):
+        if not self.state_path:
+            return
+        with self._lock:
+            data = {
+                "signatures": list(self.signatures.values()),
+                "severity_counts": self.severity_counts,
+                "lines_read": self.lines_read,
+                "recent": list(self.recent),
+            }
+            directory = os.path.dirname(self.state_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(f"{self.state_path}.tmp", 'w') as f:
+                json.dump(data, f)
+        os.replace(f"{self.state_path}.tmp", self.state_path)
+
+    def add(self, line, rule, severity, source=None):
+        key = signature(line)
+        text = line[:MAX_LINE_LENGTH].decode('utf-8', 'replace').rstrip()
+        now = time.time()
+        with self._lock:
+            self.severity_counts[severity] += 1
+            self.recent.append({"severity": severity, "rule": rule, "source": source, "line": text})
+
+            entry = self.signatures.get(key)
+            if entry is None:
+                inherited = 0
+                if len(self.signatures) >= self.max_signatures:
+                    evicted = min(self.signatures, key=lambda k: self.signatures[k]["count"])
+                    inherited = self.signatures.pop(evicted)["count"]
+                entry = self.signatures[key] = {
+                    "signature": key,
+                    "rule": rule,
+                    "severity": severity,
+                    "count": inherited,
+                    "first_seen": now,
+                    "last_seen": now,
+                    "sample": text,
+                }
+            entry["count"] += 1
+            entry["last_seen"] = now
+
+    def top(self, count=10):
+        """Most frequent signatures, most frequent first"""
+        with self._lock:
+            entries = sorted(self.signatures.values(), key=lambda e: e["count"], reverse=True)
+            return [dict(entry) for entry in entries[:count]]
+
+    def recent_samples(self, count=None):
+        """Most recent matching lines, newest first"""
+        with self._lock:
+            samples = list(reversed(self.recent))
+        return samples[:count] if count else samples
+
+
+class LogTailer:
+    """Reads only the log lines appended since the last run, in large blocks.
+
+    The cursor maps each file to its inode and the byte offset after the
+    last complete line read, and is saved as JSON. A file whose inode
+    changed or that shrank was rotated and is read from the start. A
+    trailing line without a newline is left for the next run.
+    """
+
+    def __init__(self, root, pattern=None, cursor_path=None, max_bytes_per_run=None):
+        self.root = root
+        self.pattern = pattern or os.getenv('LOG_GLOB', DEFAULT_LOG_GLOB)
+        self.cursor_path = cursor_path or os.getenv('LOG_CURSOR_PATH', DEFAULT_CURSOR_PATH)
+        self.max_bytes_per_run = max_bytes_per_run or int(
+            os.getenv('LOG_MAX_BYTES_PER_RUN', DEFAULT_MAX_BYTES_PER_RUN)
+        )
+        self.cursor = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.cursor_path) as f:
+                self.cursor = json.load(f)
+        except (OSError, ValueError):
+            self.cursor = {}
+
+    def save(self):
+        directory = os.path.dirname(self.cursor_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(f"{self.cursor_path}.tmp", 'w') as f:
+            json.dump(self.cursor, f)
+        os.replace(f"{self.cursor_path}.tmp", self.cursor_path)
+
+    def files(self):
+        paths = glob.glob(os.path.join(self.root, self.pattern), recursive=True)
+        # Oldest first, so a byte budget is spent in the order lines were written
+        return sorted((p for p in paths if os.path.isfile(p)), key=os.path.getmtime)
+
+    def chunks(self):
+        """Yield (path, data) blocks of new complete lines, advancing the cursor"""
+        budget = self.max_bytes_per_run
+        seen = set()
+        for path in self.files():
+            seen.add(path)
+            if budget <= 0:
+                continue
+            stat = os.stat(path)
+            position = self.cursor.get(path)
+            offset = 0
+            if position and position[0] == stat.st_ino and position[1] <= stat.st_size:
+                offset = position[1]
+            if offset == stat.st_size:
+                continue
+
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                pending = b''
+                while budget > 0:
+                    block = f.read(min(READ_SIZE, budget))
+                    if not block:
+                        break
+                    data = pending + block
+                    cut = data.rfind(b'\n') + 1
+                    pending = data[cut:]
+                    if len(pending) > MAX_PENDING:
+                        # A single line this long is not a log line worth matching
+                        cut, pending = len(data), b''
+                    if cut:
+                        offset += cut
+                        budget -= cut
+                        yield path, data[:cut]
+            self.cursor[path] = [stat.st_ino, offset]
+
+        # Forget files that were deleted
+        for path in list(self.cursor):
+            if path not in seen:
+                del self.cursor[path]
+
+
+class LogAnalyzer:
+    """Feeds new log lines through the matcher into a bounded aggregation"""
+
+    def __init__(self, tailer, matcher=None, aggregator=None):
+        self.tailer = tailer
+        self.matcher = matcher or LogMatcher()
+        self.aggregator = aggregator or LogAggregator()
+
+    def run(self):
+        """Ingest everything new since the last run; returns the number of matches"""
+        matches = 0
+        lines_read = 0
+        for path, data in self.tailer.chunks():
+            lines_read += data.count(b'\n')
+            source = os.path.basename(path)
+            for line, rule, severity in self.matcher.scan(data):
+                matches += 1
+                self.aggregator.add(line, rule, severity, source)
+        self.aggregator.lines_read += lines_read
+        self.tailer.save()
+        self.aggregator.save()
+        logger.info(f"Read {lines_read} new log lines, {matches} matched")
+        return matches
+
+
+def create_log_analyzer(root=None):
+    """Build an analyzer from LOG_* settings, or None if no log directory is set"""
+    root = root or os.getenv('TABLEAU_LOG_DIR')
+    if not root:
+        return None
+    rules_file = os.getenv('LOG_RULES_FILE')
+    matcher = LogMatcher(load_rules(rules_file) if rules_file else None)
+    aggregator = LogAggregator(state_path=os.getenv('LOG_AGGREGATE_PATH', DEFAULT_AGGREGATE_PATH))
+    return LogAnalyzer(LogTailer(root), matcher, aggregator)
@@ -0,0 +1,242 @@
+import bisect
+import math
+import threading
+
+# Seconds; covers everything from a cached REST call to a slow PDF render
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    """Base for a metric family; labelled children are created on first use"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def labels(self, *values):
+        """Return the child for these label values (positional, in labelnames order)"""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _samples(self):
+        for values, child in list(self._children.items()):
+            for suffix, extra, value in child.samples():
+                yield f"{self.name}{suffix}{_format_labels(self.labelnames, values, extra)} {_format_value(value)}"
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return '\n'.join(lines)
+
+
+class _CounterChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self):
+        yield '', (), self.value
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._children[()].inc(amount)
+
+
+class _GaugeChild:
+    __slots__ = ('value', 'function', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self.function = None
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def set_function(self, function):
+        """Read the value from function() at scrape time instead"""
+        self.function = function
+
+    def samples(self):
+        yield '', (), self.function() if self.function is not None else self.value
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._children[()].set(value)
+
+    def inc(self, amount=1):
+        self._children[()].inc(amount)
+
+    def dec(self, amount=1):
+        self._children[()].dec(amount)
+
+    def set_function(self, function):
+        self._children[()].set_function(function)
+
+
+class _HistogramChild:
+    __slots__ = ('bounds', 'counts', 'sum', '_lock')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        # One slot per bucket plus one for values above the largest bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def samples(self):
+        with self._lock:
+            counts = list(self.counts)
+            total = self.sum
+        cumulative = 0
+        for bound, count in zip(self.bounds, counts):
+            cumulative += count
+            yield '_bucket', (('le', _format_value(float(bound))),), cumulative
+        cumulative += counts[-1]
+        yield '_bucket', (('le', '+Inf'),), cumulative
+        yield '_count', (), cumulative
+        yield '_sum', (), total
+
+
+class Histogram(_Metric):
+    """Fixed-bucket histogram; observe() is one bisect and two additions"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(float(bound) for bound in buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value):
+        self._children[()].observe(value)
+
+
+class MetricsRegistry:
+    """Holds every metric of the process and renders the text exposition format"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+registry = MetricsRegistry()
+
+PROBE_SECONDS = registry.histogram(
+    'tableau_probe_duration_seconds', 'Time to probe one view, by probe mode', ('mode',))
+TICK_SECONDS = registry.histogram(
+    'tableau_monitor_tick_duration_seconds', 'Duration of a whole monitor check')
+SIGN_IN_SECONDS = registry.histogram(
+    'tableau_sign_in_duration_seconds', 'Time to sign in to Tableau with a personal access token')
+LISTING_SECONDS = registry.histogram(
+    'tableau_view_listing_duration_seconds', 'Time spent paging through the views endpoint', ('kind',))
+WEBHOOK_SECONDS = registry.histogram(
+    'tableau_webhook_delivery_duration_seconds', 'Time to deliver one webhook POST', ('outcome',))
+
+ERRORS = registry.counter(
+    'tableau_errors_total', 'Errors by where they happened', ('source',))
+RETRIES = registry.counter(
+    'tableau_retries_total', 'Retried operations by kind', ('kind',))
+COALESCED_CHECKS = registry.counter(
+    'tableau_monitor_coalesced_total', 'Check requests that joined a check in flight or reused one just finished')
+THROTTLED_REQUESTS = registry.counter(
+    'tableau_throttled_requests_total', 'Requests Tableau answered with 429 Too Many Requests', ('server',))
+SKIPPED_VIEWS = registry.counter(
+    'tableau_views_skipped_total', 'Views carried over to a later check because the probe budget ran out')
+
+QUEUE_DEPTH = registry.gauge(
+    'tableau_queue_depth', 'Items waiting in an internal queue', ('queue',))
+PROBES_IN_FLIGHT = registry.gauge(
+    'tableau_probes_in_flight', 'View probes currently running')
+CONCURRENCY_LIMIT = registry.gauge(
+    'tableau_concurrency_limit', 'Current adaptive limit on concurrent requests to a server', ('server',))
+CIRCUIT_OPEN = registry.gauge(
+    'tableau_circuit_open', '1 while requests to a server are paused because it looks down', ('server',))
+WARMUP_SECONDS = registry.gauge(
+    'tableau_warmup_duration_seconds', 'Time each startup warm-up step took', ('step',))
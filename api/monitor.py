@@ -1,219 +1,589 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 import json
 from flask_cors import CORS
+import math
 import os
 from datetime import datetime, timezone
-import tableauserverclient as TSC
-import requests
-import threading
 import time
 
+from api.alerts import DEFAULT_ALERT_STATE_PATH, OBSERVED_ERROR, OBSERVED_OK, OBSERVED_SLOW, AlertTracker
+from api.async_client import async_client_pool, event_loop, get_async_concurrency, get_probe_client
+from api.baselines import BaselineTracker
+from api.cron import DEFAULT_SCHEDULER_STATE_PATH, CronScheduler
+from api.history import auto_resolution, format_duration, history_store, parse_duration, parse_timestamp, rollup_level
+from api.inventory import view_inventory
+from api.loadtest import LoadTestPlan, load_tester
+from api.jobs import JobQueue, QueueFull, job_queue
+from api.metrics import COALESCED_CHECKS, CONTENT_TYPE, ERRORS, QUEUE_DEPTH, TICK_SECONDS, registry
+from api.outbox import webhook_outbox
+from api.probe_scheduler import ProbeScheduler
+from api.probes import get_probe_mode, probe_view, probe_view_async
+from api.records import ViewRecord, json_default
+from api.reports import delta_reporter
+from api.sessions import session_pool
+from api.sharding import shard_coordinator
+from api.sites import load_sites, site_pool
+from api.throttle import OUTAGE_ENDED, OUTAGE_STARTED, server_guards
+from api.tracing import tracer
+from api.snapshots import DEFAULT_SNAPSHOT_MAX_AGE, SingleFlight, decode_cursor, encode_cursor
+from api.warmup import Warmup, preload
+
+class MonitorJSONProvider(DefaultJSONProvider):
+    """Lets jsonify() serialise report objects such as ViewRecord"""
+
+    @staticmethod
+    def default(value):
+        try:
+            return json_default(value)
+        except TypeError:
+            return DefaultJSONProvider.default(value)
+
 app = Flask(__name__)
+app.json = MonitorJSONProvider(app)
 CORS(app)
 
+DEFAULT_WEBHOOK_MAX_VIEWS = 200
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+NDJSON_MIMETYPE = 'application/x-ndjson'
+DEFAULT_HISTORY_RANGE = '24h'
+# Buckets per view when no resolution is given: about a sparkline's worth
+DEFAULT_HISTORY_POINTS = 120
+MAX_HISTORY_POINTS = 5000
+MAX_HISTORY_VIEWS = 1000
+
+probe_scheduler = ProbeScheduler()
+
+# Same per-view baselines and alert hysteresis as the CLI monitor
+baseline_tracker = BaselineTracker(history=history_store)
+alert_tracker = AlertTracker(state_path=os.getenv('ALERT_STATE_PATH', DEFAULT_ALERT_STATE_PATH))
+
+# Load tests run on their own worker so they never hold up queued checks
+load_test_jobs = JobQueue(workers=1, max_jobs=20)
+
+# Concurrent ticks and GETs share one in-flight check and its snapshot
+monitor_flight = SingleFlight()
+
+QUEUE_DEPTH.labels('jobs').set_function(job_queue.depth)
+QUEUE_DEPTH.labels('webhooks').set_function(webhook_outbox.depth)
+
 last_health_check = datetime.now(timezone.utc)
-health_check_interval = 60  # seconds
 
-def keep_alive():
-    while True:
-        try:
-            current_time = datetime.now(timezone.utc)
-            requests.get('https://hng12-stage3-tableau-dashboard-monitor.onrender.com/')
-            time.sleep(health_check_interval)
-        except Exception as e:
-            print(f"Keep-alive error: {str(e)}")
-            time.sleep(5)
+# Check schedule advertised to Telex as the "interval" setting
+DEFAULT_INTERVAL = "*/2 * * * *"
+
+HOME_DATA = {
+    "status": "ok",
+    "message": "Tableau Monitor API is running",
+    "timestamp": "2025-02-24 17:47:27",
+    "user": "cod-emminex",
+    "uptime": "Active",
+    "endpoints": [
+        "/api/integration",
+        "/api/monitor",
+        "/api/jobs/<job_id>",
+        "/api/schedule",
+        "/api/history",
+        "/api/traces",
+        "/api/loadtest",
+        "/metrics"
+    ]
+}
+
+INTEGRATION_DATA = {
+    "data": {
+        "date": {
+            "created_at": "2025-02-23",
+            "updated_at": "2025-02-24"
+        },
+        "descriptions": {
+            "app_name": "Tableau Monitor",
+            "app_description": "Detects failures or slow loading of Tableau reports using Tableau Server Logs. Monitors dashboard performance and sends alerts when load times exceed thresholds or when errors occur.",
+            "app_logo": "https://img.icons8.com/color/48/tableau-software.png",
+            "app_url": "https://hng12-stage3-tableau-dashboard-monitor.onrender.com",
+            "background_color": "#fff"
+        },
+        "is_active": True,
+        "integration_type": "interval",
+        "integration_category": "Monitoring & Logging",
+        "key_features": [
+            "Real-time dashboard load time monitoring",
+            "Automatic failure detection",
+            "Performance threshold alerts",
+            "Error log analysis"
+        ],
+        "author": "cod_emminex",
+        "settings": [
+            {
+                "label": "interval",
+                "type": "text",
+                "required": True,
+                "default": DEFAULT_INTERVAL
+            },
+            {
+                "label": "Load Time Threshold",
+                "type": "number",
+                "required": True,
+                "default": "10"
+            }
+        ],
+        "target_url": "https://ping.telex.im/v1/webhooks/01953892-321f-7401-95d8-abca44d5f557",
+        "tick_url": "https://hng12-stage3-tableau-dashboard-monitor.onrender.com/api/monitor"
+    }
+}
+
+# Serialised once at import: the health check and the integration document
+# are answered straight away, even while a cold instance is still warming up
+HOME_BODY = app.json.dumps(HOME_DATA) + "\n"
+INTEGRATION_BODY = app.json.dumps(INTEGRATION_DATA) + "\n"
 
 @app.route('/')
 def home():
     global last_health_check
     last_health_check = datetime.now(timezone.utc)
-    return jsonify({
-        "status": "ok",
-        "message": "Tableau Monitor API is running",
-        "timestamp": "2025-02-24 17:47:27",
-        "user": "cod-emminex",
-        "uptime": "Active",
-        "endpoints": [
-            "/api/integration",
-            "/api/monitor"
-        ]
-    })
+    return app.response_class(HOME_BODY, mimetype=app.json.mimetype)
 
 @app.route('/api/integration', methods=['GET'])
 def get_integration():
-    created_date = "2025-02-23"
-    updated_date = "2025-02-24"
-
-    integration_data = {
-        "data": {
-            "date": {
-                "created_at": created_date,
-                "updated_at": updated_date
-            },
-            "descriptions": {
-                "app_name": "Tableau Monitor",
-                "app_description": "Detects failures or slow loading of Tableau reports using Tableau Server Logs. Monitors dashboard performance and sends alerts when load times exceed thresholds or when errors occur.",
-                "app_logo": "https://img.icons8.com/color/48/tableau-software.png",
-                "app_url": "https://hng12-stage3-tableau-dashboard-monitor.onrender.com",
-                "background_color": "#fff"
-            },
-            "is_active": True,
-            "integration_type": "interval",
-            "integration_category": "Monitoring & Logging",
-            "key_features": [
-                "Real-time dashboard load time monitoring",
-                "Automatic failure detection",
-                "Performance threshold alerts",
-                "Error log analysis"
-            ],
-            "author": "cod_emminex",
-            "settings": [
-                {
-                    "label": "interval",
-                    "type": "text",
-                    "required": True,
-                    "default": "*/2 * * * *"
-                },
-                {
-                    "label": "Load Time Threshold",
-                    "type": "number",
-                    "required": True,
-                    "default": "10"
-                }
-            ],
-            "target_url": "https://ping.telex.im/v1/webhooks/01953892-321f-7401-95d8-abca44d5f557",
-            "tick_url": "https://hng12-stage3-tableau-dashboard-monitor.onrender.com/api/monitor"
+    return app.response_class(INTEGRATION_BODY, mimetype=app.json.mimetype)
+
+WEBHOOK_URL = "https://ping.telex.im/v1/webhooks/01953892-321f-7401-95d8-abca44d5f557"
+
+def _format_time(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value else None
+
+def view_record(view, status, last_probed=None, site=None):
+    return ViewRecord(
+        view.id,
+        view.name,
+        status,
+        _format_time(view.created_at),
+        getattr(view, 'project_name', None),
+        _format_time(datetime.fromtimestamp(last_probed, timezone.utc)) if last_probed else None,
+        site
+        )
+
+def describe_views(rows, site=None):
+    """Build view records from (view, probe result, scheduler stats) rows.
+
+    Views carried over to a later tick have no probe result and report the
+    status from their last probe, or "pending" if never probed. Returns
+    (view_details, error_count, pending_count).
+    """
+    view_details = []
+    error_count = 0
+    pending_count = 0
+    for view, result, stats in rows:
+        if result is not None:
+            status = "error" if result.failed else "active"
+            history_store.record(view, result)
+        elif stats is not None:
+            status = "error" if stats.failed else "active"
+        else:
+            status = "pending"
+
+        if status == "error":
+            error_count += 1
+        elif status == "pending":
+            pending_count += 1
+
+        view_details.append(view_record(view, status, stats.last_probed if stats else None, site))
+    return view_details, error_count, pending_count
+
+def format_views_list(view_details, with_project=False):
+    """Numbered status lines for the webhook message.
+
+    Beyond WEBHOOK_MAX_VIEWS views only the views that are not active are
+    listed, up to that limit, followed by a count of the rest.
+    """
+    limit = int(os.getenv('WEBHOOK_MAX_VIEWS', DEFAULT_WEBHOOK_MAX_VIEWS))
+    listed = view_details
+    if len(view_details) > limit:
+        listed = [view for view in view_details if view.status != "active"][:limit]
+
+    def line(number, view):
+        if with_project:
+            return f"{number}. {view.name} ({view.project_name or 'No Project'}) - {view.status.upper()}"
+        return f"{number}. {view.name} - {view.status.upper()}"
+
+    lines = [line(i + 1, view) for i, view in enumerate(listed)]
+    if len(listed) < len(view_details):
+        lines.append(f"... and {len(view_details) - len(listed)} more views not listed")
+    return "\n".join(lines)
+
+def observations(rows):
+    """(view_id, name, status, load_time) of rows for the delta reporter; None status if not probed"""
+    for view, result, _ in rows:
+        if result is None:
+            yield view.id, view.name, None, None
+        else:
+            yield view.id, view.name, "error" if result.failed else "active", result.load_time
+
+def track_alerts(rows):
+    """Judge probed rows against their views' baselines and update their alerts.
+
+    Call before describe_views() records the probes in history, which new
+    baselines are seeded from. Returns the AlertEvents raised.
+    """
+    probed = [(view, result) for view, result, _ in rows if result is not None]
+    measured = [(view, result) for view, result in probed if not result.failed]
+    slow_flags, p50s, p95s = baseline_tracker.evaluate(
+        [view.id for view, _ in measured],
+        [result.load_time for _, result in measured],
+        probe_scheduler.slow_threshold
+        )
+    verdicts = {view.id: (bool(slow), float(p50), float(p95))
+                for (view, _), slow, p50, p95 in zip(measured, slow_flags, p50s, p95s)}
+
+    events = []
+    for view, result in probed:
+        if result.failed:
+            event = alert_tracker.observe(view.id, view.name, OBSERVED_ERROR, f"Error: {result.error}")
+        else:
+            slow, p50, p95 = verdicts[view.id]
+            reference = (f"threshold: {probe_scheduler.slow_threshold:g}s" if math.isnan(p50)
+                         else f"usual: p50 {p50:.2f}s, p95 {p95:.2f}s")
+            detail = f"Load time: {result.load_time:.2f}s ({reference})"
+            event = alert_tracker.observe(view.id, view.name, OBSERVED_SLOW if slow else OBSERVED_OK, detail)
+        if event is not None:
+            events.append(event)
+    return events
+
+def alerts_section(events):
+    """Message lines for alert events, empty when there are none"""
+    if not events:
+        return ""
+    lines = [f"- {event.headline()}: {event.detail}" if event.detail else f"- {event.headline()}" for event in events]
+    return "\n\nAlerts:\n" + "\n".join(lines)
+
+def views_section(report, view_details, with_project=False):
+    """Every view for a full report, otherwise only the views that changed"""
+    if report.full:
+        return f"Views Status:\n{format_views_list(view_details, with_project)}"
+    return report.format_changes(int(os.getenv('WEBHOOK_MAX_VIEWS', DEFAULT_WEBHOOK_MAX_VIEWS)))
+
+def outage_webhook(guard, webhook_data):
+    """Report a server outage once instead of through every check it breaks.
+
+    Returns an outage event when the server's circuit has just opened, None
+    while it stays open (the outage was already reported), and otherwise
+    webhook_data, noting the recovery if the circuit has just closed.
+    """
+    event = guard.breaker.pop_event()
+    if event == OUTAGE_STARTED:
+        return {
+            "message": f"Tableau Server Outage - probing paused\n{guard.describe_outage()}",
+            "username": "Tableau Monitor",
+            "event_name": "tableau_server_outage",
+            "status": "error"
+            }
+    if guard.breaker.is_open:
+        return None
+    if event == OUTAGE_ENDED:
+        message = f"Tableau server reachable again after {guard.breaker.last_outage:.0f}s\n\n{webhook_data['message']}"
+        return dict(webhook_data, message=message)
+    return webhook_data
+
+def describe_shard(partitions):
+    """Which slice of the view set this instance checked"""
+    return {
+        "instance_id": shard_coordinator.instance_id,
+        "partitions_owned": len(partitions),
+        "total_partitions": shard_coordinator.partitions
         }
-    }
 
-    return jsonify(integration_data)
+def run_multi_site_check(sites_file, flight=None):
+    """Check every site in sites_file on its own worker process and merge the results"""
+    sites = load_sites(sites_file)
+    partitions = None
+    if shard_coordinator.enabled:
+        partitions = shard_coordinator.heartbeat()
+        shard_coordinator.start()
+    with tracer.span('check_sites', sites=len(sites)):
+        results = site_pool.check(sites, partitions=partitions)
+    current_time = "2025-02-24 17:47:27"
 
-@app.route('/api/monitor', methods=['GET', 'POST'])
-def monitor():
+    site_reports = []
+    site_messages = []
+    totals = {"views": 0, "errors": 0, "probed": 0, "failed_sites": 0}
+    alerts = []
+    seen_views = []
+    for site in sites:
+        rows, error = results[site.name]
+        if error is not None:
+            totals["failed_sites"] += 1
+            site_reports.append({
+                "name": site.name,
+                "server_url": site.server_url,
+                "site_name": site.site_name,
+                "success": False,
+                "error": error
+                })
+            site_messages.append(f"[{site.name}] {site.server_url} / {site.site_name}\nError: {error}")
+            continue
+
+        site_alerts = track_alerts(rows)
+        alerts.extend(site_alerts)
+        seen_views.extend(view.id for view, _, _ in rows)
+        view_details, error_count, pending_count = describe_views(rows, site.name)
+        report = delta_reporter.compare(
+            site.name, observations(rows), partitions=partitions, partition_of=shard_coordinator.partition_of
+            )
+        if flight is not None:
+            for record in view_details:
+                flight.publish(record)
+        probed_count = sum(1 for _, result, _ in rows if result is not None)
+        totals["views"] += len(view_details)
+        totals["errors"] += error_count
+        totals["probed"] += probed_count
+
+        site_reports.append({
+            "name": site.name,
+            "server_url": site.server_url,
+            "site_name": site.site_name,
+            "success": True,
+            "total_views": len(view_details),
+            "errors_found": error_count,
+            "probed_views": probed_count,
+            "deferred_views": len(view_details) - probed_count,
+            "views": view_details
+            })
+        site_messages.append(
+            f"[{site.name}] {site.server_url} / {site.site_name}\n"
+            f"Total Views: {len(view_details)}\n"
+            f"Active Views: {len(view_details) - error_count - pending_count}\n"
+            f"Error Views: {error_count}\n"
+            f"{views_section(report, view_details)}"
+            f"{alerts_section(site_alerts)}"
+            )
+
+    # A site that could not be listed, or views in another instance's
+    # partitions, keep their alert state for next time
+    if totals["failed_sites"] == 0 and partitions is None:
+        alert_tracker.forget(seen_views)
+    alert_tracker.save()
+
+    message = (
+            f"Tableau Monitor Check - {current_time}\n"
+            f"Sites: {len(sites)} ({totals['failed_sites']} failed)\n"
+            f"Total Views: {totals['views']}\n"
+            f"Error Views: {totals['errors']}\n\n"
+            + "\n\n".join(site_messages)
+            )
+    failed = totals["errors"] > 0 or totals["failed_sites"] > 0
+    webhook_data = {
+            "message": message,
+            "username": "Tableau Monitor",
+            "event_name": "tableau_monitor_check",
+            "status": "error" if failed else "success"
+            }
+
+    response_data = {
+            "success": True,
+            "timestamp": current_time,
+            "user": "cod-emminex",
+            "total_sites": len(sites),
+            "failed_sites": totals["failed_sites"],
+            "total_views": totals["views"],
+            "errors_found": totals["errors"],
+            "probed_views": totals["probed"],
+            "sites": site_reports,
+            "alerts": [event.to_dict() for event in alerts]
+            }
+    if partitions is not None:
+        response_data["shard"] = describe_shard(partitions)
+    return response_data, 200, webhook_data
+
+def run_monitor_check(return_url=WEBHOOK_URL, max_age=0):
+    """Run one full check and post the result to return_url.
+
+    Returns a (response_data, status_code) tuple so the same check can back
+    both the synchronous GET endpoint and queued tick jobs. A call made
+    while another check is running joins it rather than starting a second
+    one, and with max_age a check finished at most that many seconds ago is
+    reused. The shared result is still posted once to every distinct
+    return_url.
+    """
+    snapshot = monitor_flight.snapshot(max_age) if max_age > 0 else None
+    if snapshot is not None and snapshot.flight is not None:
+        COALESCED_CHECKS.inc()
+        # The snapshot is stored just before its flight finishes
+        snapshot.flight.done.wait()
+        notify(snapshot.flight, return_url)
+        return snapshot.data, snapshot.status_code
+
+    (response_data, status_code, _), flight, shared = monitor_flight.do(_timed_check)
+    if shared:
+        COALESCED_CHECKS.inc()
+    notify(flight, return_url)
+    return response_data, status_code
+
+def notify(flight, return_url):
+    """Post a finished check's webhook to return_url, once per URL per check"""
+    if flight.error is None and flight.result[2] is not None and flight.claim(return_url):
+        webhook_outbox.enqueue(return_url, flight.result[2], trace=flight.trace)
+
+def _timed_check(flight):
+    start_time = time.perf_counter()
     try:
-        # Configuration
-        server_url = os.getenv('TABLEAU_SERVER_HOST', 'https://dub01.online.tableau.com')
-        site_name = os.getenv('TABLEAU_SITE_NAME', 'emminexy-f537b42aad')
-        token_name = os.getenv('TABLEAU_TOKEN_NAME', 'TelescopeMonitoring')
-        token = os.getenv('TABLEAU_API_TOKEN')
-        webhook_url = "https://ping.telex.im/v1/webhooks/01953892-321f-7401-95d8-abca44d5f557"
-
-        # Get return_url from POST data if available
-        if request.method == 'POST':
-            data = request.get_json()
-            return_url = data.get('return_url', webhook_url)
-        else:
-            return_url = webhook_url
+        with tracer.tick('monitor_check'):
+            flight.trace = tracer.current()
+            response_data, status_code, webhook_data = _monitor_check(flight)
+    finally:
+        TICK_SECONDS.observe(time.perf_counter() - start_time)
+    if status_code == 200:
+        monitor_flight.store(response_data, status_code, flight)
+    return response_data, status_code, webhook_data
 
-        # Initialize Tableau connection
-        tableau_auth = TSC.PersonalAccessTokenAuth(
-                token_name=token_name,
-                personal_access_token=token,
-                site_id=site_name
-                )
+def tableau_settings():
+    """(server_url, site_name, token_name, token) of the single-site check"""
+    return (
+        os.getenv('TABLEAU_SERVER_HOST', 'https://dub01.online.tableau.com'),
+        os.getenv('TABLEAU_SITE_NAME', 'emminexy-f537b42aad'),
+        os.getenv('TABLEAU_TOKEN_NAME', 'TelescopeMonitoring'),
+        os.getenv('TABLEAU_API_TOKEN')
+        )
 
-        server = TSC.Server(
-                server_url,
-                use_server_version=False
-                )
-        server.version = '3.16'
+def get_session(server_url, site_name, token_name, token):
+    """The signed-in session (or asyncio client) kept between checks"""
+    if get_probe_client() == 'async':
+        return async_client_pool.get(server_url, site_name, token_name, token)
+    return session_pool.get(server_url, site_name, token_name, token)
 
-        # Test connection and get views
-        with server.auth.sign_in_with_personal_access_token(tableau_auth):
-            all_views = list(TSC.Pager(server.views))
+def _monitor_check(flight):
+    """Run the check; returns (response_data, status_code, webhook_data).
 
-            # Get additional view details
-            view_details = []
-            error_count = 0
-            for view in all_views:
-                try:
-                    server.views.populate_preview_image(view)
-                    status = "active"
-                except:
-                    status = "error"
-                    error_count += 1
-
-                view_details.append({
-                    "name": view.name,
-                    "id": view.id,
-                    "status": status,
-                    "created_at": view.created_at.strftime('%Y-%m-%d %H:%M:%S') if view.created_at else None,
-                    "project_name": view.project_name if hasattr(view, 'project_name') else None
-                    })
-
-            # Format message for webhook
-            views_list = "\n".join([
-                f"{i+1}. {view['name']} ({view['project_name'] or 'No Project'}) - {view['status'].upper()}"
-                for i, view in enumerate(view_details)
-                ])
-
-            current_time = "2025-02-24 17:47:27"
-            message = (
-                    f"Tableau Monitor Check - {current_time}\n"
-                    f"Server: {server_url}\n"
-                    f"Site: {site_name}\n"
-                    f"Total Views: {len(all_views)}\n"
-                    f"Active Views: {len(all_views) - error_count}\n"
-                    f"Error Views: {error_count}\n\n"
-                    f"Views Status:\n{views_list}"
-                    )
+    View records are published on the flight as soon as each probe finishes,
+    for callers streaming the check.
+    """
+    # Configuration
+    sites_file = os.getenv('TABLEAU_SITES_FILE')
+    server_url, site_name, token_name, token = tableau_settings()
+
+    try:
+        if sites_file:
+            return run_multi_site_check(sites_file, flight)
+
+        # Reuse the signed-in session (or asyncio client) from previous checks
+        use_async = get_probe_client() == 'async'
+        with tracer.span('session', client='async' if use_async else 'threads'):
+            session = get_session(server_url, site_name, token_name, token)
+
+        # With several instances, only check the partitions this one leases
+        with tracer.span('inventory') as span:
+            site_views = view_inventory.get_views(session)
+            all_views = shard_coordinator.local_views(site_views)
+            span.set(views=len(all_views))
+
+        probe_mode = get_probe_mode('preview')
+
+        def publish(view, result):
+            flight.publish(view_record(view, "error" if result.failed else "active", time.time()))
+            return result
+
+        async def probe_and_publish_async(view):
+            return publish(view, await probe_view_async(session, view, probe_mode))
 
-            # Send webhook notification
-            webhook_data = {
-                    "message": message,
-                    "username": "Tableau Monitor",
-                    "event_name": "tableau_monitor_check",
-                    "status": "error" if error_count > 0 else "success"
-                    }
-
-            # Send to the appropriate URL
-            requests.post(
-                    return_url,
-                    json=webhook_data,
-                    headers={"Content-Type": "application/json"}
+        # Probe the highest-priority views in parallel within the tick budget,
+        # stopping early if the server goes down
+        outcome = lambda result: (result.load_time, result.failed)
+        halt = lambda: session.guard.breaker.paused
+        if shard_coordinator.enabled:
+            # Carry on from the probes the previous owners of our partitions made
+            probe_scheduler.seed(shard_coordinator.load_probes(shard_coordinator.owned))
+        with tracer.span('probe_views', mode=probe_mode) as span:
+            if use_async:
+                probed = event_loop.run(probe_scheduler.run_async(
+                    all_views, probe_and_publish_async, outcome, get_async_concurrency(), halt=halt
+                    ))
+            else:
+                probed = probe_scheduler.run(
+                    all_views,
+                    lambda view: publish(view, probe_view(session, view, probe_mode)),
+                    outcome,
+                    halt=halt
                     )
+            span.set(probed=len(probed))
+        if shard_coordinator.enabled:
+            shard_coordinator.save_probes(probe_scheduler.export(probed))
 
-            # Response for API endpoint
-            response_data = {
-                    "success": True,
-                    "timestamp": current_time,
-                    "user": "cod-emminex",
-                    "total_views": len(all_views),
-                    "server_url": server_url,
-                    "site_name": site_name,
-                    "views": view_details,
-                    "errors_found": error_count
-                    }
+        with tracer.span('report'):
+            # Get additional view details
+            rows = [(view, probed.get(view.id), probe_scheduler.stats(view.id)) for view in all_views]
+            # Probes that failed because the server went down are one outage, not an alert per view
+            alerts = [] if session.guard.breaker.is_open else track_alerts(rows)
+            alert_tracker.forget(view.id for view in site_views)
+            alert_tracker.save()
+            view_details, error_count, pending_count = describe_views(rows)
+
+            # Only list what changed since the last check, apart from periodic full digests
+            report = delta_reporter.compare(
+                f"{server_url}/{site_name}",
+                observations(rows),
+                partitions=shard_coordinator.owned if shard_coordinator.enabled else None,
+                partition_of=shard_coordinator.partition_of
+                )
+
+        current_time = "2025-02-24 17:47:27"
+        message = (
+                f"Tableau Monitor Check - {current_time}\n"
+                f"Server: {server_url}\n"
+                f"Site: {site_name}\n"
+                f"Total Views: {len(all_views)}\n"
+                f"Active Views: {len(all_views) - error_count - pending_count}\n"
+                f"Error Views: {error_count}\n"
+                f"Probed This Check: {len(probed)}\n\n"
+                f"{views_section(report, view_details, with_project=True)}"
+                f"{alerts_section(alerts)}"
+                )
 
-            return jsonify(response_data)
+        # Send webhook notification
+        webhook_data = {
+                "message": message,
+                "username": "Tableau Monitor",
+                "event_name": "tableau_monitor_check",
+                "status": "error" if error_count > 0 else "success"
+                }
+
+        # Response for API endpoint
+        response_data = {
+                "success": True,
+                "timestamp": current_time,
+                "user": "cod-emminex",
+                "total_views": len(all_views),
+                "server_url": server_url,
+                "site_name": site_name,
+                "views": view_details,
+                "errors_found": error_count,
+                "probed_views": len(probed),
+                "deferred_views": len(all_views) - len(probed),
+                "alerts": [event.to_dict() for event in alerts]
+                }
+        if shard_coordinator.enabled:
+            response_data["shard"] = describe_shard(shard_coordinator.owned)
+            response_data["site_total_views"] = len(site_views)
+
+        return response_data, 200, outage_webhook(session.guard, webhook_data)
 
     except Exception as e:
+        ERRORS.labels('tick').inc()
         error_time = "2025-02-24 17:47:27"
 
-        # Send webhook error notification
-        try:
-            error_message = (
-                    f"Tableau Monitor Error - {error_time}\n"
-                    f"Server: {os.getenv('TABLEAU_SERVER_HOST', 'N/A')}\n"
-                    f"Site: {os.getenv('TABLEAU_SITE_NAME', 'N/A')}\n"
-                    f"Error: {str(e)}"
-                    )
+        # Webhook error notification
+        error_message = (
+                f"Tableau Monitor Error - {error_time}\n"
+                f"Server: {os.getenv('TABLEAU_SERVER_HOST', 'N/A')}\n"
+                f"Site: {os.getenv('TABLEAU_SITE_NAME', 'N/A')}\n"
+                f"Error: {str(e)}"
+                )
 
-            webhook_data = {
-                    "message": error_message,
-                    "username": "Tableau Monitor",
-                    "event_name": "tableau_monitor_error",
-                    "status": "error"
-                    }
-
-            requests.post(
-                    return_url if 'return_url' in locals() else webhook_url,
-                    json=webhook_data,
-                    headers={"Content-Type": "application/json"}
-                    )
-        except:
-            pass
+        webhook_data = {
+                "message": error_message,
+                "username": "Tableau Monitor",
+                "event_name": "tableau_monitor_error",
+                "status": "error"
+                }
 
         error_data = {
                 "success": False,
@@ -222,11 +592,322 @@ def monitor():
                 "error": str(e)
                 }
 
-        return jsonify(error_data), 500
+        if not sites_file:
+            webhook_data = outage_webhook(server_guards.get(server_url), webhook_data)
+        return error_data, 500, webhook_data
 
-if __name__ == '__main__':
-    # Start keep-alive thread
-    keep_alive_thread = threading.Thread(target=keep_alive, daemon=True)
-    keep_alive_thread.start()
+def tick_reuse_age():
+    """Seconds a finished check is reused by Telex ticks and scheduled runs.
+
+    Defaults to half the interval of the check schedule, so the Telex tick
+    and the scheduled run of the same slot share one check and one webhook.
+    """
+    configured = os.getenv('TICK_REUSE_AGE')
+    if configured is not None:
+        return float(configured)
+    first, second = monitor_scheduler.schedule.upcoming(2)
+    return (second - first).total_seconds() / 2
+
+def run_scheduled_check():
+    """Scheduler job: run a check and raise if it failed so the failure is recorded"""
+    response_data, status_code = run_monitor_check(max_age=tick_reuse_age())
+    if status_code != 200:
+        raise RuntimeError(response_data.get("error", "Monitor check failed"))
+
+monitor_scheduler = CronScheduler(
+    run_scheduled_check,
+    os.getenv('MONITOR_SCHEDULE', DEFAULT_INTERVAL),
+    state_path=os.getenv('SCHEDULER_STATE_PATH', DEFAULT_SCHEDULER_STATE_PATH)
+    )
+
+def preload_clients():
+    preload('requests', 'tableauserverclient', 'numpy')
+    if get_probe_client() == 'async':
+        preload('httpx')
+
+def warm_up_session():
+    """Sign in and list the site's views ahead of the first check"""
+    if os.getenv('TABLEAU_SITES_FILE'):
+        # Each site is checked in a worker process with its own sessions
+        return
+    server_url, site_name, token_name, token = tableau_settings()
+    if not token:
+        return
+    view_inventory.get_views(get_session(server_url, site_name, token_name, token))
+
+session_warmup = Warmup([('imports', preload_clients), ('session', warm_up_session)])
+
+def _enabled(name, default='true'):
+    return os.getenv(name, default).lower() in ('1', 'true', 'yes')
+
+@app.before_request
+def start_background_work():
+    # Started on the first request rather than at import, so forking servers
+    # never inherit the threads and one-off imports (scripts, benchmarks)
+    # don't start checking on a schedule
+    if _enabled('SCHEDULER_ENABLED'):
+        monitor_scheduler.start()
+    if _enabled('WARMUP_ENABLED'):
+        session_warmup.start()
+
+def run_monitor_job(return_url):
+    """Queued variant of run_monitor_check that keeps only the response body"""
+    response_data, _ = run_monitor_check(return_url, max_age=tick_reuse_age())
+    return response_data
+
+@app.route('/api/monitor', methods=['GET', 'POST'])
+def monitor():
+    if request.method == 'POST':
+        # Telex tick: validate, queue the check and acknowledge immediately
+        data = request.get_json(silent=True)
+        if data is None:
+            data = {}
+        if not isinstance(data, dict):
+            return jsonify({"success": False, "error": "Request body must be a JSON object"}), 400
+
+        return_url = data.get('return_url', WEBHOOK_URL)
+        if not isinstance(return_url, str) or not return_url.startswith(('http://', 'https://')):
+            return jsonify({"success": False, "error": "return_url must be an http(s) URL"}), 400
+
+        # A tick arriving while the last one for return_url still waits is merged into it
+        try:
+            job = job_queue.submit(run_monitor_job, return_url, name="monitor_check", key=("monitor_check", return_url))
+        except QueueFull as e:
+            return jsonify({"success": False, "error": f"Too many checks queued: {str(e)}"}), 503
+        return jsonify({
+            "success": True,
+            "job_id": job["id"],
+            "status": job["status"],
+            "status_url": f"/api/jobs/{job['id']}"
+            }), 202
+
+    cursor = request.args.get('cursor')
+    if cursor is not None:
+        return monitor_page(cursor)
+
+    limit = request.args.get('limit', type=int)
+    if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+        return jsonify({"success": False, "error": f"limit must be between 1 and {MAX_PAGE_SIZE}"}), 400
+
+    # Serve the last completed check while it is fresh enough; max_age=0 forces a new one
+    max_age = request.args.get('max_age', type=float)
+    if max_age is None:
+        max_age = float(os.getenv('SNAPSHOT_MAX_AGE', DEFAULT_SNAPSHOT_MAX_AGE))
+    snapshot = monitor_flight.snapshot(max_age) if max_age > 0 else None
 
+    if request.args.get('format') == 'ndjson' or request.accept_mimetypes.best == NDJSON_MIMETYPE:
+        return stream_monitor_check(snapshot)
+
+    if snapshot is None:
+        response_data, status_code = run_monitor_check()
+        if status_code != 200:
+            return jsonify(response_data), status_code
+        snapshot = monitor_flight.snapshot()
+
+    if limit is not None:
+        return snapshot_page(snapshot, 0, limit)
+
+    if request.if_none_match.contains(snapshot.etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(snapshot.data)
+    response.set_etag(snapshot.etag)
+    response.headers['Age'] = str(int(snapshot.age))
+    return response
+
+def report_views(data):
+    """All view records of a check result, across sites for multi-site checks"""
+    if "sites" in data:
+        return [view for site in data["sites"] for view in site.get("views", ())]
+    return data.get("views", [])
+
+def report_summary(data):
+    """A check result without its view records"""
+    summary = {key: value for key, value in data.items() if key != "views"}
+    if "sites" in summary:
+        summary["sites"] = [
+            {key: value for key, value in site.items() if key != "views"} for site in summary["sites"]
+            ]
+    return summary
+
+def monitor_page(cursor):
+    """Next page of the snapshot a cursor was issued for"""
+    try:
+        etag, offset = decode_cursor(cursor)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    limit = request.args.get('limit', type=int) or DEFAULT_PAGE_SIZE
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return jsonify({"success": False, "error": f"limit must be between 1 and {MAX_PAGE_SIZE}"}), 400
+
+    snapshot = monitor_flight.snapshot()
+    if snapshot is None or snapshot.etag != etag:
+        # Pages of different checks must not be mixed; the client starts over
+        return jsonify({"success": False, "error": "Cursor expired, a newer check replaced its results"}), 410
+    return snapshot_page(snapshot, offset, limit)
+
+def snapshot_page(snapshot, offset, limit):
+    """One page of a snapshot's view records, with the cursor of the next page"""
+    views = report_views(snapshot.data)
+    page = report_summary(snapshot.data)
+    page["views"] = views[offset:offset + limit]
+    page["next_cursor"] = encode_cursor(snapshot.etag, offset + limit) if offset + limit < len(views) else None
+
+    etag = f"{snapshot.etag}-{offset}-{limit}"
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(page)
+    response.set_etag(etag)
+    response.headers['Age'] = str(int(snapshot.age))
+    return response
+
+def stream_monitor_check(snapshot):
+    """Stream view records as NDJSON, then a summary line.
+
+    Without a fresh snapshot the check is started (or joined) and records
+    are sent as their probes finish, so the first lines arrive long before
+    the whole check does.
+    """
+    def line(kind, value):
+        return json.dumps({"type": kind, **value}, default=json_default) + "\n"
+
+    def generate():
+        if snapshot is not None:
+            data = snapshot.data
+            for view in report_views(data):
+                yield line("view", view.to_dict())
+        else:
+            flight, shared = monitor_flight.start(_timed_check)
+            if shared:
+                COALESCED_CHECKS.inc()
+            flight.add_done_callback(lambda finished: notify(finished, WEBHOOK_URL))
+            sent = set()
+            for record in flight.stream():
+                sent.add((record.site, record.id))
+                yield line("view", record.to_dict())
+            if flight.error is not None:
+                yield line("summary", {"success": False, "error": str(flight.error)})
+                return
+            data = flight.result[0]
+            # Views carried over from earlier checks were not probed in this one
+            for view in report_views(data):
+                if (view.site, view.id) not in sent:
+                    yield line("view", view.to_dict())
+        yield line("summary", report_summary(data))
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+
+def history_window(args):
+    """(start, end, step) of a history query from its end/start/range/resolution parameters"""
+    end = parse_timestamp(args['end']) if 'end' in args else time.time()
+    if 'start' in args:
+        start = parse_timestamp(args['start'])
+    else:
+        start = end - parse_duration(args.get('range', DEFAULT_HISTORY_RANGE))
+    if start >= end:
+        raise ValueError("start must be before end")
+    if 'resolution' in args:
+        step = parse_duration(args['resolution'])
+        rollup_level(step)
+    else:
+        step = auto_resolution(end - start, DEFAULT_HISTORY_POINTS)
+    if (end - start) / step > MAX_HISTORY_POINTS:
+        raise ValueError(f"Too many buckets, use a coarser resolution (at most {MAX_HISTORY_POINTS} per view)")
+    return start, end, step
+
+@app.route('/api/history', methods=['GET'])
+def get_history():
+    """p50/p95/max load time and error rate per time bucket for a view or project"""
+    view = request.args.get('view')
+    project = request.args.get('project')
+    if view is None and project is None:
+        return jsonify({"success": False, "error": "Pass a view and/or project (id or name)"}), 400
+    try:
+        start, end, step = history_window(request.args)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    views = history_store.find_views(view, project)
+    if len(views) > MAX_HISTORY_VIEWS:
+        return jsonify({"success": False, "error": f"{len(views)} views match, narrow the query to at most {MAX_HISTORY_VIEWS}"}), 400
+
+    return jsonify({
+        "success": True,
+        "start": int(start),
+        "end": int(end),
+        "resolution": format_duration(step),
+        "views": [
+            {
+                "view_id": view_id,
+                "name": meta.get("name"),
+                "project_id": meta.get("project_id"),
+                "project_name": meta.get("project_name"),
+                "buckets": [bucket.to_dict() for bucket in history_store.series(view_id, start, end, step)]
+                }
+            for view_id, meta in views
+            ]
+        })
+
+@app.route('/api/traces', methods=['GET'])
+def get_traces():
+    """Spans of the last checks as Chrome trace-event JSON (chrome://tracing, Perfetto)"""
+    ticks = request.args.get('ticks', type=int)
+    if ticks is not None and ticks < 1:
+        return jsonify({"success": False, "error": "ticks must be at least 1"}), 400
+    return jsonify(tracer.chrome_trace(ticks))
+
+def run_load_test(plan):
+    """Queued load test of one view of the configured site"""
+    server_url, site_name, token_name, token = tableau_settings()
+    return load_tester.run(lambda: session_pool.get(server_url, site_name, token_name, token), plan, reserved=True)
+
+@app.route('/api/loadtest', methods=['POST'])
+def start_load_test():
+    """Queue a ramping concurrency test of one view; the report is the job's result"""
+    if not _enabled('LOADTEST_ENABLED', 'false'):
+        return jsonify({"success": False, "error": "Load tests are disabled, set LOADTEST_ENABLED=true"}), 403
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"success": False, "error": "Request body must be a JSON object"}), 400
+    unknown = set(data) - {'view', 'stage', 'max_concurrency', 'steps', 'requests_per_client'}
+    if unknown:
+        return jsonify({"success": False, "error": f"Unknown fields: {', '.join(sorted(unknown))}"}), 400
+    try:
+        plan = LoadTestPlan(**data)
+    except (TypeError, ValueError) as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    if not load_tester.reserve():
+        return jsonify({"success": False, "error": "Another load test is running"}), 409
+    try:
+        job = load_test_jobs.submit(run_load_test, plan, name="load_test")
+    except Exception:
+        load_tester.release()
+        raise
+    return jsonify({
+        "success": True,
+        "job_id": job["id"],
+        "status": job["status"],
+        "status_url": f"/api/jobs/{job['id']}",
+        "levels": plan.levels,
+        "total_requests": plan.total_requests
+        }), 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_queue.get(job_id) or load_test_jobs.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Job not found"}), 404
+    return jsonify(job)
+
+@app.route('/api/schedule', methods=['GET'])
+def get_schedule():
+    return jsonify(dict(monitor_scheduler.status(), warmup=session_warmup.status()))
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(registry.render(), content_type=CONTENT_TYPE)
+
+if __name__ == '__main__':
     app.run(host='0.0.0.0', port=int(os.getenv('PORT', 8000)))
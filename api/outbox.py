@@ -0,0 +1,336 @@
+import atexit
+import json
+import logging
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+
+from api.lazy import lazy_import
+from api.metrics import ERRORS, RETRIES, WEBHOOK_SECONDS
+from api.tracing import tracer
+
+requests = lazy_import('requests')
+
+logger = logging.getLogger('WebhookOutbox')
+
+DEFAULT_OUTBOX_PATH = os.path.join('data', 'outbox.sqlite3')
+DEFAULT_TIMEOUT = 10
+DEFAULT_MAX_ATTEMPTS = 8
+DEFAULT_BATCH_SIZE = 1
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 300.0
+# Events given up on are kept this long for inspection, then deleted
+DEFAULT_DEAD_RETENTION = 7 * 86400
+SWEEP_INTERVAL = 3600
+# Most queued events whose delivery is traced; the oldest are dropped beyond it
+MAX_TRACED_EVENTS = 1000
+# A claim outlives the POST timeout by this much before another sender may take the event
+CLAIM_MARGIN = 30.0
+
+# Most severe status wins when several events are sent as one message
+STATUS_SEVERITY = ["success", "info", "active", "warning", "error"]
+
+
+def _severity(status):
+    return STATUS_SEVERITY.index(status) if status in STATUS_SEVERITY else 0
+
+
+def retry_delay(attempts):
+    """Seconds before retrying an event that has failed `attempts` times: doubling, capped, with jitter"""
+    return min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX) * random.uniform(0.8, 1.2)
+
+
+def merge_payloads(payloads):
+    """Combine several Telex webhook payloads into a single message"""
+    if len(payloads) == 1:
+        return payloads[0]
+    return {
+        "event_name": "tableau_monitor_batch",
+        "username": payloads[0].get("username", "Tableau Monitor"),
+        "status": max((p.get("status", "info") for p in payloads), key=_severity),
+        "message": "\n\n---\n\n".join(p.get("message", "") for p in payloads)
+    }
+
+
+class WebhookOutbox:
+    """Persistent queue of webhook deliveries drained by a background sender.
+
+    Events are stored in SQLite before enqueue() returns, so a slow or
+    unreachable endpoint never blocks the caller and queued events survive
+    restarts. The sender posts over one pooled requests.Session, retries
+    anything other than a 2xx answer with exponential backoff, and gives up
+    after `max_attempts`; those events are deleted `dead_retention` seconds
+    later. With `batch_size` > 1, due events for the same URL are merged
+    into one message. Senders claim events in a write transaction before
+    posting them, so processes sharing the file (e.g. gunicorn workers)
+    never send the same event at once.
+    """
+
+    def __init__(self, path=None, timeout=None, max_attempts=None, batch_size=None, dead_retention=None):
+        self.path = path or os.getenv('OUTBOX_PATH', DEFAULT_OUTBOX_PATH)
+        self.timeout = timeout or float(os.getenv('OUTBOX_TIMEOUT', DEFAULT_TIMEOUT))
+        self.max_attempts = max_attempts or int(os.getenv('OUTBOX_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS))
+        self.batch_size = batch_size or int(os.getenv('OUTBOX_BATCH_SIZE', DEFAULT_BATCH_SIZE))
+        if dead_retention is None:
+            dead_retention = float(os.getenv('OUTBOX_DEAD_RETENTION', DEFAULT_DEAD_RETENTION))
+        self.dead_retention = dead_retention
+        self._last_sweep = 0.0
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._session = None
+        # Event id -> trace of the tick that queued it, to trace its delivery
+        self._traces = {}
+
+    def _connect(self):
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " url TEXT NOT NULL,"
+                " payload TEXT NOT NULL,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " next_attempt REAL NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " dead INTEGER NOT NULL DEFAULT 0,"
+                " last_error TEXT,"
+                " claimed_by TEXT,"
+                " claimed_until REAL,"
+                " died_at REAL)"
+            )
+            # Outboxes created before claims and retention lack their columns
+            columns = {row[1] for row in db.execute("PRAGMA table_info(events)")}
+            for column, kind in (('claimed_by', 'TEXT'), ('claimed_until', 'REAL'), ('died_at', 'REAL')):
+                if column not in columns:
+                    try:
+                        db.execute(f"ALTER TABLE events ADD COLUMN {column} {kind}")
+                    except sqlite3.OperationalError:
+                        # Another process added it first
+                        pass
+            db.execute("CREATE INDEX IF NOT EXISTS events_due ON events (dead, next_attempt)")
+            self._db = db
+        return self._db
+
+    def _execute(self, sql, params=()):
+        with self._db_lock:
+            return self._connect().execute(sql, params).fetchall()
+
+    def _http(self):
+        if self._session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=4)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            self._session = session
+        return self._session
+
+    def enqueue(self, url, payload, trace=None):
+        """Persist a webhook delivery and return without waiting for it.
+
+        Its delivery is traced in `trace`, by default the tick in progress.
+        """
+        now = time.time()
+        with tracer.span('webhook_enqueue', 'webhook', event=payload.get('event_name')):
+            with self._db_lock:
+                event_id = self._connect().execute(
+                    "INSERT INTO events (url, payload, next_attempt, created_at) VALUES (?, ?, ?, ?)",
+                    (url, json.dumps(payload), now, now)
+                ).lastrowid
+        trace = trace or tracer.current()
+        if trace is not None:
+            self._traces[event_id] = trace
+            while len(self._traces) > MAX_TRACED_EVENTS:
+                self._traces.pop(next(iter(self._traces)), None)
+        self._ensure_sender()
+        self._wakeup.set()
+
+    def depth(self):
+        """Number of deliveries still waiting to be sent"""
+        return self._execute("SELECT COUNT(*) FROM events WHERE dead = 0")[0][0]
+
+    def _ensure_sender(self):
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._sender, name='webhook-outbox', daemon=True)
+                self._thread.start()
+
+    def _sender(self):
+        while True:
+            # Clear before draining so an enqueue() during the drain is not missed
+            self._wakeup.clear()
+            try:
+                if time.time() - self._last_sweep >= SWEEP_INTERVAL:
+                    self.sweep()
+                next_due = self._drain()
+            except Exception as e:
+                logger.error(f"Webhook outbox error: {str(e)}")
+                next_due = time.time() + BACKOFF_BASE
+
+            wait = None if next_due is None else max(0.0, next_due - time.time())
+            self._wakeup.wait(wait)
+
+    def sweep(self, now=None):
+        """Delete events given up on more than dead_retention seconds ago; returns how many"""
+        now = time.time() if now is None else now
+        self._last_sweep = now
+        with self._db_lock:
+            deleted = self._connect().execute(
+                "DELETE FROM events WHERE dead = 1 AND COALESCE(died_at, created_at) < ?",
+                (now - self.dead_retention,)
+            ).rowcount
+        if deleted:
+            logger.info(f"Deleted {deleted} webhook deliveries given up on over {self.dead_retention:.0f}s ago")
+        self._prune_traces()
+        return deleted
+
+    def _prune_traces(self):
+        """Forget traces of events that are no longer pending, e.g. sent by another process"""
+        traced = list(self._traces)
+        pending = set()
+        for start in range(0, len(traced), 500):
+            ids = traced[start:start + 500]
+            pending.update(row[0] for row in self._execute(
+                f"SELECT id FROM events WHERE dead = 0 AND id IN ({','.join('?' * len(ids))})", ids
+            ))
+        for event_id in traced:
+            if event_id not in pending:
+                self._traces.pop(event_id, None)
+
+    def _claim(self, now):
+        """Claim the next due events for this process; returns their rows grouped by URL"""
+        owner = f"{socket.gethostname()}-{os.getpid()}"
+        with self._db_lock:
+            db = self._connect()
+            # The write lock is taken up front, so no other sender can claim the same rows
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = db.execute(
+                    "SELECT id, url, payload, attempts FROM events"
+                    " WHERE dead = 0 AND next_attempt <= ? AND (claimed_until IS NULL OR claimed_until <= ?)"
+                    " ORDER BY id LIMIT ?",
+                    (now, now, max(self.batch_size, 1) * 10)
+                ).fetchall()
+
+                groups = {}
+                for row in rows:
+                    group = groups.setdefault(row[1], [])
+                    if len(group) < self.batch_size or not group:
+                        group.append(row)
+
+                ids = [row[0] for group in groups.values() for row in group]
+                if ids:
+                    db.execute(
+                        "UPDATE events SET claimed_by = ?, claimed_until = ?"
+                        f" WHERE id IN ({','.join('?' * len(ids))})",
+                        [owner, now + self.timeout + CLAIM_MARGIN, *ids]
+                    )
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+        return groups
+
+    def _drain(self):
+        """Send every due event; return when the next retry is due, or None"""
+        while True:
+            groups = self._claim(time.time())
+            if not groups:
+                break
+            for url, group in groups.items():
+                self._deliver(url, group)
+
+        # Events claimed by another sender are due again if their claim lapses
+        pending = self._execute(
+            "SELECT MIN(MAX(next_attempt, COALESCE(claimed_until, 0))) FROM events WHERE dead = 0"
+        )[0][0]
+        return pending
+
+    def _deliver(self, url, rows):
+        ids = [row[0] for row in rows]
+        payload = merge_payloads([json.loads(row[2]) for row in rows])
+        error = None
+        start_time = time.perf_counter()
+        try:
+            response = self._http().post(
+                url,
+                json=payload,
+                headers={"Content-Type": "application/json"},
+                timeout=self.timeout
+            )
+            if 200 <= response.status_code < 300:
+                WEBHOOK_SECONDS.labels('success').observe(time.perf_counter() - start_time)
+                self._trace_delivery(rows, start_time, response.status_code, delivered=True)
+                self._execute(
+                    f"DELETE FROM events WHERE id IN ({','.join('?' * len(ids))})", ids
+                )
+                return
+            error = f"HTTP {response.status_code}: {response.text[:200]}"
+        except requests.RequestException as e:
+            error = str(e)
+
+        WEBHOOK_SECONDS.labels('failure').observe(time.perf_counter() - start_time)
+        self._trace_delivery(rows, start_time, error, delivered=False)
+        ERRORS.labels('webhook').inc()
+        for event_id, _, _, attempts in rows:
+            attempts += 1
+            if attempts >= self.max_attempts:
+                logger.error(f"Giving up on webhook to {url} after {attempts} attempts: {error}")
+                self._traces.pop(event_id, None)
+                self._execute(
+                    "UPDATE events SET attempts = ?, dead = 1, died_at = ?, last_error = ?,"
+                    " claimed_by = NULL, claimed_until = NULL WHERE id = ?",
+                    (attempts, time.time(), error, event_id)
+                )
+            else:
+                RETRIES.labels('webhook').inc()
+                delay = retry_delay(attempts)
+                logger.warning(f"Webhook to {url} failed ({error}), retrying in {delay:.1f}s")
+                self._execute(
+                    "UPDATE events SET attempts = ?, next_attempt = ?, last_error = ?,"
+                    " claimed_by = NULL, claimed_until = NULL WHERE id = ?",
+                    (attempts, time.time() + delay, error, event_id)
+                )
+
+    def _trace_delivery(self, rows, start_time, outcome, delivered):
+        """Add a delivery attempt to the traces of the ticks that queued these events"""
+        if not self._traces:
+            return
+        end_time = time.perf_counter()
+        for event_id, _, _, attempts in rows:
+            trace = self._traces.pop(event_id, None) if delivered else self._traces.get(event_id)
+            if trace is not None:
+                trace.add('webhook_post', 'webhook', start_time, end_time,
+                          {"attempt": attempts + 1, "outcome": outcome, "batched": len(rows)})
+
+    def flush(self, timeout=30):
+        """Wait until nothing is due for delivery, e.g. before a CLI run exits.
+
+        Events waiting out a retry backoff are left in the outbox for the
+        next run rather than holding the process open.
+        """
+        if self._thread is None:
+            return True
+        self._wakeup.set()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            due = self._execute(
+                "SELECT COUNT(*) FROM events WHERE dead = 0 AND next_attempt <= ?", (time.time(),)
+            )[0][0]
+            if due == 0:
+                return True
+            time.sleep(0.05)
+        return False
+
+
+webhook_outbox = WebhookOutbox()
+atexit.register(webhook_outbox.flush)
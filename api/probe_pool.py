@@ -0,0 +1,85 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+DEFAULT_PROBE_CONCURRENCY = 8
+
+# Placeholder result for views that were not probed before the deadline
+SKIPPED = object()
+
+
+def get_probe_concurrency():
+    """Read the maximum number of parallel view probes from the environment"""
+    try:
+        return max(1, int(os.getenv('PROBE_CONCURRENCY', DEFAULT_PROBE_CONCURRENCY)))
+    except ValueError:
+        return DEFAULT_PROBE_CONCURRENCY
+
+
+def probe_views_until(views, probe, deadline, max_workers=None, halt=None):
+    """Probe views in order on a bounded worker pool until a deadline.
+
+    No new probe is started once time.monotonic() passes `deadline`, or once
+    halt() returns true; probes already running are allowed to finish. Views
+    that were never started get SKIPPED in their slot, so results still line
+    up with the input order.
+    """
+    views = list(views)
+    results = [SKIPPED] * len(views)
+    if not views:
+        return results
+
+    if max_workers is None:
+        max_workers = get_probe_concurrency()
+    workers = min(max_workers, len(views))
+
+    next_index = iter(range(len(views)))
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if time.monotonic() >= deadline or (halt is not None and halt()):
+                    return
+                index = next(next_index, None)
+            if index is None:
+                return
+            results[index] = probe(views[index])
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='probe') as executor:
+        # Workers run in the caller's context, e.g. to trace probes in its tick
+        futures = [executor.submit(contextvars.copy_context().run, worker) for _ in range(workers)]
+        wait(futures)
+        for future in futures:
+            future.result()
+
+    return results
+
+
+async def probe_views_until_async(views, probe, deadline, max_workers, halt=None):
+    """probe_views_until() for a coroutine function probe, on the running event loop.
+
+    `max_workers` tasks take views in order, so thousands of probes can be
+    in flight without a thread each.
+    """
+    views = list(views)
+    results = [SKIPPED] * len(views)
+    if not views:
+        return results
+
+    next_index = iter(range(len(views)))
+
+    async def worker():
+        while True:
+            if time.monotonic() >= deadline or (halt is not None and halt()):
+                return
+            index = next(next_index, None)
+            if index is None:
+                return
+            results[index] = await probe(views[index])
+
+    await asyncio.gather(*(worker() for _ in range(min(max_workers, len(views)))))
+    return results
@@ -0,0 +1,183 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from api.metrics import SKIPPED_VIEWS
+from api.probe_pool import SKIPPED, probe_views_until, probe_views_until_async
+
+logger = logging.getLogger('ProbeScheduler')
+
+DEFAULT_TIME_BUDGET = 90
+DEFAULT_MAX_STALENESS = 900
+DEFAULT_SLOW_THRESHOLD = 10
+
+# Weight given to recent errors and slowness relative to time since last probe
+ERROR_WEIGHT = 2.0
+SLOWNESS_WEIGHT = 1.0
+# Smoothing for the moving averages of load time and error rate
+DECAY = 0.5
+
+
+class ViewStats:
+    __slots__ = ('last_probed', 'load_time', 'error_score', 'failed')
+
+    def __init__(self, last_probed=None, load_time=None, error_score=0.0, failed=False):
+        self.last_probed = last_probed
+        self.load_time = load_time
+        self.error_score = error_score
+        self.failed = failed
+
+
+class ProbeScheduler:
+    """Decides which views to probe on each tick within a time budget.
+
+    Views not probed for `max_staleness` seconds go first, oldest first.
+    The rest are ranked by time since their last probe plus weights for
+    recent slowness and recent errors. Probes are started in that order
+    until `time_budget` seconds have passed; anything left over is carried
+    to the next tick with its age still growing, so every view is reached
+    as long as one budget can cover the site within the staleness window.
+    """
+
+    def __init__(self, time_budget=None, max_staleness=None, slow_threshold=None, state_path=None):
+        if time_budget is None:
+            time_budget = float(os.getenv('PROBE_TIME_BUDGET', DEFAULT_TIME_BUDGET))
+        if max_staleness is None:
+            max_staleness = float(os.getenv('PROBE_MAX_STALENESS', DEFAULT_MAX_STALENESS))
+        if slow_threshold is None:
+            slow_threshold = float(os.getenv('LOAD_TIME_THRESHOLD', DEFAULT_SLOW_THRESHOLD))
+        self.time_budget = time_budget
+        self.max_staleness = max_staleness
+        self.slow_threshold = slow_threshold
+        self.state_path = state_path
+        self._stats = {}
+        self._lock = threading.Lock()
+        if state_path:
+            self.load()
+
+    def priority(self, stats, now):
+        """Return a sort key; smaller keys are probed first"""
+        if stats is None or stats.last_probed is None:
+            return (0, 0.0)
+
+        age = now - stats.last_probed
+        if age >= self.max_staleness:
+            return (0, -age)
+
+        score = age / self.max_staleness
+        score += ERROR_WEIGHT * stats.error_score
+        if stats.load_time is not None and self.slow_threshold > 0:
+            score += SLOWNESS_WEIGHT * min(stats.load_time / self.slow_threshold, 3.0)
+        return (1, -score)
+
+    def plan(self, views):
+        """Return the views ordered by probe priority"""
+        now = time.time()
+        with self._lock:
+            return sorted(views, key=lambda view: self.priority(self._stats.get(view.id), now))
+
+    def record(self, view_id, load_time, failed, probed_at=None):
+        """Fold one probe outcome into the view's history"""
+        with self._lock:
+            stats = self._stats.setdefault(view_id, ViewStats())
+            stats.last_probed = probed_at or time.time()
+            stats.failed = failed
+            stats.error_score = DECAY * stats.error_score + (1.0 if failed else 0.0)
+            if load_time is not None:
+                if stats.load_time is None:
+                    stats.load_time = load_time
+                else:
+                    stats.load_time = DECAY * stats.load_time + (1 - DECAY) * load_time
+
+    def stats(self, view_id):
+        with self._lock:
+            return self._stats.get(view_id)
+
+    def export(self, view_ids):
+        """(view_id, last_probed, load_time, failed) of views that have been probed"""
+        with self._lock:
+            return [
+                (view_id, stats.last_probed, stats.load_time, stats.failed)
+                for view_id, stats in ((view_id, self._stats.get(view_id)) for view_id in view_ids)
+                if stats is not None and stats.last_probed is not None
+            ]
+
+    def seed(self, probes):
+        """Adopt probes made elsewhere, e.g. by a partition's previous owner, where newer than ours.
+
+        `probes` maps view id to (probed_at, load_time, failed).
+        """
+        with self._lock:
+            for view_id, (probed_at, load_time, failed) in probes.items():
+                stats = self._stats.get(view_id)
+                if stats is None:
+                    self._stats[view_id] = ViewStats(probed_at, load_time, 1.0 if failed else 0.0, failed)
+                elif stats.last_probed is None or stats.last_probed < probed_at:
+                    stats.last_probed = probed_at
+                    stats.failed = failed
+                    if load_time is not None:
+                        stats.load_time = load_time
+
+    def run(self, views, probe, outcome, max_workers=None, halt=None):
+        """Probe the highest-priority views until the time budget runs out.
+
+        `outcome(result)` must return a (load_time, failed) tuple for a probe
+        result. Probing also stops early once halt() returns true, e.g. while
+        the server is down. Returns a dict mapping view id to probe result
+        for the views that were probed on this tick.
+        """
+        ordered = self.plan(views)
+        deadline = time.monotonic() + self.time_budget
+        results = probe_views_until(ordered, probe, deadline, max_workers=max_workers, halt=halt)
+        return self._collect(ordered, results, outcome, halt)
+
+    async def run_async(self, views, probe, outcome, max_workers, halt=None):
+        """run() for a coroutine function probe, with up to max_workers probes in flight"""
+        ordered = self.plan(views)
+        deadline = time.monotonic() + self.time_budget
+        results = await probe_views_until_async(ordered, probe, deadline, max_workers, halt=halt)
+        return self._collect(ordered, results, outcome, halt)
+
+    def _collect(self, ordered, results, outcome, halt):
+        """Record the outcome of every probe that ran and return them by view id"""
+        probed = {}
+        for view, result in zip(ordered, results):
+            if result is SKIPPED:
+                continue
+            load_time, failed = outcome(result)
+            self.record(view.id, load_time, failed)
+            probed[view.id] = result
+
+        skipped = len(ordered) - len(probed)
+        if skipped:
+            SKIPPED_VIEWS.inc(skipped)
+            if halt is not None and halt():
+                logger.info(f"Probing halted, {skipped} views carried over")
+            else:
+                logger.info(f"Probe budget of {self.time_budget}s reached, {skipped} views carried over")
+        if self.state_path:
+            self.save()
+        return probed
+
+    def load(self):
+        """Restore stats saved by a previous run, e.g. for one-shot CLI checks"""
+        try:
+            with open(self.state_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        with self._lock:
+            self._stats = {view_id: ViewStats(*values) for view_id, values in data.items()}
+
+    def save(self):
+        with self._lock:
+            data = {
+                view_id: [s.last_probed, s.load_time, s.error_score, s.failed]
+                for view_id, s in self._stats.items()
+            }
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.state_path)
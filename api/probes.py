@@ -0,0 +1,167 @@
+import os
+import time
+
+from api.lazy import lazy_import
+from api.metrics import ERRORS, PROBE_SECONDS, PROBES_IN_FLIGHT
+from api.tracing import tracer
+
+TSC = lazy_import('tableauserverclient')
+
+# Stages fetched by each probe mode, in request order
+PROBE_MODES = {
+    'preview': ('preview',),
+    'image': ('image',),
+    'pdf': ('pdf',),
+    'full': ('preview', 'image', 'pdf'),
+}
+
+CHUNK_SIZE = 64 * 1024
+
+
+def get_probe_mode(default='full'):
+    """Read PROBE_MODE from the environment, falling back to default"""
+    mode = os.getenv('PROBE_MODE', default).strip().lower()
+    if mode not in PROBE_MODES:
+        raise ValueError(f"Unknown PROBE_MODE '{mode}', expected one of: {', '.join(PROBE_MODES)}")
+    return mode
+
+
+def _stage_url(server, view, stage):
+    if stage == 'preview':
+        return f"{server.views.siteurl}/workbooks/{view.workbook_id}/views/{view.id}/previewImage"
+    return f"{server.views.baseurl}/{view.id}/{stage}"
+
+
+class StageTiming:
+    """Timing of one rendered resource: time to first byte and total time"""
+
+    __slots__ = ('stage', 'ttfb', 'total', 'bytes')
+
+    def __init__(self, stage, ttfb, total, size):
+        self.stage = stage
+        self.ttfb = ttfb
+        self.total = total
+        self.bytes = size
+
+    def to_dict(self):
+        return {
+            "stage": self.stage,
+            "ttfb": round(self.ttfb, 4),
+            "total": round(self.total, 4),
+            "bytes": self.bytes
+        }
+
+
+class ProbeResult:
+    """Outcome of probing one view in a given mode, started at `started_at` (Unix time)"""
+
+    __slots__ = ('view_id', 'mode', 'stages', 'error', 'started_at')
+
+    def __init__(self, view_id, mode, started_at=None):
+        self.view_id = view_id
+        self.mode = mode
+        self.stages = []
+        self.error = None
+        self.started_at = time.time() if started_at is None else started_at
+
+    @property
+    def failed(self):
+        return self.error is not None
+
+    @property
+    def load_time(self):
+        """Total time over all completed stages, or None if the probe failed"""
+        if self.failed:
+            return None
+        return sum(stage.total for stage in self.stages)
+
+    def to_dict(self):
+        return {
+            "view_id": self.view_id,
+            "mode": self.mode,
+            "load_time": round(self.load_time, 4) if self.load_time is not None else None,
+            "stages": [stage.to_dict() for stage in self.stages],
+            "error": self.error
+        }
+
+
+def _stream_stage(server, url, stage, http=None):
+    """GET url, discarding the body as it streams in, and time it.
+
+    Uses the server's pooled requests session unless given another one.
+    """
+    options = dict(server.http_options)
+    headers = dict(options.pop('headers', {}))
+    headers['x-tableau-auth'] = server.auth_token
+
+    with tracer.span(stage, 'render') as span:
+        start_time = time.perf_counter()
+        with (http or server.session).get(url, headers=headers, stream=True, **options) as response:
+            ttfb = time.perf_counter() - start_time
+            if response.status_code == 401:
+                raise TSC.ServerResponseError('401000', 'Unauthorized', response.text, url)
+            if response.status_code >= 400:
+                raise TSC.ServerResponseError(
+                    str(response.status_code),
+                    f"Fetching {stage} failed",
+                    response.text[:500],
+                    url
+                )
+
+            size = 0
+            for chunk in response.iter_content(CHUNK_SIZE):
+                size += len(chunk)
+        span.set(ttfb=round(ttfb, 4), bytes=size)
+
+    return StageTiming(stage, ttfb, time.perf_counter() - start_time, size)
+
+
+def probe_view(session, view, mode='full'):
+    """Render a view's resources for the given mode and time each stage.
+
+    Response bodies are streamed and thrown away, so nothing is kept on the
+    view item. Errors are recorded on the result instead of raised.
+    """
+    result = ProbeResult(view.id, mode)
+    PROBES_IN_FLIGHT.inc()
+    start_time = time.perf_counter()
+    try:
+        with tracer.span('probe', view=view.name, mode=mode) as span:
+            for stage in PROBE_MODES[mode]:
+                try:
+                    timing = session.call(
+                        lambda server: _stream_stage(server, _stage_url(server, view, stage), stage),
+                        kind=stage
+                    )
+                except Exception as e:
+                    result.error = f"{stage}: {str(e)}"
+                    ERRORS.labels('probe').inc()
+                    span.set(error=result.error[:200])
+                    break
+                result.stages.append(timing)
+    finally:
+        PROBES_IN_FLIGHT.dec()
+    PROBE_SECONDS.labels(mode).observe(time.perf_counter() - start_time)
+    return result
+
+
+async def probe_view_async(client, view, mode='full'):
+    """probe_view() on an AsyncTableauClient, for running many probes on one thread"""
+    result = ProbeResult(view.id, mode)
+    PROBES_IN_FLIGHT.inc()
+    start_time = time.perf_counter()
+    try:
+        with tracer.span('probe', view=view.name, mode=mode) as span:
+            for stage in PROBE_MODES[mode]:
+                try:
+                    timing = await client.fetch_stage(view, stage)
+                except Exception as e:
+                    result.error = f"{stage}: {str(e)}"
+                    ERRORS.labels('probe').inc()
+                    span.set(error=result.error[:200])
+                    break
+                result.stages.append(timing)
+    finally:
+        PROBES_IN_FLIGHT.dec()
+    PROBE_SECONDS.labels(mode).observe(time.perf_counter() - start_time)
+    return result
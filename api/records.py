@@ -0,0 +1,37 @@
+class ViewRecord:
+    """One view's line in a monitor report.
+
+    Slotted instead of a dict per view, since a report holds one of these
+    for every view on the site. to_dict() gives the JSON shape.
+    """
+
+    __slots__ = ('id', 'name', 'status', 'created_at', 'project_name', 'last_probed_at', 'site')
+
+    def __init__(self, id, name, status, created_at=None, project_name=None, last_probed_at=None, site=None):
+        self.id = id
+        self.name = name
+        self.status = status
+        self.created_at = created_at
+        self.project_name = project_name
+        self.last_probed_at = last_probed_at
+        self.site = site
+
+    def to_dict(self):
+        data = {
+            "name": self.name,
+            "id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "project_name": self.project_name,
+            "last_probed_at": self.last_probed_at
+        }
+        if self.site is not None:
+            data["site"] = self.site
+        return data
+
+
+def json_default(value):
+    """json.dumps default hook for report objects such as ViewRecord"""
+    if hasattr(value, 'to_dict'):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
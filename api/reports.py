@@ -0,0 +1,177 @@
+import bisect
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+DEFAULT_REPORT_STATE_PATH = os.path.join('data', 'report_state.json')
+DEFAULT_FULL_REPORT_INTERVAL = 3600
+REPORT_MODES = ('delta', 'full')
+
+# Upper bounds in seconds of the latency buckets; a view whose load time
+# moves to another bucket is reported as changed, smaller moves are not
+LATENCY_BUCKETS = (1, 2, 5, 10, 30, 60)
+
+
+def get_report_mode(default='delta'):
+    """Report mode from REPORT_MODE ('delta' or 'full')"""
+    mode = os.getenv('REPORT_MODE', default).lower()
+    if mode not in REPORT_MODES:
+        raise ValueError(f"Unknown REPORT_MODE '{mode}', expected one of: {', '.join(REPORT_MODES)}")
+    return mode
+
+
+def latency_bucket(load_time):
+    """Label of the latency bucket a load time falls in, None without one"""
+    if load_time is None:
+        return None
+    index = bisect.bisect_right(LATENCY_BUCKETS, load_time)
+    if index == 0:
+        return f"<{LATENCY_BUCKETS[0]}s"
+    if index == len(LATENCY_BUCKETS):
+        return f">{LATENCY_BUCKETS[-1]}s"
+    return f"{LATENCY_BUCKETS[index - 1]}-{LATENCY_BUCKETS[index]}s"
+
+
+def _label(state):
+    status, bucket = state
+    return f"{status.upper()} ({bucket})" if bucket else status.upper()
+
+
+class ViewChange:
+    """A view whose status or latency bucket differs from the previous report"""
+
+    __slots__ = ('view_id', 'name', 'before', 'after')
+
+    def __init__(self, view_id, name, before, after):
+        self.view_id = view_id
+        self.name = name
+        # (status, latency bucket), or None for a new or removed view
+        self.before = before
+        self.after = after
+
+    def describe(self):
+        before = _label(self.before) if self.before else "NEW"
+        after = _label(self.after) if self.after else "REMOVED"
+        return f"{self.name}: {before} -> {after}"
+
+
+class Report:
+    """Outcome of comparing one check against the previous one for a scope"""
+
+    __slots__ = ('scope', 'full', 'changes', 'counts', 'total')
+
+    def __init__(self, scope, full, changes, counts, total):
+        self.scope = scope
+        self.full = full
+        self.changes = changes
+        self.counts = counts
+        self.total = total
+
+    def format_changes(self, limit=None):
+        """Changed views as message lines, problems first, at most `limit` of them"""
+        if not self.changes:
+            return "No Changes Since Last Check"
+        changes = sorted(self.changes, key=lambda change: change.after is not None and change.after[0] in ('active', 'ok'))
+        listed = changes[:limit] if limit else changes
+        lines = [f"Changes Since Last Check: {len(changes)}"]
+        lines.extend(f"- {change.describe()}" for change in listed)
+        if len(listed) < len(changes):
+            lines.append(f"... and {len(changes) - len(listed)} more changes not listed")
+        return "\n".join(lines)
+
+
+class DeltaReporter:
+    """Tracks the last reported status and latency bucket of every view.
+
+    compare() diffs a check against the previous one for the same scope (a
+    site, or the CLI monitor) so messages can carry only the views that
+    changed. A full report is due on the first check of a scope, every
+    `full_interval` seconds after that as a digest, and always in 'full'
+    mode. State is saved as JSON only when something changed.
+
+    With sharding, pass the partitions the instance owns: views in
+    partitions that moved to or from another instance since the last check
+    of the scope are neither NEW nor REMOVED, only handed over.
+    """
+
+    def __init__(self, state_path=None, full_interval=None):
+        self.state_path = state_path or os.getenv('REPORT_STATE_PATH', DEFAULT_REPORT_STATE_PATH)
+        if full_interval is None:
+            full_interval = float(os.getenv('REPORT_FULL_INTERVAL', DEFAULT_FULL_REPORT_INTERVAL))
+        self.full_interval = full_interval
+        self._scopes = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        try:
+            with open(self.state_path) as f:
+                self._scopes = json.load(f)
+        except (OSError, ValueError):
+            self._scopes = {}
+
+    def save(self):
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(f"{self.state_path}.tmp", 'w') as f:
+            json.dump(self._scopes, f)
+        os.replace(f"{self.state_path}.tmp", self.state_path)
+
+    def compare(self, scope, observations, mode=None, now=None, partitions=None, partition_of=None):
+        """Diff (view_id, name, status, load_time) observations with the last check.
+
+        A status of None means the view was not probed this time; it keeps
+        its previous state. Views missing from observations were removed.
+        `partitions` are the shard partitions owned for this check and
+        `partition_of(view_id)` maps a view to its partition; only views in
+        partitions owned for both checks are diffed.
+        """
+        mode = mode or get_report_mode()
+        now = time.time() if now is None else now
+        with self._lock:
+            if self._scopes is None:
+                self.load()
+            previous = self._scopes.get(scope)
+            previous_views = previous["views"] if previous else {}
+
+            previous_partitions = previous.get("partitions") if previous else None
+            if partitions is None:
+                kept = lambda view_id: True
+            else:
+                partitions = sorted(partitions)
+                both = set(partitions)
+                if previous_partitions is not None:
+                    both.intersection_update(previous_partitions)
+                kept = lambda view_id: partition_of(view_id) in both
+
+            views = {}
+            changes = []
+            for view_id, name, status, load_time in observations:
+                before = previous_views.get(view_id)
+                if status is None:
+                    if before is not None:
+                        views[view_id] = before
+                    continue
+                after = [name, status, latency_bucket(load_time)]
+                views[view_id] = after
+                if kept(view_id) and (before is None or before[1:] != after[1:]):
+                    changes.append(ViewChange(view_id, name, tuple(before[1:]) if before else None, tuple(after[1:])))
+            for view_id, before in previous_views.items():
+                if view_id not in views and kept(view_id):
+                    changes.append(ViewChange(view_id, before[0], tuple(before[1:]), None))
+
+            handed_over = partitions is not None and previous_partitions != partitions
+            full = mode == 'full' or previous is None or now - previous["last_full"] >= self.full_interval
+            if full or changes or handed_over:
+                self._scopes[scope] = {"views": views, "last_full": now if full else previous["last_full"]}
+                if partitions is not None:
+                    self._scopes[scope]["partitions"] = partitions
+                self.save()
+
+        counts = Counter(state[1] for state in views.values())
+        return Report(scope, full, changes, dict(counts), len(views))
+
+
+delta_reporter = DeltaReporter()
@@ -0,0 +1,187 @@
+import atexit
+import logging
+import os
+import threading
+import time
+
+from api.lazy import lazy_import
+from api.metrics import ERRORS, RETRIES, SIGN_IN_SECONDS
+from api.probe_pool import get_probe_concurrency
+from api.throttle import server_guards
+from api.tracing import tracer
+
+requests = lazy_import('requests')
+TSC = lazy_import('tableauserverclient')
+
+logger = logging.getLogger('TableauSessions')
+
+API_VERSION = '3.16'
+
+# Tableau sessions expire after 120 minutes by default on Tableau Cloud, so
+# sign in again a little before that rather than waiting for a 401.
+DEFAULT_SESSION_MAX_AGE = 110 * 60
+
+
+def format_filter_time(value):
+    return value.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _is_unauthorized(error):
+    code = str(getattr(error, 'code', '') or '')
+    return code.startswith('401')
+
+
+def _pooled_session_factory():
+    """Create a requests session whose connection pool fits the probe pool"""
+    pool_size = max(10, get_probe_concurrency())
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class TableauSession:
+    """A signed-in TSC.Server that re-authenticates itself when needed"""
+
+    def __init__(self, server_url, site_name, token_name, token, http_options=None, max_age=None):
+        self.server_url = server_url
+        self.site_name = site_name
+        self.token_name = token_name
+        self.token = token
+        self.http_options = http_options
+        self.max_age = max_age or DEFAULT_SESSION_MAX_AGE
+        self.server = None
+        self.signed_in_at = None
+        self.generation = 0
+        # Rate limit, concurrency limit and circuit breaker shared per server
+        self.guard = server_guards.get(server_url)
+        self._lock = threading.Lock()
+
+    def _sign_in(self):
+        tableau_auth = TSC.PersonalAccessTokenAuth(
+            token_name=self.token_name,
+            personal_access_token=self.token,
+            site_id=self.site_name
+        )
+
+        if self.server is None:
+            self.server = TSC.Server(
+                self.server_url,
+                use_server_version=False,
+                http_options=self.http_options,
+                session_factory=_pooled_session_factory
+            )
+            self.server.version = API_VERSION
+
+        start_time = time.perf_counter()
+        try:
+            with tracer.span('sign_in', site=self.site_name):
+                self.guard.call(lambda: self.server.auth.sign_in_with_personal_access_token(tableau_auth))
+        except Exception:
+            ERRORS.labels('sign_in').inc()
+            raise
+        SIGN_IN_SECONDS.observe(time.perf_counter() - start_time)
+        self.signed_in_at = time.monotonic()
+        self.generation += 1
+        logger.info(f"Signed in to {self.server_url} (site: {self.site_name})")
+
+    def _expired(self):
+        return self.signed_in_at is None or time.monotonic() - self.signed_in_at >= self.max_age
+
+    def ensure_signed_in(self, stale_generation=None):
+        """Sign in if there is no live token, the token is old, or it was rejected.
+
+        stale_generation is the token generation a caller saw fail with 401;
+        if another thread has already re-authenticated since then, the fresh
+        token is reused instead of signing in again.
+        """
+        with self._lock:
+            rejected = stale_generation is not None and stale_generation == self.generation
+            if rejected or self._expired() or not self.server.is_signed_in():
+                self._sign_in()
+            return self.server
+
+    def call(self, func, kind='rest'):
+        """Run func(server) through the server's guard, re-authenticating once on 401.
+
+        kind groups calls with similar latency (e.g. 'rest', 'render') for
+        the adaptive concurrency limit.
+        """
+        server = self.ensure_signed_in()
+        generation = self.generation
+        try:
+            return self.guard.call(lambda: func(server), kind)
+        except TSC.ServerResponseError as e:
+            if not _is_unauthorized(e):
+                raise
+            logger.info(f"Session for {self.site_name} was rejected, signing in again")
+            RETRIES.labels('reauth').inc()
+            server = self.ensure_signed_in(stale_generation=generation)
+            return self.guard.call(lambda: func(server), kind)
+
+    def list_views(self, updated_since=None):
+        """All views of the site, or only those updated at or after a datetime"""
+        options = None
+        if updated_since is not None:
+            options = TSC.RequestOptions()
+            options.filter.add(TSC.Filter(
+                TSC.RequestOptions.Field.UpdatedAt,
+                TSC.RequestOptions.Operator.GreaterThanOrEqual,
+                format_filter_time(updated_since)
+            ))
+        with tracer.span('list_views', site=self.site_name, incremental=options is not None) as span:
+            views = self.call(lambda server: list(TSC.Pager(server.views, options)))
+            span.set(views=len(views))
+        return views
+
+    def close(self):
+        with self._lock:
+            if self.server is not None and self.server.is_signed_in():
+                try:
+                    self.server.auth.sign_out()
+                except Exception as e:
+                    logger.warning(f"Sign-out failed for {self.site_name}: {str(e)}")
+            self.signed_in_at = None
+
+
+class SessionPool:
+    """Keeps one signed-in TableauSession per server/site/token between checks"""
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def get(self, server_url, site_name, token_name, token, http_options=None):
+        key = (server_url, site_name, token_name, token)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                max_age = int(os.getenv('TABLEAU_SESSION_MAX_AGE', DEFAULT_SESSION_MAX_AGE))
+                session = TableauSession(
+                    server_url, site_name, token_name, token,
+                    http_options=http_options,
+                    max_age=max_age
+                )
+                self._sessions[key] = session
+        session.ensure_signed_in()
+        return session
+
+    def discard(self, session):
+        """Drop a session, e.g. after a sign-in failure left it unusable"""
+        with self._lock:
+            for key, value in list(self._sessions.items()):
+                if value is session:
+                    del self._sessions[key]
+        session.close()
+
+    def close_all(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+
+session_pool = SessionPool()
+atexit.register(session_pool.close_all)
@@ -0,0 +1,226 @@
+import atexit
+import bisect
+import hashlib
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger('TableauSharding')
+
+DEFAULT_PARTITIONS = 64
+DEFAULT_LEASE_TTL = 60
+DEFAULT_VNODES = 64
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+
+def default_instance_id():
+    return os.getenv('INSTANCE_ID') or os.getenv('RENDER_INSTANCE_ID') or f"{socket.gethostname()}-{os.getpid()}"
+
+
+class ShardCoordinator:
+    """Splits the view set between cooperating instances.
+
+    Views hash into a fixed number of partitions, and partitions are placed
+    on a consistent hash ring of the live instances, so an instance joining
+    or leaving only moves the partitions next to it on the ring. Instances
+    heartbeat into a shared SQLite file and hold a lease on each partition
+    they probe; a partition changes hands only after its old owner released
+    it or its lease expired, so two instances never hold the same partition.
+    The last probe of every view is shared through the same file, so a
+    partition's new owner carries on with its probe schedule instead of
+    probing all of its views again at once. Sharding is off (every view is
+    local) unless a store path is configured.
+    """
+
+    def __init__(self, path=None, instance_id=None, partitions=None, lease_ttl=None, vnodes=DEFAULT_VNODES):
+        self.path = path if path is not None else os.getenv('SHARD_STORE')
+        self.instance_id = instance_id or default_instance_id()
+        self.partitions = partitions or int(os.getenv('SHARD_PARTITIONS', DEFAULT_PARTITIONS))
+        self.lease_ttl = lease_ttl or float(os.getenv('SHARD_LEASE_TTL', DEFAULT_LEASE_TTL))
+        self.vnodes = vnodes
+        self._owned = frozenset()
+        self._db = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopped = threading.Event()
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    @property
+    def owned(self):
+        """Partitions leased by the last heartbeat"""
+        return self._owned
+
+    def _connect(self):
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS instances (id TEXT PRIMARY KEY, heartbeat REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS leases ("
+                " partition INTEGER PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS probes ("
+                " view_id TEXT PRIMARY KEY, partition INTEGER NOT NULL, probed_at REAL NOT NULL,"
+                " load_time REAL, failed INTEGER NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS probes_partition ON probes (partition)")
+        return self._db
+
+    def partition_of(self, view_id):
+        return _hash(view_id) % self.partitions
+
+    def _assign(self, instances):
+        """Map every partition to an instance on the consistent hash ring"""
+        ring = sorted(
+            (_hash(f"{instance}#{i}"), instance) for instance in instances for i in range(self.vnodes)
+        )
+        points = [point for point, _ in ring]
+        assignment = {}
+        for partition in range(self.partitions):
+            index = bisect.bisect(points, _hash(f"partition-{partition}")) % len(ring)
+            assignment[partition] = ring[index][1]
+        return assignment
+
+    def heartbeat(self):
+        """Refresh this instance's liveness and leases; returns the owned partitions"""
+        if not self.enabled:
+            return frozenset(range(self.partitions))
+
+        now = time.time()
+        with self._lock:
+            db = self._connect()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.execute(
+                    "INSERT INTO instances (id, heartbeat) VALUES (?, ?)"
+                    " ON CONFLICT(id) DO UPDATE SET heartbeat = excluded.heartbeat",
+                    (self.instance_id, now)
+                )
+                db.execute("DELETE FROM instances WHERE heartbeat < ?", (now - self.lease_ttl,))
+                instances = [row[0] for row in db.execute("SELECT id FROM instances")]
+                wanted = {p for p, owner in self._assign(instances).items() if owner == self.instance_id}
+
+                leases = {
+                    partition: (owner, expires)
+                    for partition, owner, expires in db.execute("SELECT partition, owner, expires FROM leases")
+                }
+                owned = set()
+                for partition in range(self.partitions):
+                    owner, expires = leases.get(partition, (None, 0))
+                    mine = owner == self.instance_id
+                    if partition in wanted and (mine or owner is None or expires < now):
+                        db.execute(
+                            "INSERT OR REPLACE INTO leases (partition, owner, expires) VALUES (?, ?, ?)",
+                            (partition, self.instance_id, now + self.lease_ttl)
+                        )
+                        owned.add(partition)
+                    elif mine:
+                        # The ring moved this partition elsewhere: hand it over now
+                        db.execute("DELETE FROM leases WHERE partition = ?", (partition,))
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+
+        owned = frozenset(owned)
+        if owned != self._owned:
+            logger.info(
+                f"Instance {self.instance_id} now owns {len(owned)}/{self.partitions} partitions "
+                f"({len(instances)} live instances)"
+            )
+        self._owned = owned
+        return owned
+
+    def save_probes(self, probes):
+        """Share (view_id, probed_at, load_time, failed) of probes made by this instance"""
+        if not self.enabled:
+            return
+        rows = [
+            (view_id, self.partition_of(view_id), probed_at, load_time, int(failed))
+            for view_id, probed_at, load_time, failed in probes
+        ]
+        if not rows:
+            return
+        with self._lock:
+            db = self._connect()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.executemany(
+                    "INSERT INTO probes (view_id, partition, probed_at, load_time, failed) VALUES (?, ?, ?, ?, ?)"
+                    " ON CONFLICT(view_id) DO UPDATE SET partition = excluded.partition,"
+                    " probed_at = excluded.probed_at, load_time = excluded.load_time, failed = excluded.failed"
+                    " WHERE excluded.probed_at > probes.probed_at",
+                    rows
+                )
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+
+    def load_probes(self, partitions):
+        """Last shared probe of every view in `partitions`, as view_id -> (probed_at, load_time, failed)"""
+        partitions = list(partitions)
+        if not self.enabled or not partitions:
+            return {}
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT view_id, probed_at, load_time, failed FROM probes"
+                f" WHERE partition IN ({', '.join('?' * len(partitions))})",
+                partitions
+            ).fetchall()
+        return {view_id: (probed_at, load_time, bool(failed)) for view_id, probed_at, load_time, failed in rows}
+
+    def release(self):
+        """Give up all leases, e.g. on shutdown, so peers take over at once"""
+        self._stopped.set()
+        if not self.enabled or self._db is None:
+            return
+        with self._lock:
+            self._db.execute("DELETE FROM leases WHERE owner = ?", (self.instance_id,))
+            self._db.execute("DELETE FROM instances WHERE id = ?", (self.instance_id,))
+        self._owned = frozenset()
+
+    def _heartbeats(self):
+        while not self._stopped.wait(self.lease_ttl / 3):
+            try:
+                self.heartbeat()
+            except Exception as e:
+                logger.error(f"Shard heartbeat failed: {str(e)}")
+
+    def start(self):
+        """Keep leases alive in the background between checks"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped.clear()
+                self._thread = threading.Thread(target=self._heartbeats, name='shard-heartbeat', daemon=True)
+                self._thread.start()
+
+    def local_views(self, views, partitions=None):
+        """Filter views down to the partitions this instance owns"""
+        if not self.enabled:
+            return list(views)
+        if partitions is None:
+            partitions = self.heartbeat()
+            self.start()
+        return [view for view in views if self.partition_of(view.id) in partitions]
+
+
+shard_coordinator = ShardCoordinator()
+atexit.register(shard_coordinator.release)
@@ -0,0 +1,227 @@
+import json
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger('TableauSites')
+
+# Extra time a site worker gets on top of its probe budget before the
+# parent stops waiting for it (sign-in, listing and pickling results)
+SITE_TIMEOUT_MARGIN = 30
+
+
+class SiteConfig:
+    """One Tableau server/site/token to monitor, with its worker limits"""
+
+    __slots__ = ('name', 'server_url', 'site_name', 'token_name', 'token',
+                 'probe_concurrency', 'max_memory_mb', 'max_cpu_seconds')
+
+    def __init__(self, name, server_url, site_name, token_name, token,
+                 probe_concurrency=None, max_memory_mb=None, max_cpu_seconds=None):
+        self.name = name
+        self.server_url = server_url
+        self.site_name = site_name
+        self.token_name = token_name
+        self.token = token
+        self.probe_concurrency = probe_concurrency
+        self.max_memory_mb = max_memory_mb
+        self.max_cpu_seconds = max_cpu_seconds
+
+    @classmethod
+    def from_dict(cls, data):
+        # Tokens can be given inline or, preferably, by environment variable name
+        token = data.get('token') or os.getenv(data.get('token_env', ''), '')
+        site_name = data['site_name']
+        return cls(
+            name=data.get('name') or site_name,
+            server_url=data['server_url'].rstrip('/'),
+            site_name=site_name,
+            token_name=data['token_name'],
+            token=token,
+            probe_concurrency=data.get('probe_concurrency'),
+            max_memory_mb=data.get('max_memory_mb'),
+            max_cpu_seconds=data.get('max_cpu_seconds'),
+        )
+
+
+def load_sites(path):
+    """Read the list of sites to monitor from a JSON file.
+
+    The file holds either a list of site objects or {"sites": [...]}; each
+    site needs server_url, site_name, token_name and token or token_env.
+    """
+    with open(path) as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get('sites', [])
+    sites = [SiteConfig.from_dict(entry) for entry in data]
+    names = [site.name for site in sites]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate site names in {path}")
+    return sites
+
+
+class ViewRef:
+    """Picklable subset of a TSC ViewItem sent back from site workers"""
+
+    __slots__ = ('id', 'name', 'project_id', 'project_name', 'workbook_id', 'created_at')
+
+    def __init__(self, view):
+        self.id = view.id
+        self.name = view.name
+        self.project_id = view.project_id
+        self.project_name = getattr(view, 'project_name', None)
+        self.workbook_id = view.workbook_id
+        self.created_at = view.created_at
+
+
+def _limit_resources(max_memory_mb):
+    """Worker initializer: cap the address space of a site's process"""
+    if not max_memory_mb:
+        return
+    import resource
+    limit = int(max_memory_mb) * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _limit_cpu(max_cpu_seconds):
+    """Allow this check at most max_cpu_seconds of CPU on top of what the worker used so far"""
+    if not max_cpu_seconds:
+        return
+    import resource
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = int(usage.ru_utime + usage.ru_stime)
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = used + int(max_cpu_seconds)
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+# Per-process state of a site worker, kept between ticks
+_worker_scheduler = None
+
+
+def check_site(site, partitions=None):
+    """Run one check for a site inside its worker process.
+
+    Sessions, the view inventory and probe priorities live in the worker's
+    module globals, so they carry over between ticks just like in the
+    single-site app. With sharding enabled, only views in the parent
+    instance's `partitions` are checked.
+    """
+    global _worker_scheduler
+    from api.inventory import view_inventory
+    from api.probe_scheduler import ProbeScheduler
+    from api.probes import get_probe_mode, probe_view
+    from api.sessions import session_pool
+    from api.sharding import shard_coordinator
+    from api.throttle import CircuitOpenError
+
+    _limit_cpu(site.max_cpu_seconds)
+    if _worker_scheduler is None:
+        _worker_scheduler = ProbeScheduler()
+
+    session = session_pool.get(site.server_url, site.site_name, site.token_name, site.token)
+    all_views = shard_coordinator.local_views(view_inventory.get_views(session), partitions)
+    probe_mode = get_probe_mode('preview')
+    if shard_coordinator.enabled:
+        _worker_scheduler.seed(shard_coordinator.load_probes(partitions or shard_coordinator.owned))
+
+    probed = _worker_scheduler.run(
+        all_views,
+        lambda view: probe_view(session, view, probe_mode),
+        lambda result: (result.load_time, result.failed),
+        max_workers=site.probe_concurrency,
+        halt=lambda: session.guard.breaker.paused
+    )
+    if shard_coordinator.enabled:
+        shard_coordinator.save_probes(_worker_scheduler.export(probed))
+    if session.guard.breaker.is_open:
+        # Report the outage as the site's one error rather than per view
+        raise CircuitOpenError(f"Tableau server looks down\n{session.guard.describe_outage()}")
+
+    return [
+        (ViewRef(view), probed.get(view.id), _worker_scheduler.stats(view.id))
+        for view in all_views
+    ]
+
+
+class SitePool:
+    """One single-process executor per site, so sites run on separate cores.
+
+    Each site's worker has its own memory cap; a worker that crashes or hits
+    its limits only fails that site's report and is replaced on the next tick.
+    """
+
+    def __init__(self):
+        self._executors = {}
+        self._lock = threading.Lock()
+        self._context = multiprocessing.get_context('spawn')
+
+    def _executor(self, site):
+        with self._lock:
+            executor = self._executors.get(site.name)
+            if executor is None:
+                executor = ProcessPoolExecutor(
+                    max_workers=1,
+                    mp_context=self._context,
+                    initializer=_limit_resources,
+                    initargs=(site.max_memory_mb,)
+                )
+                self._executors[site.name] = executor
+            return executor
+
+    def _discard(self, site):
+        with self._lock:
+            executor = self._executors.pop(site.name, None)
+        if executor is not None:
+            # A hung worker would otherwise keep its core and memory forever
+            for process in list(getattr(executor, '_processes', {}).values()):
+                process.terminate()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def check(self, sites, timeout=None, partitions=None):
+        """Check every site concurrently; returns {site name: (views, error)}"""
+        if timeout is None:
+            timeout = float(os.getenv('PROBE_TIME_BUDGET', 90)) + SITE_TIMEOUT_MARGIN
+
+        futures = {}
+        for site in sites:
+            try:
+                futures[site.name] = (site, self._executor(site).submit(check_site, site, partitions))
+            except (BrokenProcessPool, RuntimeError):
+                self._discard(site)
+                futures[site.name] = (site, self._executor(site).submit(check_site, site, partitions))
+
+        wait([future for _, future in futures.values()], timeout=timeout)
+
+        results = {}
+        for name, (site, future) in futures.items():
+            if not future.done():
+                logger.error(f"Site {name} did not finish within {timeout:.0f}s")
+                self._discard(site)
+                results[name] = (None, f"Timed out after {timeout:.0f}s")
+                continue
+            try:
+                results[name] = (future.result(), None)
+            except BrokenProcessPool:
+                logger.error(f"Worker for site {name} died (resource limit or crash)")
+                self._discard(site)
+                results[name] = (None, "Site worker died (resource limit exceeded or crash)")
+            except Exception as e:
+                results[name] = (None, str(e))
+        return results
+
+    def shutdown(self):
+        with self._lock:
+            executors = list(self._executors.values())
+            self._executors.clear()
+        for executor in executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+site_pool = SitePool()
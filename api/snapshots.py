@@ -0,0 +1,181 @@
+import base64
+import hashlib
+import json
+import threading
+import time
+
+from api.records import json_default
+
+DEFAULT_SNAPSHOT_MAX_AGE = 60
+
+
+class Flight:
+    """One in-progress (or finished) call shared by every caller that joined it.
+
+    The running call can publish() items, e.g. results as they are produced,
+    and any number of readers can stream() them while it runs.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+        # Trace of the call when tracing is on, for work done after it
+        self.trace = None
+        self._claimed = set()
+        self._items = []
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    def claim(self, key):
+        """True for the first caller to claim key, e.g. to notify each URL once"""
+        with self._lock:
+            if key in self._claimed:
+                return False
+            self._claimed.add(key)
+            return True
+
+    def publish(self, item):
+        with self._changed:
+            self._items.append(item)
+            self._changed.notify_all()
+
+    def stream(self):
+        """Yield every published item, waiting for new ones until the call is done"""
+        index = 0
+        while True:
+            with self._changed:
+                while index >= len(self._items) and not self.done.is_set():
+                    self._changed.wait()
+                items = self._items[index:]
+                finished = self.done.is_set()
+            index += len(items)
+            yield from items
+            if finished and not items:
+                return
+
+    def add_done_callback(self, callback):
+        """Call callback(flight) when the call finishes (now, if it already has)"""
+        with self._lock:
+            if not self.done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def _finish(self, result, error):
+        with self._changed:
+            self.result = result
+            self.error = error
+            self.done.set()
+            self._changed.notify_all()
+            callbacks = self._callbacks
+            self._callbacks = []
+        for callback in callbacks:
+            callback(self)
+
+
+class Snapshot:
+    """A completed check result with the time it finished, its ETag and its flight"""
+
+    __slots__ = ('data', 'status_code', 'completed_at', 'etag', 'flight')
+
+    def __init__(self, data, status_code, completed_at, etag, flight=None):
+        self.data = data
+        self.status_code = status_code
+        self.completed_at = completed_at
+        self.etag = etag
+        self.flight = flight
+
+    @property
+    def age(self):
+        return time.monotonic() - self.completed_at
+
+
+def compute_etag(data):
+    """Hash of the JSON encoding of data, fed to the hash piece by piece"""
+    digest = hashlib.blake2b(digest_size=16)
+    encoder = json.JSONEncoder(sort_keys=True, separators=(',', ':'), default=json_default)
+    for chunk in encoder.iterencode(data):
+        digest.update(chunk.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def encode_cursor(etag, offset):
+    return base64.urlsafe_b64encode(f"{etag}:{offset}".encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (etag, offset) from a page cursor; raises ValueError if malformed"""
+    try:
+        text = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        etag, offset = text.rsplit(':', 1)
+        offset = int(offset)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if offset < 0:
+        raise ValueError("Invalid cursor")
+    return etag, offset
+
+
+class SingleFlight:
+    """Coalesces concurrent calls so only one runs at a time.
+
+    A caller arriving while a call is in flight waits for it and receives
+    the same result instead of starting another. The last successful result
+    is kept as a snapshot that callers can reuse while it is fresh enough.
+    """
+
+    def __init__(self):
+        self._flight = None
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def start(self, func):
+        """Start func(flight) on a background thread, or join the call in progress.
+
+        Returns (flight, shared) without waiting for the call to finish.
+        """
+        with self._lock:
+            if self._flight is not None:
+                self._flight.followers += 1
+                return self._flight, True
+            flight = self._flight = Flight()
+        threading.Thread(target=self._run, args=(flight, func), name='single-flight', daemon=True).start()
+        return flight, False
+
+    def _run(self, flight, func):
+        result = error = None
+        try:
+            result = func(flight)
+        except Exception as e:
+            error = e
+        finally:
+            with self._lock:
+                self._flight = None
+            flight._finish(result, error)
+
+    def do(self, func):
+        """Run func(flight) or join the run in progress; returns (result, flight, shared)"""
+        flight, shared = self.start(func)
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result, flight, shared
+
+    def in_flight(self):
+        return self._flight is not None
+
+    def store(self, data, status_code, flight=None):
+        """Keep a completed result, and the flight that produced it, as the latest snapshot"""
+        snapshot = Snapshot(data, status_code, time.monotonic(), compute_etag(data), flight)
+        self._snapshot = snapshot
+        return snapshot
+
+    def snapshot(self, max_age=None):
+        """The latest snapshot if it is at most max_age seconds old, else None"""
+        snapshot = self._snapshot
+        if snapshot is None or (max_age is not None and snapshot.age > max_age):
+            return None
+        return snapshot
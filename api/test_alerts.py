@@ -0,0 +1,52 @@
+from api.alerts import (
+    DEGRADED, FAILING, OBSERVED_ERROR, OBSERVED_OK, OBSERVED_SLOW, OK, RECOVERED, AlertTracker
+)
+
+
+def test_alert_fires_after_consecutive_bad_probes_only():
+    tracker = AlertTracker(trigger_samples=2, clear_samples=2)
+    assert tracker.observe('v1', 'Sales', OBSERVED_SLOW, now=1) is None
+    assert tracker.observe('v1', 'Sales', OBSERVED_OK, now=2) is None
+    assert tracker.observe('v1', 'Sales', OBSERVED_SLOW, now=3) is None
+    event = tracker.observe('v1', 'Sales', OBSERVED_SLOW, now=4)
+    assert (event.previous, event.state, event.since) == (OK, DEGRADED, 4)
+    assert tracker.observe('v1', 'Sales', OBSERVED_SLOW, now=5) is None
+
+
+def test_recovery_is_announced_once_then_returns_to_ok():
+    tracker = AlertTracker(trigger_samples=1, clear_samples=2)
+    assert tracker.observe('v1', 'Sales', OBSERVED_ERROR, now=1).state == FAILING
+    assert tracker.observe('v1', 'Sales', OBSERVED_OK, now=2) is None
+    event = tracker.observe('v1', 'Sales', OBSERVED_OK, now=3)
+    assert (event.previous, event.state) == (FAILING, RECOVERED)
+    assert tracker.observe('v1', 'Sales', OBSERVED_OK, now=4) is None
+    assert tracker.state('v1') == OK
+
+
+def test_reminders_while_an_alert_stays_open():
+    tracker = AlertTracker(trigger_samples=1, clear_samples=1, reminder_interval=60)
+    tracker.observe('v1', 'Sales', OBSERVED_ERROR, now=1000)
+    assert tracker.observe('v1', 'Sales', OBSERVED_ERROR, now=1030) is None
+    event = tracker.observe('v1', 'Sales', OBSERVED_ERROR, now=1060)
+    assert event.reminder and event.since == 1000
+    assert "still FAILING" in event.headline()
+
+
+def test_trigger_samples_can_be_overridden_per_observation():
+    tracker = AlertTracker(trigger_samples=3)
+    event = tracker.observe('server', 'https://tableau', OBSERVED_ERROR, now=1, trigger_samples=1)
+    assert event.state == FAILING
+
+
+def test_state_survives_a_restart_and_forget_drops_removed_views(tmp_path):
+    path = str(tmp_path / 'alerts.json')
+    tracker = AlertTracker(trigger_samples=1, state_path=path)
+    tracker.observe('v1', 'Sales', OBSERVED_ERROR, now=1)
+    tracker.observe('v2', 'Costs', OBSERVED_ERROR, now=1)
+    tracker.forget(['v1'])
+    tracker.save()
+
+    restored = AlertTracker(trigger_samples=1, state_path=path)
+    assert restored.state('v1') == FAILING
+    assert restored.state('v2') == OK
+    assert restored.observe('v1', 'Sales', OBSERVED_ERROR, now=2) is None
@@ -0,0 +1,63 @@
+import contextvars
+
+import pytest
+
+from api import async_client
+from api.async_client import EventLoopThread, get_async_concurrency, get_probe_client
+
+current_tick = contextvars.ContextVar('current_tick', default=None)
+
+
+@pytest.fixture(scope='module')
+def loop():
+    return EventLoopThread(name='test-async')
+
+
+def test_run_returns_the_coroutine_result(loop):
+    async def add(a, b):
+        return a + b
+
+    assert loop.run(add(1, 2)) == 3
+
+
+def test_run_carries_the_callers_context_over(loop):
+    async def read_tick():
+        return current_tick.get()
+
+    token = current_tick.set('tick-1')
+    try:
+        assert loop.run(read_tick()) == 'tick-1'
+    finally:
+        current_tick.reset(token)
+    assert loop.run(read_tick()) is None
+
+
+def test_run_raises_the_coroutines_exception(loop):
+    async def fail():
+        raise KeyError('view')
+
+    with pytest.raises(KeyError):
+        loop.run(fail())
+
+
+def test_probe_client_is_read_from_the_environment(monkeypatch):
+    monkeypatch.setattr(async_client, 'httpx', object())
+    monkeypatch.setenv('PROBE_CLIENT', ' Async')
+    assert get_probe_client() == 'async'
+    monkeypatch.setenv('PROBE_CLIENT', 'curl')
+    with pytest.raises(ValueError):
+        get_probe_client()
+
+
+def test_async_probe_client_needs_httpx(monkeypatch):
+    monkeypatch.setattr(async_client, 'httpx', None)
+    monkeypatch.setenv('PROBE_CLIENT', 'async')
+    with pytest.raises(RuntimeError, match='httpx'):
+        get_probe_client()
+    monkeypatch.setenv('PROBE_CLIENT', 'threads')
+    assert get_probe_client() == 'threads'
+
+
+def test_async_concurrency_is_at_least_one(monkeypatch):
+    monkeypatch.setenv('ASYNC_PROBE_CONCURRENCY', '0')
+    assert get_async_concurrency() == 1
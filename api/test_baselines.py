@@ -0,0 +1,38 @@
+import math
+
+from api.baselines import BaselineTracker
+
+
+def test_new_views_fall_back_to_the_threshold():
+    tracker = BaselineTracker(window=8, min_samples=4)
+    slow, p50, p95 = tracker.evaluate(['fast', 'slow'], [2.0, 12.0], 10)
+    assert list(slow) == [False, True]
+    assert math.isnan(p50[0]) and math.isnan(p95[1])
+
+
+def test_views_are_judged_against_their_own_baseline():
+    tracker = BaselineTracker(window=8, min_samples=4, p95_factor=1.5, p50_factor=2.0, min_delta=1.0)
+    for _ in range(4):
+        tracker.evaluate(['light', 'heavy'], [1.0, 20.0], 10)
+
+    # 20s is usual for the heavy view, 4s is not for the light one
+    slow, p50, _ = tracker.evaluate(['light', 'heavy'], [4.0, 20.0], 10)
+    assert list(slow) == [True, False]
+    assert list(p50) == [1.0, 20.0]
+
+
+def test_small_absolute_changes_are_not_slow():
+    tracker = BaselineTracker(window=8, min_samples=4, min_delta=1.0)
+    for _ in range(4):
+        tracker.evaluate(['v1'], [0.1], 10)
+    slow, _, _ = tracker.evaluate(['v1'], [0.5], 10)
+    assert not slow[0]
+
+
+def test_window_keeps_only_recent_samples():
+    tracker = BaselineTracker(window=4, min_samples=1)
+    tracker.evaluate(['v1'] * 1, [100.0], 10)
+    for _ in range(4):
+        tracker.evaluate(['v1'], [1.0], 10)
+    p50, p95, counts = tracker.baselines(['v1'])
+    assert (p50[0], p95[0], counts[0]) == (1.0, 1.0, 4)
@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from api.cron import CronScheduler, CronSchedule
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def test_next_after_steps_to_the_next_matching_minute():
+    schedule = CronSchedule('*/15 * * * *')
+    assert schedule.next_after(utc(2026, 10, 17, 10, 7, 30)) == utc(2026, 10, 17, 10, 15)
+    assert schedule.next_after(utc(2026, 10, 17, 10, 15)) == utc(2026, 10, 17, 10, 30)
+    assert schedule.next_after(utc(2026, 12, 31, 23, 50)) == utc(2027, 1, 1, 0, 0)
+
+
+def test_names_ranges_and_lists():
+    # 17 October 2026 is a Saturday
+    schedule = CronSchedule('0 9,17 * * mon-fri')
+    assert schedule.upcoming(3, after=utc(2026, 10, 17, 12)) == [
+        utc(2026, 10, 19, 9), utc(2026, 10, 19, 17), utc(2026, 10, 20, 9)
+    ]
+    assert CronSchedule('0 0 1 jan,jul *').next_after(utc(2026, 2, 1)) == utc(2026, 7, 1)
+
+
+def test_restricted_day_and_weekday_match_either():
+    schedule = CronSchedule('0 0 13 * fri')
+    assert schedule.next_after(utc(2026, 10, 12)) == utc(2026, 10, 13)
+    assert schedule.next_after(utc(2026, 10, 13)) == utc(2026, 10, 16)
+
+
+@pytest.mark.parametrize('expression', ['* * * *', '60 * * * *', '*/0 * * * *', '0 0 * * funday', '0 0 30 feb *'])
+def test_invalid_or_impossible_expressions_are_rejected(expression):
+    with pytest.raises(ValueError):
+        CronSchedule(expression).next_after(utc(2026, 1, 1))
+
+
+def test_plan_collapses_missed_slots_into_one_catch_up_run():
+    scheduler = CronScheduler(lambda: None, '*/2 * * * *', jitter=0)
+    now = utc(2026, 10, 17, 10, 11, 30)
+    assert scheduler._plan(now) == (utc(2026, 10, 17, 10, 12), 0)
+
+    scheduler.last_run = now - timedelta(minutes=10)
+    assert scheduler._plan(now) == (now, 5)
+
+    scheduler.last_run = utc(2026, 10, 17, 10, 10, 5)
+    assert scheduler._plan(now) == (utc(2026, 10, 17, 10, 12), 0)
+
+
+def test_failed_runs_are_recorded_and_last_run_survives_a_restart(tmp_path):
+    path = str(tmp_path / 'scheduler.json')
+
+    def job():
+        raise RuntimeError("Tableau unreachable")
+
+    scheduler = CronScheduler(job, '*/2 * * * *', jitter=0, state_path=path)
+    scheduler.run_now()
+    assert scheduler.last_error == "Tableau unreachable"
+    assert not scheduler.running
+
+    restored = CronScheduler(job, '*/2 * * * *', jitter=0, state_path=path)
+    assert restored.last_run.timestamp() == pytest.approx(scheduler.last_run.timestamp())
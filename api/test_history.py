@@ -0,0 +1,114 @@
+from types import SimpleNamespace
+
+import pytest
+
+from api.history import HistoryStore, parse_duration, parse_timestamp
+from api.probes import ProbeResult, StageTiming
+
+
+def test_parse_timestamp_accepts_epoch_and_iso():
+    assert parse_timestamp('1700000000') == 1700000000
+    assert parse_timestamp('2023-11-14T22:13:20Z') == 1700000000
+    assert parse_timestamp('2023-11-14T22:13:20') == 1700000000
+    assert parse_timestamp('2023-11-15T00:13:20+02:00') == 1700000000
+
+
+@pytest.mark.parametrize('text', ['nan', 'NaN', 'inf', '-inf', 'infinity', 'yesterday', ''])
+def test_parse_timestamp_rejects_invalid_times(text):
+    with pytest.raises(ValueError):
+        parse_timestamp(text)
+
+
+def test_parse_duration():
+    assert parse_duration('90s') == 90
+    assert parse_duration(' 5m ') == 300
+    assert parse_duration('2w') == 14 * 86400
+    for text in ('0h', '5', '1y', '-1h'):
+        with pytest.raises(ValueError):
+            parse_duration(text)
+
+
+def probe_result(started_at, total=0.5, error=None):
+    result = ProbeResult('v1', 'image', started_at=started_at)
+    result.stages.append(StageTiming('image', 0.1, total, 100))
+    result.error = error
+    return result
+
+
+def test_samples_are_stamped_with_the_probe_start(tmp_path):
+    store = HistoryStore(root=str(tmp_path))
+    view = SimpleNamespace(id='v1', name='Sales')
+    store.record(view, probe_result(1_700_000_000))
+    store.flush()
+    samples = store.samples('v1')
+    assert [sample.timestamp for sample in samples] == [1_700_000_000]
+    assert [bucket.start for bucket in store.rollups('v1', '1m')] == [1_699_999_980]
+
+
+def test_late_samples_land_in_their_own_bucket(tmp_path):
+    store = HistoryStore(root=str(tmp_path))
+    view = SimpleNamespace(id='v1', name='Sales')
+    store.record(view, probe_result(1_700_000_100))
+    store.record(view, probe_result(1_700_000_000, total=1.5))
+    store.record(view, probe_result(1_700_000_200))
+    store.flush()
+    store.record(view, probe_result(1_700_000_010, error="timeout"))
+    store.flush()
+    buckets = store.rollups('v1', '1m')
+    assert [(bucket.start, bucket.count, bucket.errors) for bucket in buckets] == [
+        (1_699_999_980, 2, 1), (1_700_000_100, 1, 0), (1_700_000_160, 1, 0)
+    ]
+
+
+def test_rollups_and_series_summarise_samples(tmp_path):
+    store = HistoryStore(root=str(tmp_path))
+    view = SimpleNamespace(id='v1', name='Sales')
+    start = 1_700_000_040  # on a minute boundary
+    for offset, total in ((0, 1.0), (20, 3.0), (70, 2.0), (3600, 4.0)):
+        store.record(view, probe_result(start + offset, total=total))
+    store.record(view, probe_result(start + 30, error="timeout"))
+    store.flush()
+
+    minutes = store.rollups('v1', '1m')
+    assert [(bucket.start, bucket.count, bucket.errors) for bucket in minutes] == [
+        (start, 3, 1), (start + 60, 1, 0), (start + 3600, 1, 0)
+    ]
+    assert minutes[0].to_dict()["mean"] == 2.0
+    assert minutes[0].to_dict()["max"] == 3.0
+
+    hours = store.series('v1', start, start + 7200, 3600)
+    assert [(bucket.start, bucket.count) for bucket in hours] == [(1_699_999_200, 4), (1_700_002_800, 1)]
+    assert store.series('v1', start + 7200, start + 9000, 60) == []
+
+
+def test_compaction_drops_records_past_each_levels_retention(tmp_path):
+    store = HistoryStore(root=str(tmp_path), retention={'raw': 3600, '1m': 7200})
+    view = SimpleNamespace(id='v1', name='Sales')
+    now = 1_700_100_000
+    for age in (10000, 5000, 100):
+        store.record(view, probe_result(now - age))
+    store.flush()
+
+    store.compact(now=now)
+    assert [sample.timestamp for sample in store.samples('v1')] == [now - 100]
+    assert [bucket.count for bucket in store.rollups('v1', '1m')] == [1, 1]
+    assert sum(bucket.count for bucket in store.rollups('v1', '1d')) == 3
+
+    store.compact(now=now + 86400)
+    assert store.samples('v1') == []
+    assert store.rollups('v1', '1m') == []
+
+
+def test_late_records_are_kept_in_time_order_for_compaction(tmp_path):
+    store = HistoryStore(root=str(tmp_path), retention={'raw': 3600, '1m': 3600})
+    view = SimpleNamespace(id='v1', name='Sales')
+    now = 1_700_100_000
+    store.record(view, probe_result(now - 100))
+    store.flush()
+    store.record(view, probe_result(now - 5000))
+    store.flush()
+
+    assert [sample.timestamp for sample in store.samples('v1')] == [now - 5000, now - 100]
+    store.compact(now=now)
+    assert [sample.timestamp for sample in store.samples('v1')] == [now - 100]
+    assert [bucket.count for bucket in store.rollups('v1', '1m')] == [1]
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+
+from api.inventory import INCREMENTAL_OVERLAP, ViewInventory
+
+BASE = datetime(2024, 1, 1, 12, 0, 0)
+
+
+class View:
+    def __init__(self, view_id, updated_at):
+        self.id = view_id
+        self.updated_at = updated_at
+
+
+class FakeSession:
+    """Lists its views like Tableau does for an updatedAt:gte filter"""
+
+    server_url = 'https://tableau'
+    site_name = 'site'
+
+    def __init__(self, *views):
+        self.views = {view.id: view for view in views}
+        self.calls = []
+
+    def list_views(self, updated_since=None):
+        self.calls.append(updated_since)
+        return [
+            View(view.id, view.updated_at) for view in self.views.values()
+            if updated_since is None or view.updated_at >= updated_since
+        ]
+
+
+def ids(views):
+    return sorted(view.id for view in views)
+
+
+def test_cached_views_are_reused_within_ttl():
+    session = FakeSession(View('a', BASE))
+    inventory = ViewInventory(ttl=300, full_resync_interval=3600)
+    inventory.get_views(session)
+    inventory.get_views(session)
+    assert session.calls == [None]
+
+
+def test_incremental_sync_merges_changes_by_id():
+    session = FakeSession(View('a', BASE), View('b', BASE))
+    inventory = ViewInventory(ttl=0, full_resync_interval=3600)
+    inventory.get_views(session)
+
+    # Added within the same second as the newest view already seen
+    session.views['d'] = View('d', BASE)
+    session.views['c'] = View('c', BASE + timedelta(seconds=1))
+    views = inventory.get_views(session)
+
+    assert session.calls == [None, BASE - INCREMENTAL_OVERLAP]
+    assert ids(views) == ['a', 'b', 'c', 'd']
+
+    inventory.get_views(session)
+    assert session.calls[-1] == BASE + timedelta(seconds=1) - INCREMENTAL_OVERLAP
+
+
+def test_deleted_views_drop_out_on_full_resync():
+    session = FakeSession(View('a', BASE), View('b', BASE))
+    inventory = ViewInventory(ttl=0, full_resync_interval=3600)
+    inventory.get_views(session)
+
+    del session.views['b']
+    assert ids(inventory.get_views(session)) == ['a', 'b']
+
+    inventory.full_resync_interval = 0
+    assert ids(inventory.get_views(session)) == ['a']
+    assert session.calls[-1] is None
+
+
+def test_invalidate_forces_a_full_sync():
+    session = FakeSession(View('a', BASE))
+    inventory = ViewInventory(ttl=300, full_resync_interval=3600)
+    inventory.get_views(session)
+    inventory.invalidate(session)
+    inventory.get_views(session)
+    assert session.calls == [None, None]
@@ -0,0 +1,74 @@
+import threading
+
+import pytest
+
+from api.jobs import JobQueue, QueueFull
+
+
+def wait_for(queue, job_id, status):
+    for _ in range(500):
+        if queue.get(job_id)["status"] == status:
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError(f"job {job_id} never became {status}")
+
+
+@pytest.fixture
+def busy_queue():
+    """A queue whose only worker is held by a running job until released"""
+    jobs = JobQueue(workers=1, max_queued=2)
+    release = threading.Event()
+    blocker = jobs.submit(release.wait)
+    wait_for(jobs, blocker["id"], "running")
+    yield jobs, release
+    release.set()
+
+
+def test_job_runs_and_keeps_its_result():
+    jobs = JobQueue()
+    job = jobs.submit(lambda a, b: a + b, 1, 2, name="add")
+    wait_for(jobs, job["id"], "finished")
+    assert jobs.get(job["id"])["result"] == 3
+    assert jobs.get(job["id"])["name"] == "add"
+
+
+def test_failed_job_records_the_error():
+    jobs = JobQueue()
+    job = jobs.submit(lambda: 1 / 0)
+    wait_for(jobs, job["id"], "failed")
+    assert "division by zero" in jobs.get(job["id"])["error"]
+
+
+def test_waiting_job_with_same_key_is_merged(busy_queue):
+    jobs, release = busy_queue
+    runs = []
+    first = jobs.submit(runs.append, 'a', key='tick')
+    second = jobs.submit(runs.append, 'b', key='tick')
+    assert second["id"] == first["id"]
+    assert jobs.depth() == 1
+
+    release.set()
+    wait_for(jobs, first["id"], "finished")
+    assert runs == ['a']
+
+    # Once it has started, the next job with the key is queued again
+    third = jobs.submit(runs.append, 'c', key='tick')
+    assert third["id"] != first["id"]
+    wait_for(jobs, third["id"], "finished")
+    assert runs == ['a', 'c']
+
+
+def test_queue_is_bounded(busy_queue):
+    jobs, _ = busy_queue
+    jobs.submit(len, 'a')
+    jobs.submit(len, 'b')
+    with pytest.raises(QueueFull):
+        jobs.submit(len, 'c')
+
+
+def test_only_recent_jobs_are_kept():
+    jobs = JobQueue(max_jobs=2)
+    ids = [jobs.submit(len, 'x')["id"] for _ in range(3)]
+    wait_for(jobs, ids[-1], "finished")
+    assert jobs.get(ids[0]) is None
+    assert jobs.get(ids[2]) is not None
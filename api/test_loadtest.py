@@ -0,0 +1,94 @@
+from types import SimpleNamespace
+
+import pytest
+
+from api import loadtest
+from api.loadtest import (
+    HARD_MAX_DURATION, LevelResult, LoadTestBusy, LoadTester, LoadTestPlan, _run_level,
+    find_saturation, load_test_limits, ramp_levels
+)
+
+
+def level(concurrency, latencies, errors=0, elapsed=1.0):
+    result = LevelResult(concurrency)
+    for latency in latencies:
+        result.record(latency)
+    for _ in range(errors):
+        result.record(0.0, "boom")
+    result.elapsed = elapsed
+    return result
+
+
+def test_ramp_levels_are_geometric_and_distinct():
+    assert ramp_levels(10, 6) == [1, 2, 3, 4, 6, 10]
+    assert ramp_levels(1, 6) == [1]
+    assert ramp_levels(8, 1) == [8]
+
+
+def test_plan_rejects_whole_sites_and_oversized_ramps(monkeypatch):
+    monkeypatch.setenv('LOADTEST_MAX_REQUESTS', '100')
+    with pytest.raises(ValueError):
+        LoadTestPlan('*')
+    with pytest.raises(ValueError):
+        LoadTestPlan('Sales', max_concurrency=50, steps=6, requests_per_client=10)
+    assert LoadTestPlan('Sales', max_concurrency=4, steps=3).total_requests == (1 + 2 + 4) * 3
+
+
+def test_max_duration_is_capped(monkeypatch):
+    monkeypatch.setenv('LOADTEST_MAX_DURATION', '1e9')
+    assert load_test_limits()[2] == HARD_MAX_DURATION
+    monkeypatch.setenv('LOADTEST_MAX_DURATION', '-5')
+    assert load_test_limits()[2] == 1
+
+
+def test_saturation_at_latency_errors_or_flat_throughput():
+    assert find_saturation([level(1, [1.0] * 4), level(2, [1.1] * 8, elapsed=1.0), level(4, [3.0] * 8)]) == (
+        2, "p95 3.00s at 4 clients, over 2x the 1.00s at the lowest level"
+    )
+    assert find_saturation([level(1, [1.0] * 4), level(2, [1.0] * 9, errors=1)])[0] == 1
+    assert find_saturation([level(1, [1.0] * 4), level(2, [1.0] * 4)])[0] == 1
+    assert find_saturation([level(1, [1.0] * 4), level(2, [1.0] * 8)]) == (2, None)
+
+
+def test_reservation_lapses_when_the_run_never_starts(monkeypatch):
+    clock = SimpleNamespace(now=100.0)
+    monkeypatch.setattr(loadtest, 'time', SimpleNamespace(monotonic=lambda: clock.now))
+    tester = LoadTester(reservation_timeout=60)
+    assert tester.reserve()
+    assert not tester.reserve()
+    with pytest.raises(LoadTestBusy):
+        tester.run(lambda: None, None)
+    clock.now += 60
+    assert not tester.busy
+    assert tester.reserve()
+
+
+def test_run_frees_the_tester_when_it_fails():
+    tester = LoadTester()
+    assert tester.reserve()
+
+    def broken_session():
+        raise OSError("sign-in failed")
+
+    with pytest.raises(OSError):
+        tester.run(broken_session, None, reserved=True)
+    assert not tester.busy
+
+
+def test_clients_that_cannot_start_are_level_errors(monkeypatch):
+    sessions = []
+
+    def session():
+        if not sessions:
+            sessions.append(None)
+            raise OSError("no sockets left")
+        return SimpleNamespace(close=lambda: None)
+
+    monkeypatch.setattr(loadtest, 'requests', SimpleNamespace(Session=session))
+    monkeypatch.setattr(loadtest, '_stream_stage', lambda *args, **kwargs: pytest.fail("should not render"))
+    result = _run_level(None, 'url', 'image', 3, 2, deadline=float('inf'))
+    assert (result.requests, result.errors) == (3, 3)
+    assert set(result.error_messages) == {
+        "Client could not start: no sockets left",
+        "Client could not start: not every client reached the start line",
+    }
@@ -0,0 +1,97 @@
+import os
+
+from api.logs import LogAggregator, LogAnalyzer, LogMatcher, LogTailer
+
+
+def tailer(tmp_path, **kwargs):
+    return LogTailer(str(tmp_path / 'logs'), pattern='*.log', cursor_path=str(tmp_path / 'cursor.json'), **kwargs)
+
+
+def write(path, text, mode='a'):
+    with open(path, mode) as f:
+        f.write(text)
+
+
+def read_all(tail):
+    return b''.join(data for _, data in tail.chunks())
+
+
+def test_partial_trailing_line_waits_for_its_newline(tmp_path):
+    os.makedirs(tmp_path / 'logs')
+    log = tmp_path / 'logs' / 'vizql.log'
+    write(log, "request failed\npartial err")
+    tail = tailer(tmp_path)
+    assert read_all(tail) == b"request failed\n"
+    tail.save()
+
+    write(log, "or\n")
+    assert read_all(tailer(tmp_path)) == b"partial error\n"
+
+
+def test_rotated_files_are_read_from_the_start(tmp_path):
+    os.makedirs(tmp_path / 'logs')
+    log = tmp_path / 'logs' / 'vizql.log'
+    write(log, "first line\nsecond line\n")
+    tail = tailer(tmp_path)
+    read_all(tail)
+
+    # Truncated in place
+    write(log, "new\n", mode='w')
+    assert read_all(tail) == b"new\n"
+
+    # Replaced by a new file (new inode) that is larger than the old offset
+    rotated = tmp_path / 'logs' / 'vizql.log.new'
+    write(rotated, "rotated one\nrotated two\n")
+    os.replace(rotated, log)
+    assert read_all(tail) == b"rotated one\nrotated two\n"
+
+
+def test_read_budget_leaves_the_rest_for_the_next_run(tmp_path):
+    os.makedirs(tmp_path / 'logs')
+    write(tmp_path / 'logs' / 'vizql.log', "line1\nline2\nline3\nline4\n")
+    tail = tailer(tmp_path, max_bytes_per_run=12)
+    assert read_all(tail) == b"line1\nline2\n"
+    tail.save()
+    assert read_all(tailer(tmp_path, max_bytes_per_run=12)) == b"line3\nline4\n"
+
+
+def test_only_lines_with_a_keyword_reach_the_regexes():
+    matcher = LogMatcher()
+    checked = []
+    match = matcher.match
+    matcher.match = lambda line: checked.append(line) or match(line)
+
+    chunk = b"all good\nrequest timed out after 30s\n3 errors reported\nrender error in view\n"
+    found = [(line, rule) for line, rule, _ in matcher.scan(chunk)]
+    assert found == [(b"request timed out after 30s\n", "timeout"), (b"render error in view\n", "error")]
+    # "errors" contains a keyword but is not a whole word; "all good" is never checked
+    assert checked == [b"request timed out after 30s\n", b"3 errors reported\n", b"render error in view\n"]
+
+
+def test_space_saving_evicts_the_least_frequent_signature():
+    aggregator = LogAggregator(max_signatures=2, recent_samples=2)
+    for line in [b"disk error\n"] * 3 + [b"auth failed\n", b"backgrounder failed\n"]:
+        aggregator.add(line, "error", "error")
+    assert [(entry["signature"], entry["count"]) for entry in aggregator.top()] == [
+        ("disk error", 3), ("backgrounder failed", 2)
+    ]
+    assert [sample["line"] for sample in aggregator.recent_samples()] == ["backgrounder failed", "auth failed"]
+
+
+def test_counts_add_up_across_runs(tmp_path):
+    os.makedirs(tmp_path / 'logs')
+    log = tmp_path / 'logs' / 'vizql.log'
+    state_path = str(tmp_path / 'aggregate.json')
+
+    def run():
+        analyzer = LogAnalyzer(tailer(tmp_path), aggregator=LogAggregator(state_path=state_path))
+        return analyzer.run(), analyzer.aggregator
+
+    write(log, "disk error\nok\n")
+    assert run()[0] == 1
+    write(log, "disk error\n")
+    matches, aggregator = run()
+    assert matches == 1
+    assert aggregator.top()[0]["count"] == 2
+    assert aggregator.severity_counts["error"] == 2
+    assert aggregator.lines_read == 3
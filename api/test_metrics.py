@@ -0,0 +1,52 @@
+from api import monitor
+from api.metrics import CONTENT_TYPE, MetricsRegistry
+
+
+def test_counters_and_gauges_render_with_labels():
+    registry = MetricsRegistry()
+    errors = registry.counter('errors_total', 'Errors by source', ('source',))
+    depth = registry.gauge('queue_depth', 'Items queued')
+    errors.labels('probe').inc()
+    errors.labels('say "hi"\n').inc(2)
+    depth.set_function(lambda: 7)
+
+    assert registry.render() == (
+        '# HELP errors_total Errors by source\n'
+        '# TYPE errors_total counter\n'
+        'errors_total{source="probe"} 1.0\n'
+        'errors_total{source="say \\"hi\\"\\n"} 2.0\n'
+        '# HELP queue_depth Items queued\n'
+        '# TYPE queue_depth gauge\n'
+        'queue_depth 7.0\n'
+    )
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    seconds = registry.histogram('probe_seconds', 'Probe time', ('mode',), buckets=(1, 0.5))
+    for value in (0.2, 0.5, 0.7, 3):
+        seconds.labels('pdf').observe(value)
+
+    assert registry.render().splitlines()[2:] == [
+        'probe_seconds_bucket{mode="pdf",le="0.5"} 2.0',
+        'probe_seconds_bucket{mode="pdf",le="1.0"} 3.0',
+        'probe_seconds_bucket{mode="pdf",le="+Inf"} 4.0',
+        'probe_seconds_count{mode="pdf"} 4.0',
+        'probe_seconds_sum{mode="pdf"} 4.4',
+    ]
+
+
+def test_registering_a_name_again_returns_the_same_metric():
+    registry = MetricsRegistry()
+    assert registry.counter('checks_total', 'Checks') is registry.counter('checks_total', 'Checks')
+
+
+def test_metrics_endpoint_serves_the_text_format(monkeypatch):
+    monkeypatch.setenv('SCHEDULER_ENABLED', 'false')
+    monkeypatch.setenv('WARMUP_ENABLED', 'false')
+    response = monitor.app.test_client().get('/metrics')
+    assert response.status_code == 200
+    assert response.headers['Content-Type'] == CONTENT_TYPE
+    body = response.get_data(as_text=True)
+    assert '# TYPE tableau_probe_duration_seconds histogram' in body
+    assert body.endswith('\n')
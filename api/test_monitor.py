@@ -0,0 +1,128 @@
+import pytest
+
+from api import monitor
+from api.snapshots import SingleFlight
+
+
+@pytest.fixture
+def checks(monkeypatch):
+    """Replace the Tableau check with a counter and record queued webhooks"""
+    calls = []
+    posted = []
+
+    def fake_check(flight):
+        calls.append(flight)
+        return {"success": True, "views": []}, 200, {"message": f"check {len(calls)}"}
+
+    monkeypatch.setattr(monitor, 'monitor_flight', SingleFlight())
+    monkeypatch.setattr(monitor, '_monitor_check', fake_check)
+    monkeypatch.setattr(monitor.webhook_outbox, 'enqueue',
+                        lambda url, payload, trace=None: posted.append((url, payload["message"])))
+    monkeypatch.delenv('TICK_REUSE_AGE', raising=False)
+    return calls, posted
+
+
+def test_tick_after_scheduled_run_reuses_its_check(checks):
+    calls, posted = checks
+    monitor.run_scheduled_check()
+    monitor.run_monitor_job(monitor.WEBHOOK_URL)
+    assert len(calls) == 1
+    assert posted == [(monitor.WEBHOOK_URL, "check 1")]
+
+
+def test_scheduled_run_after_tick_reuses_its_check(checks):
+    calls, posted = checks
+    monitor.run_monitor_job(monitor.WEBHOOK_URL)
+    monitor.run_scheduled_check()
+    assert len(calls) == 1
+    assert len(posted) == 1
+
+
+def test_reused_check_is_posted_to_a_new_return_url(checks):
+    calls, posted = checks
+    monitor.run_scheduled_check()
+    monitor.run_monitor_job('https://example.com/hook')
+    assert len(calls) == 1
+    assert posted == [(monitor.WEBHOOK_URL, "check 1"), ('https://example.com/hook', "check 1")]
+
+
+def test_stale_check_is_not_reused(checks, monkeypatch):
+    calls, posted = checks
+    monkeypatch.setenv('TICK_REUSE_AGE', '0')
+    monitor.run_scheduled_check()
+    monitor.run_monitor_job(monitor.WEBHOOK_URL)
+    assert len(calls) == 2
+    assert [message for _, message in posted] == ["check 1", "check 2"]
+
+
+def test_reuse_age_is_half_the_schedule_interval(monkeypatch):
+    monkeypatch.delenv('TICK_REUSE_AGE', raising=False)
+    assert monitor.tick_reuse_age() == 60
+
+
+@pytest.mark.parametrize('value', ['nan', 'inf', '-inf'])
+def test_history_rejects_non_finite_times(monkeypatch, value):
+    monkeypatch.setenv('SCHEDULER_ENABLED', 'false')
+    monkeypatch.setenv('WARMUP_ENABLED', 'false')
+    client = monitor.app.test_client()
+    for parameter in ('start', 'end'):
+        response = client.get(f'/api/history?view=x&{parameter}={value}')
+        assert response.status_code == 400
+        assert "Invalid time" in response.get_json()["error"]
+
+
+def test_api_check_alerts_once_per_state_change(monkeypatch):
+    from types import SimpleNamespace
+
+    from api.alerts import AlertTracker
+    from api.baselines import BaselineTracker
+    from api.probes import ProbeResult, StageTiming
+
+    monkeypatch.setattr(monitor, 'alert_tracker', AlertTracker(trigger_samples=2, clear_samples=2))
+    monkeypatch.setattr(monitor, 'baseline_tracker', BaselineTracker())
+    view = SimpleNamespace(id='v1', name='Sales')
+
+    def rows(error=None, load_time=1.0):
+        result = ProbeResult('v1', 'preview')
+        result.stages.append(StageTiming('preview', 0.1, load_time, 10))
+        result.error = error
+        return [(view, result, None)]
+
+    assert monitor.track_alerts(rows(error="timeout")) == []
+    events = monitor.track_alerts(rows(error="timeout"))
+    assert [event.state for event in events] == ["FAILING"]
+    assert "Dashboard 'Sales' changed from OK to FAILING: Error: timeout" in monitor.alerts_section(events)
+    assert monitor.track_alerts(rows(error="timeout")) == []
+    assert monitor.track_alerts(rows(load_time=60.0)) == []
+    assert [event.state for event in monitor.track_alerts(rows(load_time=60.0))] == ["DEGRADED"]
+    assert monitor.track_alerts([(view, None, None)]) == []
+
+
+def test_history_query_finds_a_late_sample(monkeypatch, tmp_path):
+    from types import SimpleNamespace
+
+    from api.history import HistoryStore
+    from api.probes import ProbeResult, StageTiming
+
+    monkeypatch.setenv('SCHEDULER_ENABLED', 'false')
+    monkeypatch.setenv('WARMUP_ENABLED', 'false')
+    store = HistoryStore(root=str(tmp_path))
+    monkeypatch.setattr(monitor, 'history_store', store)
+    view = SimpleNamespace(id='v1', name='Sales')
+
+    def record(started_at):
+        result = ProbeResult('v1', 'preview', started_at=started_at)
+        result.stages.append(StageTiming('preview', 0.1, 1.0, 10))
+        store.record(view, result)
+        store.flush()
+
+    start = 1_700_000_040
+    for minute in range(10):
+        record(start + 60 * minute)
+    # A queued check stamped with its earlier probe start, written after newer buckets
+    record(start + 30)
+
+    client = monitor.app.test_client()
+    response = client.get(f'/api/history?view=v1&start={start}&end={start + 60}&resolution=1m')
+    assert [bucket["count"] for bucket in response.get_json()["views"][0]["buckets"]] == [2]
+    assert [sample.timestamp for sample in store.samples('v1', start, start + 60)] == [start, start + 30]
@@ -0,0 +1,155 @@
+import json
+
+import pytest
+
+from api import outbox
+from api.outbox import BACKOFF_MAX, WebhookOutbox, merge_payloads, retry_delay
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.text = ''
+
+
+class FakeHTTP:
+    """Answers webhook POSTs with the given status codes in turn"""
+
+    def __init__(self, *status_codes):
+        self.status_codes = list(status_codes)
+        self.posts = []
+
+    def post(self, url, json=None, headers=None, timeout=None):
+        self.posts.append((url, json))
+        return FakeResponse(self.status_codes.pop(0) if self.status_codes else 202)
+
+
+@pytest.fixture
+def make_outbox(tmp_path, monkeypatch):
+    def make(*status_codes, **options):
+        box = WebhookOutbox(path=str(tmp_path / 'outbox.sqlite3'), timeout=5, **options)
+        http = FakeHTTP(*status_codes)
+        monkeypatch.setattr(box, '_http', lambda: http)
+        # Deliveries are driven by the test instead of the sender thread
+        monkeypatch.setattr(box, '_ensure_sender', lambda: None)
+        return box, http
+    return make
+
+
+def rows(box):
+    return box._execute("SELECT id, attempts, dead, next_attempt, claimed_until FROM events ORDER BY id")
+
+
+def test_retry_delay_doubles_up_to_the_cap():
+    for attempts, expected in ((1, 2), (2, 4), (3, 8), (5, 32)):
+        assert expected * 0.8 <= retry_delay(attempts) <= expected * 1.2
+    assert retry_delay(20) <= BACKOFF_MAX * 1.2
+
+
+def test_merge_payloads_keeps_the_most_severe_status():
+    merged = merge_payloads([
+        {"message": "a", "status": "success"},
+        {"message": "b", "status": "error"},
+    ])
+    assert merged["status"] == "error"
+    assert merged["message"] == "a\n\n---\n\nb"
+
+
+def test_delivered_event_is_deleted(make_outbox):
+    box, http = make_outbox()
+    box.enqueue('http://hook', {"message": "hi"})
+    assert box._drain() is None
+    assert http.posts == [('http://hook', {"message": "hi"})]
+    assert rows(box) == []
+
+
+def test_failed_event_is_retried_with_backoff_then_given_up(make_outbox):
+    box, http = make_outbox(500, 500, 500, max_attempts=3)
+    box.enqueue('http://hook', {"message": "hi"})
+
+    next_due = box._drain()
+    [(_, attempts, dead, next_attempt, claimed_until)] = rows(box)
+    assert (attempts, dead, claimed_until) == (1, 0, None)
+    assert next_due == next_attempt
+
+    for _ in range(2):
+        box._execute("UPDATE events SET next_attempt = 0")
+        box._drain()
+    [(_, attempts, dead, _, _)] = rows(box)
+    assert (attempts, dead) == (3, 1)
+    assert len(http.posts) == 3
+    assert box.depth() == 0
+
+
+def test_sweep_deletes_dead_events_after_retention(make_outbox):
+    box, _ = make_outbox(500, max_attempts=1, dead_retention=100)
+    box.enqueue('http://hook', {"message": "hi"})
+    box._drain()
+    died_at = box._execute("SELECT died_at FROM events")[0][0]
+
+    assert box.sweep(now=died_at + 50) == 0
+    assert box.sweep(now=died_at + 101) == 1
+    assert rows(box) == []
+
+
+def test_sweep_forgets_traces_of_events_sent_elsewhere(make_outbox):
+    box, _ = make_outbox()
+    box.enqueue('http://hook', {"message": "sent"}, trace=object())
+    box.enqueue('http://hook', {"message": "pending"}, trace=object())
+    sent, pending = [row[0] for row in rows(box)]
+    # Another process sharing the file delivered the first event
+    box._execute("DELETE FROM events WHERE id = ?", (sent,))
+
+    box.sweep()
+    assert list(box._traces) == [pending]
+
+
+def test_traces_are_capped(make_outbox, monkeypatch):
+    monkeypatch.setattr(outbox, 'MAX_TRACED_EVENTS', 2)
+    box, _ = make_outbox()
+    for n in range(3):
+        box.enqueue('http://hook', {"message": str(n)}, trace=object())
+    assert list(box._traces) == [row[0] for row in rows(box)][1:]
+
+
+def test_sharing_senders_never_claim_the_same_event(make_outbox):
+    first, _ = make_outbox()
+    second, _ = make_outbox()
+    for i in range(3):
+        first.enqueue(f'http://hook/{i}', {"message": str(i)})
+
+    claimed_first = first._claim(now=10**10)
+    claimed_second = second._claim(now=10**10)
+    assert len(claimed_first) == 3
+    assert claimed_second == {}
+
+    # Once a claim lapses, e.g. because its sender died, the event is taken over
+    lapsed = 10**10 + first.timeout + outbox.CLAIM_MARGIN + 1
+    assert len(second._claim(now=lapsed)) == 3
+
+
+def test_batches_merge_events_for_the_same_url(make_outbox):
+    box, http = make_outbox(batch_size=5)
+    for i in range(3):
+        box.enqueue('http://hook', {"message": str(i), "status": "success"})
+    box._drain()
+    assert len(http.posts) == 1
+    assert http.posts[0][1]["event_name"] == "tableau_monitor_batch"
+
+
+def test_old_outbox_files_are_migrated(tmp_path):
+    import sqlite3
+    path = str(tmp_path / 'old.sqlite3')
+    db = sqlite3.connect(path)
+    db.execute(
+        "CREATE TABLE events (id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT NOT NULL, payload TEXT NOT NULL,"
+        " attempts INTEGER NOT NULL DEFAULT 0, next_attempt REAL NOT NULL, created_at REAL NOT NULL,"
+        " dead INTEGER NOT NULL DEFAULT 0, last_error TEXT)"
+    )
+    db.execute("INSERT INTO events (url, payload, next_attempt, created_at) VALUES ('http://hook', ?, 0, 0)",
+               (json.dumps({"message": "old"}),))
+    db.commit()
+    db.close()
+
+    box = WebhookOutbox(path=path, timeout=5)
+    assert len(box._claim(now=1)) == 1
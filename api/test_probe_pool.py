@@ -0,0 +1,59 @@
+import asyncio
+import threading
+import time
+
+from api.probe_pool import SKIPPED, probe_views_until, probe_views_until_async
+
+
+def test_results_line_up_with_the_views():
+    def probe(view):
+        time.sleep(0.01 * (5 - view))
+        return view * 10
+
+    assert probe_views_until(range(5), probe, time.monotonic() + 60, max_workers=5) == [0, 10, 20, 30, 40]
+
+
+def test_concurrency_is_bounded():
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def probe(view):
+        with lock:
+            running.append(view)
+            peak.append(len(running))
+        time.sleep(0.01)
+        with lock:
+            running.remove(view)
+        return view
+
+    probe_views_until(range(20), probe, time.monotonic() + 60, max_workers=3)
+    assert max(peak) == 3
+
+
+def test_views_not_started_before_the_deadline_are_skipped():
+    def probe(view):
+        time.sleep(0.05)
+        return view
+
+    results = probe_views_until(range(10), probe, time.monotonic() + 0.01, max_workers=2)
+    assert results[:2] == [0, 1]
+    assert results[2:] == [SKIPPED] * 8
+
+
+def test_halt_stops_new_probes():
+    probed = []
+    results = probe_views_until(range(10), probed.append, time.monotonic() + 60, max_workers=1,
+                                halt=lambda: len(probed) >= 3)
+    assert probed == [0, 1, 2]
+    assert results.count(SKIPPED) == 7
+
+
+def test_async_variant_keeps_order_and_deadline():
+    async def probe(view):
+        await asyncio.sleep(0.01 * (3 - view))
+        return view
+
+    assert asyncio.run(probe_views_until_async(range(3), probe, time.monotonic() + 60, 3)) == [0, 1, 2]
+    results = asyncio.run(probe_views_until_async(range(3), probe, time.monotonic() - 1, 3))
+    assert results == [SKIPPED] * 3
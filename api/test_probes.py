@@ -0,0 +1,65 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from api.probe_pool import SKIPPED, probe_views_until
+from api.probes import StageTiming, get_probe_mode, probe_view
+
+
+class FakeSession:
+    """Runs stage fetches itself, failing the stages it is told to"""
+
+    def __init__(self, failing=()):
+        self.failing = failing
+        self.stages = []
+
+    def call(self, func, kind='rest'):
+        self.stages.append(kind)
+        if kind in self.failing:
+            raise RuntimeError('render failed')
+        return StageTiming(kind, 0.01, 0.05, 1024)
+
+
+def make_view(view_id='v1'):
+    return SimpleNamespace(id=view_id, name=f"View {view_id}", workbook_id='w1')
+
+
+def test_stage_timing_rounds_its_times():
+    timing = StageTiming('pdf', 0.123456, 1.987654, 2048)
+    assert timing.to_dict() == {"stage": "pdf", "ttfb": 0.1235, "total": 1.9877, "bytes": 2048}
+
+
+def test_full_probe_times_every_stage():
+    session = FakeSession()
+    result = probe_view(session, make_view(), 'full')
+    assert session.stages == ['preview', 'image', 'pdf']
+    assert not result.failed
+    assert result.load_time == pytest.approx(0.15)
+    assert [stage["stage"] for stage in result.to_dict()["stages"]] == ['preview', 'image', 'pdf']
+
+
+def test_probe_stops_at_the_first_failed_stage():
+    session = FakeSession(failing=('image',))
+    result = probe_view(session, make_view(), 'full')
+    assert session.stages == ['preview', 'image']
+    assert result.error == "image: render failed"
+    assert result.load_time is None
+    assert result.to_dict()["load_time"] is None
+
+
+def test_no_probe_starts_after_the_deadline():
+    session = FakeSession()
+    views = [make_view(str(n)) for n in range(3)]
+    results = probe_views_until(views, lambda view: probe_view(session, view, 'preview'),
+                                time.monotonic() - 1, max_workers=2)
+    assert results == [SKIPPED] * 3
+    assert session.stages == []
+
+
+def test_unknown_probe_mode_is_rejected(monkeypatch):
+    monkeypatch.setenv('PROBE_MODE', 'Image ')
+    assert get_probe_mode() == 'image'
+    monkeypatch.setenv('PROBE_MODE', 'video')
+    with pytest.raises(ValueError):
+        get_probe_mode()
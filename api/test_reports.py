@@ -0,0 +1,71 @@
+import pytest
+
+from api.reports import DeltaReporter, latency_bucket
+
+
+@pytest.fixture
+def reporter(tmp_path):
+    return DeltaReporter(state_path=str(tmp_path / 'report_state.json'), full_interval=3600)
+
+
+def described(report):
+    return sorted(change.describe() for change in report.changes)
+
+
+def test_latency_buckets():
+    assert latency_bucket(None) is None
+    assert latency_bucket(0.5) == "<1s"
+    assert latency_bucket(3) == "2-5s"
+    assert latency_bucket(90) == ">60s"
+
+
+def test_first_check_is_full_and_later_ones_list_changes(reporter):
+    first = reporter.compare('site', [('a', 'A', 'active', 0.5), ('b', 'B', 'active', 0.5)], mode='delta', now=0)
+    assert first.full
+
+    same = reporter.compare('site', [('a', 'A', 'active', 0.6), ('b', 'B', 'active', 0.5)], mode='delta', now=60)
+    assert not same.full
+    assert same.changes == []
+    assert same.format_changes() == "No Changes Since Last Check"
+
+    changed = reporter.compare('site', [('a', 'A', 'error', None), ('b', 'B', 'active', 3)], mode='delta', now=120)
+    assert described(changed) == ["A: ACTIVE (<1s) -> ERROR", "B: ACTIVE (<1s) -> ACTIVE (2-5s)"]
+    assert changed.counts == {'error': 1, 'active': 1}
+
+
+def test_unprobed_views_keep_their_state_and_missing_ones_are_removed(reporter):
+    reporter.compare('site', [('a', 'A', 'error', None), ('b', 'B', 'active', 0.5)], mode='delta', now=0)
+    report = reporter.compare('site', [('a', 'A', None, None)], mode='delta', now=60)
+    assert described(report) == ["B: ACTIVE (<1s) -> REMOVED"]
+    assert report.counts == {'error': 1}
+
+
+def test_full_digest_is_due_after_the_interval(reporter):
+    reporter.compare('site', [('a', 'A', 'active', 0.5)], mode='delta', now=0)
+    assert not reporter.compare('site', [('a', 'A', 'active', 0.5)], mode='delta', now=3599).full
+    assert reporter.compare('site', [('a', 'A', 'active', 0.5)], mode='delta', now=3600).full
+
+
+def test_state_survives_a_restart(reporter):
+    reporter.compare('site', [('a', 'A', 'active', 0.5)], mode='delta', now=0)
+    restarted = DeltaReporter(state_path=reporter.state_path, full_interval=3600)
+    report = restarted.compare('site', [('a', 'A', 'error', None)], mode='delta', now=60)
+    assert not report.full
+    assert described(report) == ["A: ACTIVE (<1s) -> ERROR"]
+
+
+def test_partitions_handed_over_between_instances_are_not_reported(reporter):
+    partition_of = {'a': 0, 'b': 1, 'c': 2}.get
+    reporter.compare('site', [('a', 'A', 'active', 0.5), ('b', 'B', 'active', 0.5)],
+                     mode='delta', now=0, partitions={0, 1}, partition_of=partition_of)
+
+    # Partition 1 moved to another instance, partition 2 moved here
+    report = reporter.compare('site', [('a', 'A', 'active', 0.5), ('c', 'C', 'error', None)],
+                              mode='delta', now=60, partitions={0, 2}, partition_of=partition_of)
+    assert report.changes == []
+    assert report.counts == {'active': 1, 'error': 1}
+
+    # From now on partition 2 is diffed like any other
+    report = reporter.compare('site', [('a', 'A', 'active', 0.5), ('c', 'C', 'active', 0.5)],
+                              mode='delta', now=120, partitions={0, 2}, partition_of=partition_of)
+    assert described(report) == ["C: ERROR -> ACTIVE (<1s)"]
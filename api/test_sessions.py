@@ -0,0 +1,91 @@
+from types import SimpleNamespace
+
+import pytest
+import tableauserverclient as TSC
+
+from api import sessions
+from api.sessions import TableauSession
+
+
+class FakeServer:
+    """Stands in for TSC.Server, counting sign-ins"""
+
+    def __init__(self, server_url, **options):
+        self.sign_ins = 0
+        self.auth = SimpleNamespace(sign_in_with_personal_access_token=self._sign_in)
+
+    def _sign_in(self, tableau_auth):
+        self.sign_ins += 1
+
+    def is_signed_in(self):
+        return self.sign_ins > 0
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def perf_counter(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(sessions, 'time', clock)
+    monkeypatch.setattr(TSC, 'Server', FakeServer)
+    return clock
+
+
+def unauthorized():
+    return TSC.ServerResponseError('401002', 'Unauthorized', 'Token expired')
+
+
+def test_rejected_token_signs_in_again_once(clock):
+    session = TableauSession('https://tableau', 'site', 'name', 'token')
+    responses = [unauthorized(), 'views']
+
+    def list_views(server):
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    assert session.call(list_views) == 'views'
+    assert session.server.sign_ins == 2
+    assert session.generation == 2
+
+
+def test_other_errors_do_not_sign_in_again(clock):
+    session = TableauSession('https://tableau', 'site', 'name', 'token')
+
+    def fail(server):
+        raise TSC.ServerResponseError('404000', 'Not found', 'No such view')
+
+    with pytest.raises(TSC.ServerResponseError):
+        session.call(fail)
+    assert session.server.sign_ins == 1
+
+
+def test_session_signs_in_again_after_max_age(clock):
+    session = TableauSession('https://tableau', 'site', 'name', 'token', max_age=60)
+    session.ensure_signed_in()
+    clock.now += 59
+    session.ensure_signed_in()
+    assert session.server.sign_ins == 1
+    clock.now += 1
+    session.ensure_signed_in()
+    assert session.server.sign_ins == 2
+
+
+def test_stale_rejection_reuses_a_newer_token(clock):
+    session = TableauSession('https://tableau', 'site', 'name', 'token')
+    session.ensure_signed_in()
+    seen = session.generation
+    session.ensure_signed_in(stale_generation=seen)
+    # Another thread's 401 from before that sign-in must not sign in a third time
+    session.ensure_signed_in(stale_generation=seen)
+    assert session.server.sign_ins == 2
@@ -0,0 +1,86 @@
+import time
+
+import pytest
+
+from api.probe_scheduler import ProbeScheduler
+from api.sharding import ShardCoordinator
+
+
+class View:
+    def __init__(self, view_id):
+        self.id = view_id
+
+
+@pytest.fixture
+def store(tmp_path):
+    return str(tmp_path / 'shards.sqlite3')
+
+
+def coordinator(store, instance_id):
+    return ShardCoordinator(path=store, instance_id=instance_id, partitions=16, lease_ttl=60)
+
+
+def test_disabled_coordinator_keeps_every_view():
+    shards = ShardCoordinator(path='', instance_id='a', partitions=16)
+    views = [View(str(i)) for i in range(10)]
+    assert shards.local_views(views) == views
+    assert shards.heartbeat() == frozenset(range(16))
+
+
+def test_instances_split_partitions_without_overlap(store):
+    a = coordinator(store, 'a')
+    b = coordinator(store, 'b')
+    a.heartbeat()
+    b.heartbeat()
+    owned_a = a.heartbeat()
+    owned_b = b.heartbeat()
+    assert owned_a and owned_b
+    assert not owned_a & owned_b
+    assert owned_a | owned_b == frozenset(range(16))
+
+
+def test_partitions_move_only_after_release(store):
+    a = coordinator(store, 'a')
+    assert a.heartbeat() == frozenset(range(16))
+    b = coordinator(store, 'b')
+    # a still holds every lease, so b gets nothing until a hands over
+    assert b.heartbeat() == frozenset()
+    a.heartbeat()
+    assert b.heartbeat()
+    a.release()
+    assert b.heartbeat() == frozenset(range(16))
+
+
+def test_new_owner_keeps_the_probe_schedule(store):
+    a = coordinator(store, 'a')
+    a.heartbeat()
+    views = [View(f"view-{i}") for i in range(50)]
+    scheduler_a = ProbeScheduler(time_budget=60, max_staleness=900, slow_threshold=10)
+    probed = scheduler_a.run(views, lambda view: view.id, lambda result: (1.0, False))
+    a.save_probes(scheduler_a.export(probed))
+    a.release()
+
+    b = coordinator(store, 'b')
+    owned = b.heartbeat()
+    scheduler_b = ProbeScheduler(time_budget=60, max_staleness=900, slow_threshold=10)
+    scheduler_b.seed(b.load_probes(owned))
+
+    # Views a probed a moment ago are not due again; a view a never saw is
+    fresh = View('never-probed')
+    assert scheduler_b.plan(views + [fresh])[0] is fresh
+    stats = scheduler_b.stats(views[0].id)
+    assert time.time() - stats.last_probed < 60
+    assert stats.load_time == 1.0
+
+
+def test_older_shared_probes_do_not_override_newer_local_ones(store):
+    shards = coordinator(store, 'a')
+    shards.save_probes([('v', 200.0, 2.0, True)])
+    shards.save_probes([('v', 100.0, 1.0, False)])
+    assert shards.load_probes(range(16)) == {'v': (200.0, 2.0, True)}
+
+    scheduler = ProbeScheduler(time_budget=60, max_staleness=900, slow_threshold=10)
+    scheduler.record('v', 3.0, False, probed_at=300.0)
+    scheduler.seed(shards.load_probes(range(16)))
+    assert scheduler.stats('v').last_probed == 300.0
+    assert scheduler.stats('v').failed is False
@@ -0,0 +1,41 @@
+import json
+import pickle
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from api.sites import ViewRef, load_sites
+
+
+def test_view_ref_keeps_the_project_name_across_processes():
+    view = SimpleNamespace(id='v1', name='Sales', project_id='p1', project_name='Finance',
+                           workbook_id='w1', created_at=datetime(2025, 1, 1, tzinfo=timezone.utc))
+    ref = pickle.loads(pickle.dumps(ViewRef(view)))
+    assert (ref.id, ref.name, ref.project_id, ref.project_name, ref.workbook_id) == (
+        'v1', 'Sales', 'p1', 'Finance', 'w1'
+    )
+    assert ref.created_at == view.created_at
+
+
+def test_load_sites_reads_tokens_from_the_environment(tmp_path, monkeypatch):
+    monkeypatch.setenv('EU_TOKEN', 'secret')
+    path = tmp_path / 'sites.json'
+    path.write_text(json.dumps({"sites": [
+        {"name": "eu", "server_url": "https://eu.tableau.example/", "site_name": "emea",
+         "token_name": "monitor", "token_env": "EU_TOKEN", "probe_concurrency": 4},
+        {"server_url": "https://us.tableau.example", "site_name": "amer",
+         "token_name": "monitor", "token": "inline"},
+    ]}))
+
+    eu, us = load_sites(str(path))
+    assert (eu.name, eu.server_url, eu.token, eu.probe_concurrency) == ('eu', 'https://eu.tableau.example', 'secret', 4)
+    assert (us.name, us.token, us.max_memory_mb) == ('amer', 'inline', None)
+
+
+def test_load_sites_rejects_duplicate_names(tmp_path):
+    site = {"server_url": "https://tableau.example", "site_name": "s", "token_name": "t", "token": "x"}
+    path = tmp_path / 'sites.json'
+    path.write_text(json.dumps([site, site]))
+    with pytest.raises(ValueError):
+        load_sites(str(path))
@@ -0,0 +1,83 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from api import snapshots
+from api.snapshots import Flight, SingleFlight, compute_etag, decode_cursor, encode_cursor
+
+
+def test_concurrent_calls_share_one_run():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def check(current):
+        calls.append(current)
+        release.wait(5)
+        return len(calls)
+
+    results = []
+    callers = [threading.Thread(target=lambda: results.append(flight.do(check))) for _ in range(3)]
+    callers[0].start()
+    while not flight.in_flight():
+        time.sleep(0.001)
+    for caller in callers[1:]:
+        caller.start()
+    while flight._flight.followers < 2:
+        time.sleep(0.001)
+    release.set()
+    for caller in callers:
+        caller.join(5)
+
+    assert len(calls) == 1
+    assert sorted(shared for _, _, shared in results) == [False, True, True]
+    assert {result for result, _, _ in results} == {1}
+    assert not flight.in_flight()
+
+
+def test_errors_reach_every_caller_and_do_not_stick():
+    flight = SingleFlight()
+
+    def broken(_):
+        raise RuntimeError("sign-in failed")
+
+    with pytest.raises(RuntimeError):
+        flight.do(broken)
+    assert flight.do(lambda _: "ok")[0] == "ok"
+
+
+def test_snapshot_is_only_reused_while_fresh(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(snapshots, 'time', SimpleNamespace(monotonic=lambda: clock[0]))
+    flight = SingleFlight()
+    assert flight.snapshot(60) is None
+    flight.store({"views": []}, 200)
+    clock[0] += 60
+    assert flight.snapshot(60).data == {"views": []}
+    clock[0] += 1
+    assert flight.snapshot(60) is None
+    assert flight.snapshot() is not None
+
+
+def test_stream_yields_published_items_until_done():
+    current = Flight()
+    current.publish(1)
+    received = []
+    reader = threading.Thread(target=lambda: received.extend(current.stream()))
+    reader.start()
+    current.publish(2)
+    current._finish("result", None)
+    reader.join(5)
+    assert received == [1, 2]
+
+
+def test_etag_ignores_key_order_and_cursors_round_trip():
+    assert compute_etag({"a": 1, "b": [1, 2]}) == compute_etag({"b": [1, 2], "a": 1})
+    assert compute_etag({"a": 1}) != compute_etag({"a": 2})
+    etag = compute_etag({"a": 1})
+    assert decode_cursor(encode_cursor(etag, 200)) == (etag, 200)
+    for cursor in ('not-a-cursor', encode_cursor(etag, -1)):
+        with pytest.raises(ValueError):
+            decode_cursor(cursor)
@@ -0,0 +1,178 @@
+import asyncio
+import random
+
+import pytest
+
+from api import throttle
+from api.throttle import (
+    CLOSED, FAILED, HALF_OPEN, OPEN, OUTAGE_ENDED, OUTAGE_STARTED, SUCCEEDED, THROTTLED,
+    AdaptiveLimiter, CircuitBreaker, TokenBucket
+)
+
+
+class FakeClock:
+    """Stands in for the time module inside api.throttle"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    perf_counter = monotonic
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(throttle, 'time', fake)
+    return fake
+
+
+def run_calls(limiter, clock, latencies, outcome=SUCCEEDED):
+    """Feed latencies through the limiter as if `limit` calls were always in flight"""
+    for latency in latencies:
+        limiter.acquire()
+        clock.now += latency / max(1, int(limiter.limit))
+        limiter.release('render', latency, outcome)
+
+
+def test_limit_stays_up_when_views_differ_in_speed(clock):
+    # Healthy server whose views take 0.05s to 0.25s: no reason to back off
+    rng = random.Random(1)
+    limiter = AdaptiveLimiter(1, 16, tolerance=2.0)
+    run_calls(limiter, clock, [0.05 + rng.uniform(0, 0.2) for _ in range(5000)])
+    assert limiter.limit >= 12
+
+
+def test_one_slow_view_does_not_halve_the_limit(clock):
+    limiter = AdaptiveLimiter(1, 16, tolerance=2.0)
+    run_calls(limiter, clock, [0.1] * 100)
+    run_calls(limiter, clock, [5.0])
+    assert limiter.limit == 16
+
+
+def test_sustained_slowdown_halves_the_limit(clock):
+    limiter = AdaptiveLimiter(1, 16, tolerance=2.0)
+    run_calls(limiter, clock, [0.1] * 100)
+    run_calls(limiter, clock, [1.0] * 20)
+    assert limiter.limit < 16
+
+
+@pytest.mark.parametrize('outcome', [FAILED, THROTTLED])
+def test_errors_halve_the_limit_once_per_usual_latency(clock, outcome):
+    limiter = AdaptiveLimiter(1, 16, tolerance=2.0)
+    run_calls(limiter, clock, [0.1] * 50)
+    for _ in range(3):
+        limiter.acquire()
+        limiter.release('render', 0.1, outcome)
+    assert limiter.limit == 8
+    clock.now += 1
+    limiter.acquire()
+    limiter.release('render', 0.1, outcome)
+    assert limiter.limit == 4
+
+
+def test_limit_recovers_additively(clock):
+    limiter = AdaptiveLimiter(1, 8, tolerance=2.0)
+    limiter.acquire()
+    limiter.release('render', 0.1, FAILED)
+    assert limiter.limit == 4
+    run_calls(limiter, clock, [0.1] * 100)
+    assert limiter.limit == 8
+
+
+def test_limit_never_goes_below_the_minimum(clock):
+    limiter = AdaptiveLimiter(2, 8, tolerance=2.0)
+    for _ in range(10):
+        clock.now += 10
+        limiter.acquire()
+        limiter.release('render', 0.1, FAILED)
+    assert limiter.limit == 2
+
+
+def test_token_bucket_spaces_calls_at_the_rate(clock):
+    bucket = TokenBucket(rate=10, burst=2)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.1)
+    clock.now += 0.1
+    assert bucket.reserve() == 0
+
+
+def test_unlimited_bucket_still_pauses_after_throttling(clock):
+    bucket = TokenBucket(rate=0)
+    assert bucket.reserve() == 0
+    bucket.pause(2)
+    assert bucket.reserve() == pytest.approx(2)
+    clock.now += 2
+    assert bucket.reserve() == 0
+
+
+def test_default_rate_limit_is_off(monkeypatch):
+    monkeypatch.delenv('TABLEAU_RATE_LIMIT', raising=False)
+    guard = throttle.ServerGuard('http://default-rate.invalid')
+    assert guard.bucket.rate == 0
+
+
+def test_circuit_opens_after_threshold_and_reports_once(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    assert breaker.record_failure(OSError('down')) is False
+    assert breaker.record_failure(OSError('down')) is False
+    assert breaker.record_failure(OSError('down')) is True
+    assert breaker.state == OPEN
+    assert breaker.pop_event() == OUTAGE_STARTED
+    assert breaker.pop_event() is None
+    assert breaker.allow() is False
+
+
+def test_circuit_half_opens_and_backs_off(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure(OSError('down'))
+    clock.now += 30
+    assert breaker.allow() is True
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow() is False
+    breaker.record_failure(OSError('still down'))
+    assert breaker.retry_at == clock.now + 60
+
+    clock.now += 60
+    assert breaker.allow() is True
+    breaker.pop_event()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.pop_event() == OUTAGE_ENDED
+    assert breaker.last_outage == 90
+
+
+def test_cancelled_trial_call_reopens_the_circuit(clock):
+    guard = throttle.ServerGuard('http://cancelled-trial.invalid')
+    guard.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    guard.breaker.record_failure(OSError('down'))
+    clock.now += 30
+
+    async def trial():
+        started = asyncio.Event()
+
+        async def render():
+            started.set()
+            await asyncio.sleep(3600)
+
+        task = asyncio.ensure_future(guard.call_async(render))
+        await started.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(trial())
+    assert guard.breaker.state == OPEN
+    assert guard.breaker.retry_at == clock.now + 30
+    assert guard.breaker.paused
+    clock.now += 30
+    assert guard.breaker.allow() is True
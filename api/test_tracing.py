@@ -0,0 +1,87 @@
+import threading
+import time
+
+from api.async_client import EventLoopThread
+from api.probe_pool import probe_views_until
+from api.tracing import NULL_SPAN, Tracer
+
+
+def span_names(trace):
+    return sorted(span[0] for span in trace.spans)
+
+
+def test_spans_go_to_the_tick_in_progress():
+    tracer = Tracer(enabled=True, ticks=5, max_spans=100)
+    assert tracer.span('before') is NULL_SPAN
+    with tracer.tick('check', site='s'):
+        with tracer.span('sign_in') as span:
+            span.set(user='u')
+        assert tracer.current() is not None
+    assert tracer.current() is None
+    assert tracer.span('after') is NULL_SPAN
+
+    [trace] = tracer.traces()
+    assert span_names(trace) == ['check', 'sign_in']
+    events = tracer.chrome_trace()["traceEvents"]
+    assert {"name": "sign_in", "args": {"user": "u"}}.items() <= next(
+        event for event in events if event.get("name") == "sign_in").items()
+
+
+def test_disabled_tracer_records_nothing():
+    tracer = Tracer(enabled=False, ticks=5, max_spans=100)
+    with tracer.tick('check'):
+        assert tracer.span('sign_in') is NULL_SPAN
+    assert tracer.traces() == []
+
+
+def test_work_outside_the_tick_is_not_traced_in_it():
+    tracer = Tracer(enabled=True, ticks=5, max_spans=100)
+    in_tick = threading.Event()
+    other_done = threading.Event()
+
+    def unrelated_work():
+        # e.g. a load test render or the warm-up, running during a tick
+        in_tick.wait()
+        with tracer.span('load_test_render'):
+            pass
+        other_done.set()
+
+    thread = threading.Thread(target=unrelated_work)
+    thread.start()
+    with tracer.tick('check'):
+        in_tick.set()
+        other_done.wait()
+    thread.join()
+
+    assert span_names(tracer.traces()[0]) == ['check']
+
+
+def test_probe_workers_and_event_loop_inherit_the_tick():
+    tracer = Tracer(enabled=True, ticks=5, max_spans=100)
+
+    def probe(view):
+        with tracer.span('probe', view=view):
+            return view
+
+    async def list_views():
+        with tracer.span('list_views'):
+            return 'listed'
+
+    loop = EventLoopThread(name='test-loop')
+    with tracer.tick('check'):
+        results = probe_views_until(['a', 'b', 'c'], probe, time.monotonic() + 60, max_workers=3)
+        assert loop.run(list_views()) == 'listed'
+
+    assert results == ['a', 'b', 'c']
+    assert span_names(tracer.traces()[0]) == ['check', 'list_views', 'probe', 'probe', 'probe']
+
+
+def test_span_limit_counts_dropped_spans():
+    tracer = Tracer(enabled=True, ticks=5, max_spans=2)
+    with tracer.tick('check'):
+        for _ in range(3):
+            with tracer.span('render'):
+                pass
+    trace = tracer.traces()[0]
+    assert len(trace.spans) == 2
+    assert trace.dropped == 2
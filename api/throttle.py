@@ -0,0 +1,424 @@
+import asyncio
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from api.lazy import lazy_import
+from api.metrics import CIRCUIT_OPEN, CONCURRENCY_LIMIT, RETRIES, THROTTLED_REQUESTS
+from api.probe_pool import get_probe_concurrency
+
+requests = lazy_import('requests')
+
+logger = logging.getLogger('TableauThrottle')
+
+# No rate limit unless configured: the adaptive concurrency limit already
+# backs off when the server slows down or starts failing
+DEFAULT_RATE_LIMIT = 0
+DEFAULT_MIN_CONCURRENCY = 1
+DEFAULT_LATENCY_TOLERANCE = 2.0
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30
+MAX_RESET_TIMEOUT = 600
+DEFAULT_THROTTLE_RETRIES = 2
+DEFAULT_THROTTLE_PAUSE = 2.0
+
+# How a call went, as far as the health of the server is concerned
+SUCCEEDED = "succeeded"
+THROTTLED = "throttled"
+FAILED = "failed"
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+OUTAGE_STARTED = "outage_started"
+OUTAGE_ENDED = "outage_ended"
+
+# Multiplicative decrease factor of the concurrency limit
+BACKOFF = 0.5
+# Weights of the recent and the usual latency average of each kind of request
+RECENT_WEIGHT = 0.1
+USUAL_WEIGHT = 0.01
+# Latencies below this are averaged as this, since averages are geometric
+MIN_LATENCY = 0.001
+# Requests of a kind seen before its latency counts as a congestion signal
+LATENCY_WARMUP = 20
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a server whose circuit breaker is open"""
+
+
+def classify(error):
+    """Whether an exception means the server is throttling us, failing, or fine"""
+    code = str(getattr(error, 'code', '') or '')
+    if code.startswith('429'):
+        return THROTTLED
+    network_errors = (requests.ConnectionError, requests.Timeout, ConnectionError, TimeoutError)
+    if code.startswith('5') or isinstance(error, network_errors):
+        return FAILED
+    # Anything else (404, 403...) is an answer from a healthy server
+    return SUCCEEDED
+
+
+def _format(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%d %H:%M:%S') if timestamp else None
+
+
+class TokenBucket:
+    """Allows `rate` calls per second on average, with bursts of up to `burst`"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token if one is available and return 0, else the seconds to wait"""
+        if self.rate <= 0:
+            # Unlimited, apart from pauses after the server throttled us
+            return max(0, self.paused_until - time.monotonic())
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if now >= self.paused_until and self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return max(self.paused_until - now, (1 - self.tokens) / self.rate)
+
+    def acquire(self):
+        """Block until a token is available and take it; a rate of 0 means no limit"""
+        wait = self.reserve()
+        while wait:
+            time.sleep(wait)
+            wait = self.reserve()
+
+    async def acquire_async(self):
+        wait = self.reserve()
+        while wait:
+            await asyncio.sleep(wait)
+            wait = self.reserve()
+
+    def pause(self, seconds):
+        """Hand out no tokens for `seconds`, e.g. after the server answered 429"""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+
+class AdaptiveLimiter:
+    """Concurrency limit that adapts to the server with AIMD.
+
+    Every call that succeeds in reasonable time raises the limit by
+    1/limit, so about one more slot per round of calls. A call that is
+    throttled or fails halves the limit, and so does a success while the
+    recent average latency of its kind of request is over `tolerance`
+    times its long-run average. Averages rather than single calls are
+    compared, and geometric ones, since some views are always much slower
+    than others and should not count as congestion on their own. The
+    limit is halved at most once per usual latency so one slow burst does
+    not collapse it to the minimum. Threads and asyncio tasks can share
+    one limiter.
+    """
+
+    def __init__(self, min_limit, max_limit, tolerance):
+        self.min_limit = min_limit
+        self.max_limit = max(min_limit, max_limit)
+        self.tolerance = tolerance
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        # kind -> [calls, recent and usual average of log(latency)]
+        self._latencies = {}
+        self._last_decrease = 0.0
+        self._changed = threading.Condition()
+        # (loop, future) of asyncio tasks waiting for a slot
+        self._async_waiters = deque()
+
+    def raise_ceiling(self, max_limit):
+        with self._changed:
+            if max_limit > self.max_limit:
+                self.limit += max_limit - self.max_limit
+                self.max_limit = max_limit
+
+    def acquire(self):
+        with self._changed:
+            while self.in_flight >= int(self.limit):
+                self._changed.wait()
+            self.in_flight += 1
+
+    async def acquire_async(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._changed:
+                if self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+                future = loop.create_future()
+                self._async_waiters.append((loop, future))
+            await future
+
+    def _wake_async_waiters(self):
+        free = int(self.limit) - self.in_flight
+        while free > 0 and self._async_waiters:
+            loop, future = self._async_waiters.popleft()
+            if not future.done():
+                loop.call_soon_threadsafe(_resolve, future)
+                free -= 1
+
+    def release(self, kind, latency, outcome):
+        """Free a slot and adapt the limit; an outcome of None only frees the slot"""
+        with self._changed:
+            self.in_flight -= 1
+            if outcome is not None:
+                self._adapt(kind, latency, outcome)
+            self._changed.notify_all()
+            self._wake_async_waiters()
+
+    def _adapt(self, kind, latency, outcome):
+        """Additive increase, multiplicative decrease; called with the lock held"""
+        stats = self._latencies.get(kind)
+        if outcome == SUCCEEDED:
+            sample = math.log(max(latency, MIN_LATENCY))
+            if stats is None:
+                stats = self._latencies[kind] = [0, sample, sample]
+            stats[0] += 1
+            stats[1] += (sample - stats[1]) * RECENT_WEIGHT
+            stats[2] += (sample - stats[2]) * USUAL_WEIGHT
+            congested = stats[0] >= LATENCY_WARMUP and stats[1] - stats[2] > math.log(self.tolerance)
+        else:
+            congested = True
+
+        now = time.monotonic()
+        if not congested:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        elif now - self._last_decrease >= (math.exp(stats[2]) if stats else 1.0):
+            self.limit = max(self.min_limit, self.limit * BACKOFF)
+            self._last_decrease = now
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class CircuitBreaker:
+    """Stops calling a server that is clearly down.
+
+    After `failure_threshold` failures in a row the circuit opens and calls
+    fail at once with CircuitOpenError. After `reset_timeout` seconds one
+    trial call is let through: if it works the circuit closes, otherwise it
+    opens again for twice as long (up to MAX_RESET_TIMEOUT). Opening and
+    closing are remembered as an event for pop_event(), so an outage can be
+    reported once instead of by every call it breaks.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.last_error = None
+        self.opened_at = None
+        self.retry_at = None
+        self.last_outage = None
+        self._timeout = reset_timeout
+        self._event = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.state != CLOSED
+
+    @property
+    def paused(self):
+        """True while calls would be refused; false again once a trial call is due"""
+        return self.state == HALF_OPEN or (self.state == OPEN and time.time() < self.retry_at)
+
+    def allow(self):
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.time() >= self.retry_at:
+                self.state = HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            if self.state != CLOSED:
+                self.last_outage = time.time() - self.opened_at
+                self.state = CLOSED
+                self._timeout = self.reset_timeout
+                self._event = OUTAGE_ENDED
+
+    def record_failure(self, error):
+        """Count a failure; returns True if it opened the circuit"""
+        with self._lock:
+            self.failures += 1
+            self.last_error = ' '.join(str(error).split())[:300] or type(error).__name__
+            if self.state == HALF_OPEN:
+                self._timeout = min(self._timeout * 2, MAX_RESET_TIMEOUT)
+                self.state = OPEN
+                self.retry_at = time.time() + self._timeout
+            elif self.state == CLOSED and self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = time.time()
+                self.retry_at = self.opened_at + self._timeout
+                self._event = OUTAGE_STARTED
+                return True
+            return False
+
+    def abandon_trial(self):
+        """The trial call ended without an outcome, e.g. it was cancelled: let another through later"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.state = OPEN
+                self.retry_at = time.time() + self._timeout
+
+    def pop_event(self):
+        """The last OUTAGE_STARTED/OUTAGE_ENDED transition not yet taken, or None"""
+        with self._lock:
+            event, self._event = self._event, None
+            return event
+
+
+class ServerGuard:
+    """Rate limit, adaptive concurrency limit and circuit breaker for one server"""
+
+    def __init__(self, server_url):
+        self.server_url = server_url
+        rate = float(os.getenv('TABLEAU_RATE_LIMIT', DEFAULT_RATE_LIMIT))
+        self.bucket = TokenBucket(rate, float(os.getenv('TABLEAU_RATE_BURST', 0)) or None)
+        self.limiter = AdaptiveLimiter(
+            int(os.getenv('TABLEAU_MIN_CONCURRENCY', DEFAULT_MIN_CONCURRENCY)),
+            get_probe_concurrency(),
+            float(os.getenv('TABLEAU_LATENCY_TOLERANCE', DEFAULT_LATENCY_TOLERANCE))
+        )
+        self.breaker = CircuitBreaker(
+            int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', DEFAULT_FAILURE_THRESHOLD)),
+            float(os.getenv('CIRCUIT_RESET_TIMEOUT', DEFAULT_RESET_TIMEOUT))
+        )
+        self.throttle_retries = int(os.getenv('THROTTLE_RETRIES', DEFAULT_THROTTLE_RETRIES))
+        self.throttle_pause = float(os.getenv('THROTTLE_PAUSE', DEFAULT_THROTTLE_PAUSE))
+        CONCURRENCY_LIMIT.labels(server_url).set_function(lambda: int(self.limiter.limit))
+        CIRCUIT_OPEN.labels(server_url).set_function(lambda: 1 if self.breaker.is_open else 0)
+
+    def _check_breaker(self):
+        if not self.breaker.allow():
+            raise CircuitOpenError(
+                f"{self.server_url} is unavailable, not calling it again before {_format(self.breaker.retry_at)}"
+            )
+
+    def _settle(self, kind, elapsed, error, attempt):
+        """Record how a call went; returns True if a throttled call should be retried"""
+        if error is None:
+            self.limiter.release(kind, elapsed, SUCCEEDED)
+            self.breaker.record_success()
+            return False
+
+        outcome = classify(error)
+        self.limiter.release(kind, elapsed, outcome)
+        if outcome == FAILED:
+            if self.breaker.record_failure(error):
+                logger.error(f"{self.server_url} looks down after {self.breaker.failures} failures in a row")
+            return False
+        self.breaker.record_success()
+        if outcome == THROTTLED:
+            THROTTLED_REQUESTS.labels(self.server_url).inc()
+            self.bucket.pause(self.throttle_pause)
+            if attempt < self.throttle_retries:
+                RETRIES.labels('throttled').inc()
+                return True
+        return False
+
+    def call(self, func, kind='rest'):
+        """Run func() once the rate and concurrency limits allow it.
+
+        Throttled calls are retried after a pause; raises CircuitOpenError
+        without calling func while the server is considered down.
+        """
+        attempt = 0
+        while True:
+            self._check_breaker()
+            self.bucket.acquire()
+            self.limiter.acquire()
+            start_time = time.perf_counter()
+            try:
+                result = func()
+            except Exception as e:
+                if self._settle(kind, time.perf_counter() - start_time, e, attempt):
+                    attempt += 1
+                    continue
+                raise
+            self._settle(kind, time.perf_counter() - start_time, None, attempt)
+            return result
+
+    async def call_async(self, func, kind='rest'):
+        """call() for a coroutine function, waiting without blocking the event loop"""
+        attempt = 0
+        while True:
+            self._check_breaker()
+            # A cancelled trial call must not leave the circuit half open for good
+            trial = self.breaker.state == HALF_OPEN
+            try:
+                await self.bucket.acquire_async()
+                await self.limiter.acquire_async()
+            except asyncio.CancelledError:
+                if trial:
+                    self.breaker.abandon_trial()
+                raise
+            start_time = time.perf_counter()
+            try:
+                result = await func()
+            except asyncio.CancelledError:
+                self.limiter.release(kind, None, None)
+                if trial:
+                    self.breaker.abandon_trial()
+                raise
+            except Exception as e:
+                if self._settle(kind, time.perf_counter() - start_time, e, attempt):
+                    attempt += 1
+                    continue
+                raise
+            self._settle(kind, time.perf_counter() - start_time, None, attempt)
+            return result
+
+    def describe_outage(self):
+        breaker = self.breaker
+        return (
+            f"Server: {self.server_url}\n"
+            f"Down since: {_format(breaker.opened_at)}\n"
+            f"Failures in a row: {breaker.failures}\n"
+            f"Last error: {breaker.last_error}\n"
+            f"Probing paused until: {_format(breaker.retry_at)}"
+        )
+
+
+class GuardRegistry:
+    """One ServerGuard per server URL, shared by every session on that server"""
+
+    def __init__(self):
+        self._guards = {}
+        self._lock = threading.Lock()
+
+    def get(self, server_url, max_concurrency=None):
+        """The server's guard; max_concurrency raises its concurrency ceiling, e.g. for asyncio clients"""
+        with self._lock:
+            guard = self._guards.get(server_url)
+            if guard is None:
+                guard = self._guards[server_url] = ServerGuard(server_url)
+        if max_concurrency:
+            guard.limiter.raise_ceiling(max_concurrency)
+        return guard
+
+
+server_guards = GuardRegistry()
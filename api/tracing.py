@@ -0,0 +1,214 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+
+DEFAULT_TRACE_TICKS = 10
+DEFAULT_MAX_SPANS = 50000
+
+# Trace of the tick the current thread or asyncio task works for
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+
+
+def _lane():
+    """Timeline row of the caller: its asyncio task, or else its thread"""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    if task is not None:
+        return id(task), task.get_name()
+    thread = threading.current_thread()
+    return thread.ident, thread.name
+
+
+class Trace:
+    """Spans recorded during one monitoring tick.
+
+    Spans are (name, category, start, duration, lane, args) with times from
+    time.perf_counter(). Spans may still be added after the tick has ended,
+    e.g. for the webhook it queued, until the trace is evicted.
+    """
+
+    __slots__ = ('name', 'started_at', 'start', 'spans', 'lanes', 'dropped', 'max_spans', '_lock')
+
+    def __init__(self, name, max_spans):
+        self.name = name
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.spans = []
+        self.lanes = {}
+        self.dropped = 0
+        self.max_spans = max_spans
+        self._lock = threading.Lock()
+
+    def add(self, name, category, start, end, args=None):
+        lane, lane_name = _lane()
+        with self._lock:
+            if len(self.spans) >= self.max_spans:
+                self.dropped += 1
+                return
+            self.spans.append((name, category, start, end - start, lane, args))
+            self.lanes[lane] = lane_name
+
+    def events(self, pid):
+        """Chrome trace events of this trace, as process `pid`"""
+        def timestamp(moment):
+            return round((self.started_at + moment - self.start) * 1e6, 1)
+
+        with self._lock:
+            spans = list(self.spans)
+            lanes = dict(self.lanes)
+            dropped = self.dropped
+
+        label = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(self.started_at))
+        events = [{"ph": "M", "name": "process_name", "pid": pid, "args": {"name": f"{self.name} {label} UTC"}}]
+        events.extend(
+            {"ph": "M", "name": "thread_name", "pid": pid, "tid": lane, "args": {"name": lane_name}}
+            for lane, lane_name in lanes.items()
+        )
+        for name, category, start, duration, lane, args in spans:
+            event = {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": timestamp(start),
+                "dur": round(duration * 1e6, 1),
+                "pid": pid,
+                "tid": lane
+            }
+            if args:
+                event["args"] = args
+            events.append(event)
+        if dropped:
+            events.append({
+                "name": "spans_dropped", "ph": "i", "s": "p", "pid": pid, "tid": 0,
+                "ts": timestamp(self.start), "args": {"count": dropped}
+            })
+        return events
+
+
+class _Span:
+    __slots__ = ('trace', 'name', 'category', 'args', 'start')
+
+    def __init__(self, trace, name, category, args):
+        self.trace = trace
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = None
+
+    def set(self, **args):
+        """Attach more arguments, e.g. a result only known at the end"""
+        self.args.update(args)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.args["error"] = f"{exc_type.__name__}: {str(exc)}"[:200]
+        self.trace.add(self.name, self.category, self.start, time.perf_counter(), self.args)
+        return False
+
+
+class _NullSpan:
+    """What span() returns while nothing is traced: does nothing, cheaply"""
+
+    __slots__ = ()
+
+    def set(self, **args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Tick(_Span):
+    __slots__ = ('tracer', 'token')
+
+    def __init__(self, tracer, trace, args):
+        super().__init__(trace, trace.name, 'tick', args)
+        self.tracer = tracer
+        self.token = None
+
+    def __enter__(self):
+        self.token = _current_trace.set(self.trace)
+        return super().__enter__()
+
+    def __exit__(self, exc_type, exc, tb):
+        super().__exit__(exc_type, exc, tb)
+        _current_trace.reset(self.token)
+        self.tracer._finish(self.trace)
+        return False
+
+
+class Tracer:
+    """Span tracing of monitoring ticks, kept for the last `ticks` ticks.
+
+    tick() opens the trace of a check and span() times a phase within it.
+    The trace is held in a context variable, so spans only go to the tick
+    that the calling code works for: asyncio tasks inherit it, and worker
+    threads do when started with contextvars.copy_context().run. Work
+    outside any tick, such as load tests or the warm-up, is not traced.
+    With tracing off, or outside a tick, span() returns a shared no-op
+    object, so instrumented code costs a context variable lookup. Traces
+    export as Chrome trace-event JSON.
+    """
+
+    def __init__(self, enabled=None, ticks=None, max_spans=None):
+        if enabled is None:
+            enabled = os.getenv('TRACING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+        self.enabled = enabled
+        self.max_spans = max_spans or int(os.getenv('TRACE_MAX_SPANS', DEFAULT_MAX_SPANS))
+        self._traces = deque(maxlen=ticks or int(os.getenv('TRACE_TICKS', DEFAULT_TRACE_TICKS)))
+        self._lock = threading.Lock()
+
+    def tick(self, name, **args):
+        """Context manager tracing one tick as a new trace"""
+        if not self.enabled:
+            return NULL_SPAN
+        return _Tick(self, Trace(name, self.max_spans), args)
+
+    def _finish(self, trace):
+        with self._lock:
+            self._traces.append(trace)
+
+    def span(self, name, category='tableau', **args):
+        """Context manager timing one phase of the caller's tick"""
+        trace = _current_trace.get()
+        if trace is None:
+            return NULL_SPAN
+        return _Span(trace, name, category, args)
+
+    def current(self):
+        """The trace of the caller's tick, or None"""
+        return _current_trace.get()
+
+    def traces(self, count=None):
+        with self._lock:
+            traces = list(self._traces)
+        return traces[-count:] if count else traces
+
+    def chrome_trace(self, count=None):
+        """The last `count` traces (all kept ones by default) as Chrome trace-event JSON"""
+        events = []
+        for pid, trace in enumerate(self.traces(count), start=1):
+            events.extend(trace.events(pid))
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"tracing_enabled": self.enabled, "ticks_kept": self._traces.maxlen}
+        }
+
+
+tracer = Tracer()
@@ -0,0 +1,64 @@
+import importlib
+import logging
+import threading
+import time
+
+from api.metrics import WARMUP_SECONDS
+
+logger = logging.getLogger('TableauWarmup')
+
+
+def preload(*names):
+    """Import modules now, e.g. the ones other modules import lazily"""
+    for name in names:
+        importlib.import_module(name)
+
+
+class Warmup:
+    """Runs startup work once on a background thread so no request waits for it.
+
+    Steps are (name, func) pairs run in order; a failed step is logged and
+    the rest still run, since each one only saves the first check some time.
+    """
+
+    def __init__(self, steps, name='warmup'):
+        self.steps = steps
+        self.name = name
+        self.durations = {}
+        self.errors = {}
+        self.done = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the warm-up thread unless it has already been started"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        try:
+            for step, func in self.steps:
+                start_time = time.perf_counter()
+                try:
+                    func()
+                except Exception as e:
+                    logger.warning(f"Warm-up step '{step}' failed: {str(e)}")
+                    self.errors[step] = str(e)
+                    continue
+                self.durations[step] = time.perf_counter() - start_time
+                WARMUP_SECONDS.labels(step).set(self.durations[step])
+                logger.info(f"Warm-up step '{step}' took {self.durations[step]:.2f}s")
+        finally:
+            self.done.set()
+
+    def status(self):
+        return {
+            "started": self._thread is not None,
+            "done": self.done.is_set(),
+            "durations": {step: round(seconds, 3) for step, seconds in self.durations.items()},
+            "errors": dict(self.errors)
+        }
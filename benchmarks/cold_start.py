@@ -0,0 +1,188 @@
+"""Measure how fast a cold instance of the API becomes useful.
+
+Starts gunicorn on `api.monitor:app` the way render.yaml does, pointed at
+the fake Tableau server, and reports:
+
+- import: time to import api.monitor in a fresh interpreter (median of
+  --runs) and which heavy libraries that import loaded eagerly
+- first response: process start until `/` answers 200
+- warm: process start until the background warm-up (client imports,
+  sign-in, view listing) has finished
+- first check: duration of the first GET /api/monitor after warm-up
+
+    python -m benchmarks.cold_start
+    python -m benchmarks.cold_start --views 1000 --max-import-ms 400 --max-first-response 3
+
+With --max-import-ms or --max-first-response the exit status is 1 when a
+measurement is over its limit, so the script can gate a CI job.
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+from benchmarks.run_benchmarks import REPO_ROOT, start_fake_server
+
+HEAVY_MODULES = ('tableauserverclient', 'requests', 'httpx', 'numpy')
+
+IMPORT_PROBE = f"""
+import json, sys, time
+start = time.perf_counter()
+import api.monitor
+print(json.dumps({{
+    "seconds": time.perf_counter() - start,
+    "eager": [name for name in {HEAVY_MODULES!r} if name in sys.modules]
+}}))
+"""
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def measure_import(env, runs):
+    """Median import time of api.monitor over `runs` fresh interpreters"""
+    samples = []
+    eager = []
+    for _ in range(runs):
+        completed = subprocess.run(
+            [sys.executable, '-c', IMPORT_PROBE],
+            cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=True
+        )
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        samples.append(result["seconds"])
+        eager = result["eager"]
+    return statistics.median(samples), eager
+
+
+def wait_for(url, started, timeout, ready=lambda response: True):
+    """Poll url until it answers 200 and ready(response); returns seconds since started"""
+    deadline = started + timeout
+    while time.perf_counter() < deadline:
+        try:
+            response = requests.get(url, timeout=1)
+            if response.status_code == 200 and ready(response):
+                return time.perf_counter() - started
+        except requests.RequestException:
+            pass
+        time.sleep(0.01)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+def measure_server(env, timeout):
+    """Start gunicorn and time its first response, warm-up and first check"""
+    base = f"http://127.0.0.1:{free_port()}"
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [
+            sys.executable, '-m', 'gunicorn', 'api.monitor:app',
+            '--bind', base.replace('http://', ''),
+            '--workers', '1',
+            '--timeout', '120',
+        ],
+        cwd=REPO_ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    try:
+        result = {"first_response": wait_for(f"{base}/", started, timeout)}
+
+        request_started = time.perf_counter()
+        requests.get(f"{base}/api/integration", timeout=10).raise_for_status()
+        result["integration_ms"] = (time.perf_counter() - request_started) * 1000
+
+        result["warm"] = wait_for(
+            f"{base}/api/schedule", started, timeout,
+            ready=lambda response: response.json()["warmup"]["done"]
+        )
+        warmup = requests.get(f"{base}/api/schedule", timeout=10).json()["warmup"]
+        result["warmup_steps"] = warmup["durations"]
+        result["warmup_errors"] = warmup["errors"]
+
+        request_started = time.perf_counter()
+        response = requests.get(f"{base}/api/monitor", params={"max_age": 0}, timeout=timeout)
+        result["first_check"] = time.perf_counter() - request_started
+        result["first_check_status"] = response.status_code
+        return result
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the cold start of the monitor API")
+    parser.add_argument('--views', type=int, default=100)
+    parser.add_argument('--runs', type=int, default=5, help="fresh interpreters for the import measurement")
+    parser.add_argument('--latency', type=float, default=0.005, help="seconds per render")
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--max-import-ms', type=float, help="fail if importing api.monitor takes longer")
+    parser.add_argument('--max-first-response', type=float, help="fail if `/` takes longer (seconds) to answer")
+    parser.add_argument('--json', action='store_true', help="print results as JSON")
+    args = parser.parse_args()
+
+    fake_args = argparse.Namespace(
+        latency=args.latency, jitter=0.0, error_rate=0.0, slow_rate=0.0, slow_latency=0.0
+    )
+    fake, url = start_fake_server(fake_args, args.views)
+    try:
+        with tempfile.TemporaryDirectory() as state_dir:
+            env = dict(
+                os.environ,
+                TABLEAU_SERVER_HOST=url,
+                TABLEAU_SITE_NAME='fake',
+                TABLEAU_API_TOKEN='benchmark',
+                SCHEDULER_ENABLED='false',
+                HISTORY_DIR=os.path.join(state_dir, 'history'),
+                OUTBOX_PATH=os.path.join(state_dir, 'outbox.sqlite3'),
+                ALERT_STATE_PATH=os.path.join(state_dir, 'alert_state.json'),
+                REPORT_STATE_PATH=os.path.join(state_dir, 'report_state.json'),
+                SCHEDULER_STATE_PATH=os.path.join(state_dir, 'scheduler_state.json'),
+                PROBE_SCHEDULER_STATE=os.path.join(state_dir, 'probe_scheduler.json'),
+            )
+            env.pop('TABLEAU_SITES_FILE', None)
+            env.pop('SHARD_STORE', None)
+
+            import_seconds, eager = measure_import(env, args.runs)
+            result = {"import_ms": import_seconds * 1000, "eager_imports": eager}
+            result.update(measure_server(env, args.timeout))
+    finally:
+        fake.terminate()
+        fake.wait()
+
+    failures = []
+    if args.max_import_ms is not None and result["import_ms"] > args.max_import_ms:
+        failures.append(f"import took {result['import_ms']:.0f}ms (limit {args.max_import_ms:.0f}ms)")
+    if args.max_first_response is not None and result["first_response"] > args.max_first_response:
+        failures.append(f"first response took {result['first_response']:.2f}s (limit {args.max_first_response}s)")
+
+    if args.json:
+        print(json.dumps(dict(result, failures=failures), indent=2))
+    else:
+        print(f"import api.monitor    {result['import_ms']:8.0f} ms  "
+              f"(eager: {', '.join(eager) or 'none'})")
+        print(f"first response (/)    {result['first_response']:8.2f} s")
+        print(f"/api/integration      {result['integration_ms']:8.1f} ms")
+        steps = ', '.join(f"{step} {seconds:.2f}s" for step, seconds in result['warmup_steps'].items())
+        print(f"warm                  {result['warm']:8.2f} s   ({steps})")
+        for step, error in result['warmup_errors'].items():
+            print(f"  warm-up step {step} failed: {error}")
+        print(f"first check           {result['first_check']:8.2f} s   "
+              f"(HTTP {result['first_check_status']})")
+        for failure in failures:
+            print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+"""Local stand-in for the Tableau REST API and the Telex webhook endpoint.
+
+Serves the endpoints tableauserverclient uses for monitoring (PAT sign-in,
+sign-out, paged view listing, preview image, PNG and PDF renders) with a
+configurable number of views and latency/error distributions, and counts
+webhook deliveries posted to /webhook. Request counters are served as JSON
+from /_stats.
+
+    python -m benchmarks.fake_tableau --views 1000 --latency 0.05
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+NAMESPACE = "http://tableau.com/api"
+SITE_ID = "00000000-0000-0000-0000-00000000517e"
+USER_ID = "00000000-0000-0000-0000-0000000005e7"
+
+
+class FakeTableau:
+    """Configuration and counters shared by every request handler"""
+
+    def __init__(self, view_count=10, latency=0.0, jitter=0.0, error_rate=0.0,
+                 slow_rate=0.0, slow_latency=0.0, body_size=32 * 1024, seed=0, render_slots=0):
+        self.view_count = view_count
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.body_size = body_size
+        # Renders run at most this many at a time, like a VizQL process pool;
+        # the rest queue, which is what a load test should see (0 = no limit)
+        self.render_slots = threading.BoundedSemaphore(render_slots) if render_slots else None
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.tokens = set()
+        self.counters = {}
+        self.webhooks = []
+        created = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        self.views = [
+            {
+                "id": f"view-{i:06d}",
+                "name": f"Dashboard {i}",
+                "workbook_id": f"workbook-{i // 5:06d}",
+                "project_id": f"project-{i // 50:04d}",
+                "created_at": created,
+                "updated_at": created + timedelta(minutes=i),
+            }
+            for i in range(view_count)
+        ]
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+    def render_delay(self, view_id):
+        """Latency for one render; a fixed subset of views is consistently slow"""
+        index = int(view_id.rsplit('-', 1)[-1])
+        delay = self.latency
+        if self.slow_rate and (index * 2654435761 % 1000) < self.slow_rate * 1000:
+            delay = self.slow_latency
+        if self.jitter:
+            with self.lock:
+                delay += self.random.uniform(0, self.jitter)
+        return delay
+
+    def should_fail(self):
+        if not self.error_rate:
+            return False
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+
+def _timestamp(value):
+    return value.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    fake = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b"", content_type="application/xml"):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _error(self, status, code, summary):
+        self._send(status, (
+            f'<tsResponse xmlns="{NAMESPACE}"><error code="{code}">'
+            f'<summary>{summary}</summary><detail>{summary}</detail></error></tsResponse>'
+        ))
+
+    def _authorized(self):
+        with self.fake.lock:
+            return self.headers.get("X-Tableau-Auth") in self.fake.tokens
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        body = self._read_body()
+
+        if path == "/webhook":
+            self.fake.count("webhook")
+            with self.fake.lock:
+                self.fake.webhooks.append(json.loads(body or b"{}"))
+            return self._send(202, '{"status":"success"}', "application/json")
+
+        if path.endswith("/auth/signin"):
+            self.fake.count("signin")
+            token = uuid.uuid4().hex
+            with self.fake.lock:
+                self.fake.tokens.add(token)
+            return self._send(200, (
+                f'<tsResponse xmlns="{NAMESPACE}"><credentials token="{token}">'
+                f'<site id="{SITE_ID}" contentUrl="fake"/><user id="{USER_ID}"/>'
+                f'</credentials></tsResponse>'
+            ))
+
+        if path.endswith("/auth/signout"):
+            self.fake.count("signout")
+            with self.fake.lock:
+                self.fake.tokens.discard(self.headers.get("X-Tableau-Auth"))
+            return self._send(204)
+
+        self._error(404, "404000", "Not found")
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        path = parsed.path
+        query = parse_qs(parsed.query)
+
+        if path == "/_stats":
+            with self.fake.lock:
+                stats = dict(self.fake.counters)
+            return self._send(200, json.dumps(stats), "application/json")
+
+        if not self._authorized():
+            return self._error(401, "401002", "Unauthorized Access")
+
+        if path.endswith(f"/sites/{SITE_ID}/views"):
+            return self._list_views(query)
+
+        match = re.search(r"/views/([^/]+)/(previewImage|image|pdf)$", path)
+        if match:
+            return self._render(match.group(1), match.group(2))
+
+        self._error(404, "404000", "Not found")
+
+    def _list_views(self, query):
+        self.fake.count("list")
+        page_number = int(query.get("pageNumber", ["1"])[0])
+        page_size = int(query.get("pageSize", ["100"])[0])
+        views = self.fake.views
+
+        for expression in query.get("filter", [""])[0].split(","):
+            if expression.startswith("updatedAt:gt:"):
+                since = expression.split(":", 2)[2]
+                views = [v for v in views if _timestamp(v["updated_at"]) > since]
+            elif expression.startswith("updatedAt:gte:"):
+                since = expression.split(":", 2)[2]
+                views = [v for v in views if _timestamp(v["updated_at"]) >= since]
+
+        start = (page_number - 1) * page_size
+        page = views[start:start + page_size]
+        items = "".join(
+            f'<view id="{v["id"]}" name="{v["name"]}" contentUrl="{v["id"]}" '
+            f'createdAt="{_timestamp(v["created_at"])}" updatedAt="{_timestamp(v["updated_at"])}">'
+            f'<workbook id="{v["workbook_id"]}"/><project id="{v["project_id"]}"/>'
+            f'<owner id="{USER_ID}"/></view>'
+            for v in page
+        )
+        self._send(200, (
+            f'<tsResponse xmlns="{NAMESPACE}">'
+            f'<pagination pageNumber="{page_number}" pageSize="{page_size}" totalAvailable="{len(views)}"/>'
+            f'<views>{items}</views></tsResponse>'
+        ))
+
+    def _render(self, view_id, kind):
+        self.fake.count(kind)
+        if self.fake.render_slots is not None:
+            with self.fake.render_slots:
+                time.sleep(self.fake.render_delay(view_id))
+        else:
+            time.sleep(self.fake.render_delay(view_id))
+        if self.fake.should_fail():
+            return self._error(500, "500000", "Render failed")
+        content_type = "application/pdf" if kind == "pdf" else "image/png"
+        self._send(200, b"\0" * self.fake.body_size, content_type)
+
+
+class _Server(ThreadingHTTPServer):
+    # The default listen backlog of 5 drops connections when a client opens
+    # hundreds at once, which would show up as client latency
+    request_queue_size = 1024
+
+
+def start(fake, host="127.0.0.1", port=0):
+    """Start the fake server on a background thread and return (server, base_url)"""
+    handler = type("BoundHandler", (Handler,), {"fake": fake})
+    server = _Server((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Tableau REST server")
+    parser.add_argument("--views", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-latency", type=float, default=0.0)
+    parser.add_argument("--render-slots", type=int, default=0, help="concurrent renders, 0 for no limit")
+    parser.add_argument("--port", type=int, default=8900, help="0 picks a free port")
+    args = parser.parse_args()
+
+    fake = FakeTableau(args.views, args.latency, args.jitter, args.error_rate,
+                       args.slow_rate, args.slow_latency, render_slots=args.render_slots)
+    server, url = start(fake, port=args.port)
+    # The benchmark harness reads the URL from this line
+    print(f"Fake Tableau serving {args.views} views at {url}", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""Benchmark the API check and the CLI monitor against the fake Tableau server.
+
+Every (target, view count) scenario runs in a fresh Python process, talking
+to a fresh fake server in another process, so peak memory belongs to the
+monitor alone and no caches leak between scenarios.
+
+    python -m benchmarks.run_benchmarks
+    python -m benchmarks.run_benchmarks --targets api --views 10 1000 --ticks 10
+"""
+
+import argparse
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TARGETS = ('api', 'cli')
+RENDER_COUNTERS = ('previewImage', 'image', 'pdf')
+
+
+def percentile(values, q):
+    """Linear-interpolated percentile of a non-empty list"""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def start_fake_server(args, view_count):
+    """Launch the fake Tableau server in its own process; returns (process, url)"""
+    process = subprocess.Popen(
+        [
+            sys.executable, '-m', 'benchmarks.fake_tableau',
+            '--port', '0',
+            '--views', str(view_count),
+            '--latency', str(args.latency),
+            '--jitter', str(args.jitter),
+            '--error-rate', str(args.error_rate),
+            '--slow-rate', str(args.slow_rate),
+            '--slow-latency', str(args.slow_latency),
+        ],
+        cwd=REPO_ROOT,
+        stdout=subprocess.PIPE,
+        text=True
+    )
+    line = process.stdout.readline()
+    if ' at ' not in line:
+        process.kill()
+        raise RuntimeError(f"Fake Tableau server did not start: {line!r}")
+    return process, line.rsplit(' at ', 1)[1].strip()
+
+
+def _render_count(url):
+    stats = requests.get(f"{url}/_stats", timeout=10).json()
+    return sum(stats.get(name, 0) for name in RENDER_COUNTERS), stats
+
+
+def run_scenario(target, url, ticks):
+    """Run `ticks` checks of one target in this process and return its measurements"""
+    logging.disable(logging.CRITICAL)
+
+    if target == 'api':
+        from api.monitor import run_monitor_check
+
+        def tick():
+            response_data, status_code = run_monitor_check(f"{url}/webhook")
+            if status_code != 200:
+                raise RuntimeError(response_data.get('error'))
+    else:
+        sys.path.insert(0, os.path.join(REPO_ROOT, 'src'))
+        from tableau_monitor import TableauMonitor
+
+        monitor = TableauMonitor()
+        monitor.webhook_url = f"{url}/webhook"
+
+        def tick():
+            if not monitor.check_dashboards():
+                raise RuntimeError("check_dashboards() failed")
+
+    from api.outbox import webhook_outbox
+
+    renders_before, _ = _render_count(url)
+    durations = []
+    started = time.perf_counter()
+    for _ in range(ticks):
+        tick_started = time.perf_counter()
+        tick()
+        durations.append(time.perf_counter() - tick_started)
+    elapsed = time.perf_counter() - started
+    webhook_outbox.flush()
+
+    renders_after, stats = _render_count(url)
+    return {
+        "ticks": ticks,
+        "elapsed": elapsed,
+        "ticks_per_second": ticks / elapsed,
+        "renders_per_second": (renders_after - renders_before) / elapsed,
+        "p50": percentile(durations, 0.50),
+        "p99": percentile(durations, 0.99),
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "webhooks": stats.get('webhook', 0),
+    }
+
+
+def run_isolated(args, target, view_count):
+    """Run one scenario in a child process against its own fake server"""
+    fake, url = start_fake_server(args, view_count)
+    try:
+        with tempfile.TemporaryDirectory() as state_dir:
+            env = dict(
+                os.environ,
+                TABLEAU_SERVER_HOST=url,
+                TABLEAU_SITE_NAME='fake',
+                TABLEAU_API_TOKEN='benchmark',
+                HISTORY_DIR=os.path.join(state_dir, 'history'),
+                OUTBOX_PATH=os.path.join(state_dir, 'outbox.sqlite3'),
+                ALERT_STATE_PATH=os.path.join(state_dir, 'alert_state.json'),
+                REPORT_STATE_PATH=os.path.join(state_dir, 'report_state.json'),
+                SCHEDULER_STATE_PATH=os.path.join(state_dir, 'scheduler_state.json'),
+                PROBE_SCHEDULER_STATE=os.path.join(state_dir, 'probe_scheduler.json'),
+                LOG_CURSOR_PATH=os.path.join(state_dir, 'log_cursor.json'),
+                LOG_AGGREGATE_PATH=os.path.join(state_dir, 'log_aggregate.json'),
+            )
+            env.pop('TABLEAU_SITES_FILE', None)
+            env.pop('SHARD_STORE', None)
+            completed = subprocess.run(
+                [
+                    sys.executable, '-m', 'benchmarks.run_benchmarks',
+                    '--scenario', target, url, str(args.ticks),
+                ],
+                cwd=REPO_ROOT,
+                env=env,
+                capture_output=True,
+                text=True
+            )
+        if completed.returncode != 0:
+            raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr else 'failed')
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+    finally:
+        fake.terminate()
+        fake.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Tableau monitor against a fake server")
+    parser.add_argument('--targets', nargs='+', choices=TARGETS, default=list(TARGETS))
+    parser.add_argument('--views', nargs='+', type=int, default=[10, 1000, 10000])
+    parser.add_argument('--ticks', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.005, help="seconds per render")
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--slow-rate', type=float, default=0.0)
+    parser.add_argument('--slow-latency', type=float, default=0.0)
+    parser.add_argument('--json', action='store_true', help="print results as JSON")
+    parser.add_argument('--scenario', nargs=3, metavar=('TARGET', 'URL', 'TICKS'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario:
+        target, url, ticks = args.scenario
+        print(json.dumps(run_scenario(target, url, int(ticks))))
+        return
+
+    results = []
+    if not args.json:
+        print(f"{'target':<6} {'views':>7} {'ticks/s':>9} {'renders/s':>10} "
+              f"{'p50 (s)':>9} {'p99 (s)':>9} {'peak RSS (MB)':>14}")
+    for target in args.targets:
+        for view_count in args.views:
+            try:
+                result = run_isolated(args, target, view_count)
+            except RuntimeError as e:
+                result = {"error": str(e)}
+            result.update(target=target, views=view_count)
+            results.append(result)
+            if args.json:
+                continue
+            if 'error' in result:
+                print(f"{target:<6} {view_count:>7} error: {result['error']}")
+            else:
+                print(f"{target:<6} {view_count:>7} {result['ticks_per_second']:>9.2f} "
+                      f"{result['renders_per_second']:>10.1f} {result['p50']:>9.3f} "
+                      f"{result['p99']:>9.3f} {result['peak_rss_mb']:>14.1f}", flush=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -2,14 +2,38 @@
 
 import os
 import sys
+import argparse
 import json
 import time
 import logging
+import math
 from datetime import datetime, UTC
-import requests
 from dotenv import load_dotenv
 import tableauserverclient as TSC
 
+# Allow running as `python src/tableau_monitor.py` from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from api.async_client import async_client_pool, event_loop, get_async_concurrency, get_probe_client
+from api.alerts import (
+    DEFAULT_ALERT_STATE_PATH,
+    DEGRADED,
+    FAILING,
+    OBSERVED_ERROR,
+    OBSERVED_OK,
+    OBSERVED_SLOW,
+    AlertTracker,
+)
+from api.baselines import BaselineTracker
+from api.history import history_store
+from api.inventory import view_inventory
+from api.loadtest import DEFAULT_REQUESTS_PER_CLIENT, DEFAULT_STEPS, STAGES, LoadTestPlan, load_tester
+from api.outbox import webhook_outbox
+from api.probe_scheduler import ProbeScheduler
+from api.probes import get_probe_mode, probe_view, probe_view_async
+from api.reports import delta_reporter
+from api.sessions import session_pool
+from api.tracing import tracer
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -26,6 +50,15 @@ class TableauMonitor:
         self.token = os.getenv('TABLEAU_API_TOKEN')
         self.webhook_url = "https://ping.telex.im/v1/webhooks/019528ca-ae9c-79d7-a3ed-2dc5866df56a"
         self.threshold = int(os.getenv('LOAD_TIME_THRESHOLD', 10))
+        self.probe_mode = get_probe_mode('full')
+        self.baselines = BaselineTracker(history=history_store)
+        self.alerts = AlertTracker(
+            state_path=os.getenv('ALERT_STATE_PATH', DEFAULT_ALERT_STATE_PATH)
+        )
+        self.scheduler = ProbeScheduler(
+            slow_threshold=self.threshold,
+            state_path=os.getenv('PROBE_SCHEDULER_STATE', '.probe_scheduler.json')
+        )
 
         if not all([self.server_url, self.site_name, self.token]):
             logger.error("Missing required environment variables")
@@ -49,118 +82,236 @@ class TableauMonitor:
         }
 
         try:
-            response = requests.post(
-                self.webhook_url,
-                json=payload,
-                headers={"Content-Type": "application/json"}
-            )
-            if response.status_code != 202:
-                logger.error(f"Webhook failed with status {response.status_code}: {response.text}")
-            return response.status_code == 202
+            # Delivery, retries and batching happen on the outbox's sender thread
+            webhook_outbox.enqueue(self.webhook_url, payload)
+            return True
         except Exception as e:
-            logger.error(f"Failed to send webhook: {str(e)}")
+            logger.error(f"Failed to queue webhook: {str(e)}")
             return False
 
-    def measure_load_time(self, server, view):
-        """Measure the time it takes to load a view's data"""
-        try:
-            start_time = time.time()
+    def _notify_alert(self, event):
+        """Send a webhook for an alert state change or reminder"""
+        if event is None:
+            return
 
-            # Get view data
-            server.views.populate_preview_image(view)
-            server.views.populate_image(view)
-            server.views.populate_pdf(view)
+        if event.state == DEGRADED:
+            event_name, status = "tableau_slow_dashboard", "warning"
+        elif event.state == FAILING:
+            event_name, status = "tableau_monitor_error", "error"
+        else:
+            event_name, status = "tableau_dashboard_recovered", "success"
 
-            end_time = time.time()
-            load_time = end_time - start_time
+        headline = event.headline()
+        message = f"{headline}\n{event.detail}" if event.detail else headline
+        self._send_webhook(event_name=event_name, status=status, message=message)
 
-            return load_time
+    def _notify_outage(self, event):
+        """Send a webhook when the server outage alert starts, ends or is due a reminder"""
+        if event is None:
+            return
 
-        except Exception as e:
-            logger.error(f"Error measuring load time for {view.name}: {str(e)}")
-            return None
+        if event.state == FAILING:
+            since = datetime.fromtimestamp(event.since, UTC).strftime('%Y-%m-%d %H:%M:%S')
+            headline = (
+                f"Tableau Server Outage - still unreachable (since {since} UTC)" if event.reminder
+                else "Tableau Server Outage - probing paused"
+            )
+            self._send_webhook(
+                event_name="tableau_server_outage", status="error", message=f"{headline}\n{event.detail}"
+            )
+        else:
+            self._send_webhook(
+                event_name="tableau_server_recovered", status="success", message="Tableau server reachable again"
+            )
+
+    def probe_dashboard(self, session, view):
+        """Render a view in the configured probe mode and time each stage"""
+        return self._log_probe(view, probe_view(session, view, self.probe_mode))
+
+    async def probe_dashboard_async(self, client, view):
+        """probe_dashboard() on an AsyncTableauClient"""
+        return self._log_probe(view, await probe_view_async(client, view, self.probe_mode))
+
+    def _log_probe(self, view, result):
+        if result.failed:
+            logger.error(f"Error measuring load time for {view.name}: {result.error}")
+        else:
+            stages = ", ".join(
+                f"{stage.stage} {stage.total:.2f}s (ttfb {stage.ttfb:.2f}s)" for stage in result.stages
+            )
+            logger.debug(f"Dashboard '{view.name}' stages: {stages}")
+        return result
+
+    def measure_load_time(self, session, view):
+        """Measure the time it takes to load a view's data"""
+        return self.probe_dashboard(session, view).load_time
 
     def check_dashboards(self):
         """Monitor Tableau dashboards for performance issues"""
+        with tracer.tick('check_dashboards', site=self.site_name):
+            return self._check_dashboards()
+
+    def _check_dashboards(self):
         try:
-            # Initialize Tableau Server client
-            tableau_auth = TSC.PersonalAccessTokenAuth(
-                token_name=self.token_name,
-                personal_access_token=self.token,
-                site_id=self.site_name
-            )
+            # Reuse a signed-in Tableau session (or asyncio client) across checks
+            use_async = get_probe_client() == 'async'
+            with tracer.span('session', client='async' if use_async else 'threads'):
+                if use_async:
+                    session = async_client_pool.get(self.server_url, self.site_name, self.token_name, self.token)
+                else:
+                    session = session_pool.get(
+                        self.server_url,
+                        self.site_name,
+                        self.token_name,
+                        self.token,
+                        http_options={'verify': True}
+                    )
+
+            # Get all views
+            with tracer.span('inventory'):
+                all_views = view_inventory.get_views(session)
+            logger.info(f"Found {len(all_views)} views to monitor")
+
+            slow_dashboards = []
+            error_dashboards = []
+            # (view_id, name, status, load_time) for the delta report
+            observed = []
 
-            server = TSC.Server(
+            # Probe the highest-priority views in parallel within the time budget
+            outcome = lambda result: (result.load_time, result.failed)
+            halt = lambda: session.guard.breaker.paused
+            with tracer.span('probe_views', mode=self.probe_mode):
+                if use_async:
+                    results = event_loop.run(self.scheduler.run_async(
+                        all_views,
+                        lambda view: self.probe_dashboard_async(session, view),
+                        outcome,
+                        get_async_concurrency(),
+                        halt=halt
+                    ))
+                else:
+                    results = self.scheduler.run(
+                        all_views,
+                        lambda view: self.probe_dashboard(session, view),
+                        outcome,
+                        halt=halt
+                    )
+            # The server's availability is tracked like a view, so an outage that
+            # lasts several runs is reported once rather than on every run
+            server_alert = f"server:{self.server_url}/{self.site_name}"
+            outage = session.guard.breaker.is_open
+            self._notify_outage(self.alerts.observe(
+                server_alert,
                 self.server_url,
-                use_server_version=False,
-                http_options={'verify': True}
+                OBSERVED_ERROR if outage else OBSERVED_OK,
+                session.guard.describe_outage() if outage else None,
+                # The circuit only opens after several failures in a row
+                trigger_samples=1
+            ))
+            if outage:
+                # One outage event rather than an error alert for every view
+                views_by_id = {view.id: view for view in all_views}
+                for view_id, result in results.items():
+                    history_store.record(views_by_id[view_id], result)
+                self.alerts.save()
+                return False
+            deferred_count = len(all_views) - len(results)
+
+            # Judge every successful probe against its own view's baseline in one batch
+            measured = [view_id for view_id, result in results.items() if not result.failed]
+            slow_flags, p50s, p95s = self.baselines.evaluate(
+                measured,
+                [results[view_id].load_time for view_id in measured],
+                self.threshold
             )
-            server.version = '3.16'
+            verdicts = {
+                view_id: (bool(slow), float(p50), float(p95))
+                for view_id, slow, p50, p95 in zip(measured, slow_flags, p50s, p95s)
+            }
 
-            with server.auth.sign_in_with_personal_access_token(tableau_auth):
-                # Get all views
-                all_views = list(TSC.Pager(server.views))
-                logger.info(f"Found {len(all_views)} views to monitor")
+            for view in all_views:
+                if view.id not in results:
+                    observed.append((view.id, view.name, None, None))
+                    continue
 
-                slow_dashboards = []
-                error_dashboards = []
+                try:
+                    result = results[view.id]
+                    load_time = result.load_time
+                    history_store.record(view, result)
 
-                for view in all_views:
-                    try:
-                        load_time = self.measure_load_time(server, view)
+                    if load_time is None:
+                        error_dashboards.append(view.name)
+                        observed.append((view.id, view.name, OBSERVED_ERROR, None))
+                        self._notify_alert(self.alerts.observe(
+                            view.id, view.name, OBSERVED_ERROR, f"Error: {result.error}"
+                        ))
+                        continue
 
-                        if load_time is None:
-                            error_dashboards.append(view.name)
-                            continue
+                    slow, p50, p95 = verdicts[view.id]
+                    if math.isnan(p50):
+                        reference = f"threshold: {self.threshold}s"
+                    else:
+                        reference = f"usual: p50 {p50:.2f}s, p95 {p95:.2f}s"
 
-                        if load_time > self.threshold:
-                            slow_dashboards.append((view.name, load_time))
-                            message = (
-                                f"Dashboard '{view.name}' is loading slowly. "
-                                f"Load time: {load_time:.2f}s (threshold: {self.threshold}s)"
-                            )
-                            logger.warning(message)
-                            self._send_webhook(
-                                event_name="tableau_slow_dashboard",
-                                status="warning",
-                                message=message
+                    observed.append((view.id, view.name, OBSERVED_SLOW if slow else OBSERVED_OK, load_time))
+                    if slow:
+                        slow_dashboards.append((view.name, load_time))
+                        message = (
+                            f"Dashboard '{view.name}' is loading slowly. "
+                            f"Load time: {load_time:.2f}s ({reference})\n"
+                            + "\n".join(
+                                f"- {stage.stage}: {stage.total:.2f}s (first byte after {stage.ttfb:.2f}s)"
+                                for stage in result.stages
                             )
-                        else:
-                            logger.info(f"Dashboard '{view.name}' load time OK: {load_time:.2f}s")
-
-                    except Exception as e:
-                        error_msg = f"Error monitoring dashboard '{view.name}': {str(e)}"
-                        logger.error(error_msg)
-                        error_dashboards.append(view.name)
-                        self._send_webhook(
-                            event_name="tableau_monitor_error",
-                            status="error",
-                            message=error_msg
                         )
+                        logger.warning(message)
+                        self._notify_alert(self.alerts.observe(view.id, view.name, OBSERVED_SLOW, message))
+                    else:
+                        logger.info(f"Dashboard '{view.name}' load time OK: {load_time:.2f}s ({reference})")
+                        self._notify_alert(self.alerts.observe(
+                            view.id, view.name, OBSERVED_OK, f"Load time: {load_time:.2f}s ({reference})"
+                        ))
+
+                except Exception as e:
+                    error_msg = f"Error monitoring dashboard '{view.name}': {str(e)}"
+                    logger.error(error_msg)
+                    error_dashboards.append(view.name)
+                    observed.append((view.id, view.name, OBSERVED_ERROR, None))
+                    self._notify_alert(self.alerts.observe(view.id, view.name, OBSERVED_ERROR, error_msg))
+
+            # Persist alert state so the next run continues the same streaks
+            self.alerts.forget([server_alert] + [view.id for view in all_views])
+            self.alerts.save()
+
+            # Send summary
+            summary = (
+                f"Monitoring Summary ({datetime.now(UTC).strftime('%Y-%m-%d %H:%M:%S')})\n"
+                f"Total Dashboards: {len(all_views)}\n"
+                f"Slow Dashboards: {len(slow_dashboards)}\n"
+                f"Error Dashboards: {len(error_dashboards)}\n"
+                f"Deferred to Next Run: {deferred_count}"
+            )
+
+            # Between full digests, only list the dashboards that changed
+            report = delta_reporter.compare(f"cli:{self.server_url}/{self.site_name}", observed)
+            if not report.full:
+                summary += f"\n\n{report.format_changes()}"
+
+            if report.full and slow_dashboards:
+                summary += "\n\nSlow Dashboards:"
+                for name, time in slow_dashboards:
+                    summary += f"\n- {name}: {time:.2f}s"
+
+            if report.full and error_dashboards:
+                summary += "\n\nDashboards with Errors:"
+                for name in error_dashboards:
+                    summary += f"\n- {name}"
 
-                # Send summary
-                summary = (
-                    f"Monitoring Summary ({datetime.now(UTC).strftime('%Y-%m-%d %H:%M:%S')})\n"
-                    f"Total Dashboards: {len(all_views)}\n"
-                    f"Slow Dashboards: {len(slow_dashboards)}\n"
-                    f"Error Dashboards: {len(error_dashboards)}"
-                )
-
-                if slow_dashboards:
-                    summary += "\n\nSlow Dashboards:"
-                    for name, time in slow_dashboards:
-                        summary += f"\n- {name}: {time:.2f}s"
-
-                if error_dashboards:
-                    summary += "\n\nDashboards with Errors:"
-                    for name in error_dashboards:
-                        summary += f"\n- {name}"
-
-                self._send_webhook(
-                    event_name="tableau_monitor_summary",
-                    status="info",
-                    message=summary
-                )
+            self._send_webhook(
+                event_name="tableau_monitor_summary",
+                status="info",
+                message=summary
+            )
 
         except Exception as e:
             error_msg = f"Failed to monitor Tableau dashboards: {str(e)}"
@@ -174,9 +325,72 @@ class TableauMonitor:
 
         return True
 
+    def load_test(self, plan):
+        """Ramp concurrent renders of one view and return the latency curve"""
+        return load_tester.run(
+            lambda: session_pool.get(
+                self.server_url,
+                self.site_name,
+                self.token_name,
+                self.token,
+                http_options={'verify': True}
+            ),
+            plan
+        )
+
+def print_load_test(report):
+    print(f"Load test of '{report['view_name']}' ({report['stage']}), "
+          f"{report['requests_per_client']} renders per client")
+    print(f"{'clients':>8} {'renders':>8} {'errors':>7} {'p50 (s)':>8} {'p95 (s)':>8} {'p99 (s)':>8} {'renders/s':>10}")
+    for level in report['levels']:
+        p50, p95, p99 = (f"{level[key]:.2f}" if level[key] is not None else "-" for key in ('p50', 'p95', 'p99'))
+        print(f"{level['concurrency']:>8} {level['requests']:>8} {level['error_rate']:>7.0%} "
+              f"{p50:>8} {p95:>8} {p99:>8} {level['throughput']:>10.1f}")
+    saturation = report['saturation']
+    if saturation['reached']:
+        print(f"Saturation: {saturation['concurrency'] or 'below the lowest level'} clients ({saturation['reason']})")
+    else:
+        print(f"Saturation: not reached up to {saturation['concurrency']} clients")
+    if report['aborted']:
+        print(f"Stopped early: {report['aborted']}")
+
 def main():
+    parser = argparse.ArgumentParser(description="Monitor Tableau dashboards, or load test one of them")
+    parser.add_argument('--load-test', metavar='VIEW', help="view id or name to load test instead of monitoring")
+    parser.add_argument('--stage', choices=STAGES, default='image', help="what each load test client renders")
+    parser.add_argument('--max-concurrency', type=int, default=10, help="clients at the last load test level")
+    parser.add_argument('--steps', type=int, default=DEFAULT_STEPS, help="load test levels from 1 client up")
+    parser.add_argument('--requests-per-client', type=int, default=DEFAULT_REQUESTS_PER_CLIENT)
+    parser.add_argument('--json', action='store_true', help="print the load test report as JSON")
+    args = parser.parse_args()
+
+    if args.load_test:
+        try:
+            plan = LoadTestPlan(args.load_test, args.stage, args.max_concurrency, args.steps, args.requests_per_client)
+        except ValueError as e:
+            parser.error(str(e))
+        try:
+            report = TableauMonitor().load_test(plan)
+        except ValueError as e:
+            logger.error(f"Load test failed: {str(e)}")
+            sys.exit(1)
+        if args.json:
+            print(json.dumps(report, indent=2))
+        else:
+            print_load_test(report)
+        sys.exit(0)
+
+    # TRACE_FILE=trace.json traces the run, webhook deliveries included, as Chrome trace-event JSON
+    trace_file = os.getenv('TRACE_FILE')
+    if trace_file:
+        tracer.enabled = True
     monitor = TableauMonitor()
     success = monitor.check_dashboards()
+    if trace_file:
+        webhook_outbox.flush()
+        with open(trace_file, 'w') as f:
+            json.dump(tracer.chrome_trace(), f)
+        logger.info(f"Trace written to {trace_file}")
     sys.exit(0 if success else 1)
 
 if __name__ == "__main__":
@@ -5,6 +5,10 @@ import tableauserverclient as TSC
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
+from api.inventory import view_inventory
+from api.logs import create_log_analyzer
+from api.sessions import session_pool
+
 class TableauMonitor:
     def __init__(self):
         load_dotenv()
@@ -14,39 +18,52 @@ class TableauMonitor:
         self.site_name = os.getenv("TABLEAU_SITE_NAME", "")
         self.load_threshold = int(os.getenv("LOAD_TIME_THRESHOLD", 10))
 
-        # Initialize Tableau Server Client
-        tableau_auth = TSC.PersonalAccessTokenAuth(
-            token_name='MonitoringToken',
-            personal_access_token=self.api_token,
-            site_id=self.site_name
-        )
-        self.server = TSC.Server(self.server_host)
-        self.server.auth = tableau_auth
+        # Tableau sessions are signed in lazily and shared between runs
+        self.token_name = os.getenv("TABLEAU_TOKEN_NAME", "MonitoringToken")
+        self._session = None
+
+        # Server logs are tailed from TABLEAU_LOG_DIR, resuming where the last run stopped
+        self.log_analyzer = create_log_analyzer()
+
+    @property
+    def session(self):
+        """Signed-in Tableau session shared by every call in this run"""
+        if self._session is None:
+            self._session = session_pool.get(
+                self.server_host,
+                self.site_name,
+                self.token_name,
+                self.api_token
+            )
+        return self._session
 
     def get_slow_loading_dashboards(self):
         """Get dashboards that exceed the load time threshold"""
         slow_dashboards = []
 
-        with self.server.auth.sign_in():
-            all_views = list(TSC.Pager(self.server.views))
+        all_views = view_inventory.get_views(self.session)
 
-            for view in all_views:
-                load_time = self.check_view_load_time(view)
-                if load_time > self.load_threshold:
-                    slow_dashboards.append({
-                        'name': view.name,
-                        'project': view.project_name,
-                        'load_time': load_time,
-                        'url': view.content_url
-                    })
+        for view in all_views:
+            load_time = self.check_view_load_time(view)
+            if load_time > self.load_threshold:
+                slow_dashboards.append({
+                    'name': view.name,
+                    'project': view.project_name,
+                    'load_time': load_time,
+                    'url': view.content_url
+                })
 
         return slow_dashboards
 
     def check_view_load_time(self, view):
         """Check the load time for a specific view"""
         try:
+            def load_image(server):
+                server.views.populate_image(view)
+                return view.image
+
             start_time = datetime.now()
-            self.server.views.populate_image(view)
+            self.session.call(load_image)
             end_time = datetime.now()
             return (end_time - start_time).total_seconds()
         except Exception as e:
@@ -54,16 +71,15 @@ class TableauMonitor:
             return float('inf')
 
     def get_error_logs(self):
-        """Get relevant error logs from Tableau Server"""
-        errors = []
+        """Get new error log lines from Tableau Server, newest first"""
+        if self.log_analyzer is None:
+            return []
 
-        with self.server.auth.sign_in():
-            logs = self.server.log.get()
-            for log in logs:
-                if 'error' in log.lower() or 'failed' in log.lower():
-                    errors.append(log)
-
-        return errors
+        new_matches = self.log_analyzer.run()
+        if not new_matches:
+            return []
+        samples = self.log_analyzer.aggregator.recent_samples(new_matches)
+        return [sample['line'] for sample in samples]
 
     def format_report(self, slow_dashboards, errors):
         """Format the monitoring report"""
@@ -83,6 +99,11 @@ class TableauMonitor:
             for error in errors[:5]:  # Show only last 5 errors
                 report += f"- {error}\n"
 
+            if self.log_analyzer is not None:
+                report += "\n📈 Most Frequent Errors:\n"
+                for entry in self.log_analyzer.aggregator.top(5):
+                    report += f"- [{entry['severity']}] {entry['count']}x {entry['signature']}\n"
+
         if not slow_dashboards and not errors:
             report += "✅ All dashboards are performing normally."
 